@@ -0,0 +1,106 @@
+# benchmarks/credit_load.py
+"""
+Hammers the credit ledger from many processes at once and checks the invariants.
+
+    python benchmarks/credit_load.py [--processes 16] [--attempts 50] [--credits 300]
+
+Every process repeatedly charges one shared user, as concurrent job submissions
+would. Afterwards the number of successful charges must equal the starting
+balance, the balance must be zero and the ledger must account for every credit.
+Runs against a throwaway SQLite file unless DATABASE_URL is set.
+"""
+import os
+import sys
+import time
+import uuid
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def _app():
+    from psuite import create_app
+    return create_app()
+
+def _charge_loop(attempts, user_id, start, results):
+    from psuite import db, ledger
+    app = _app()
+    charged, refused, errors, latencies = 0, 0, 0, []
+    with app.app_context():
+        start.wait()
+        for _ in range(attempts):
+            began = time.perf_counter()
+            try:
+                if ledger.charge(user_id, 1, str(uuid.uuid4())) is None:
+                    refused += 1
+                else:
+                    db.session.commit()
+                    charged += 1
+            except Exception:  # e.g. "database is locked" past the busy timeout
+                db.session.rollback()
+                errors += 1
+            latencies.append(time.perf_counter() - began)
+        db.session.remove()
+    results.put((charged, refused, errors, latencies))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--processes', type=int, default=16)
+    parser.add_argument('--attempts', type=int, default=50, help="charges attempted per process")
+    parser.add_argument('--credits', type=int, default=300, help="starting balance of the shared user")
+    args = parser.parse_args()
+
+    tmp_dir = None
+    if not os.environ.get('DATABASE_URL'):
+        tmp_dir = tempfile.mkdtemp(prefix='psuite-credit-load-')
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp_dir, 'load.db')}"
+    from psuite import db
+    from psuite.models import User, CreditTransaction
+    app = _app()
+    with app.app_context():
+        name = f"load-{uuid.uuid4().hex[:8]}"
+        user = User(username=name, email=f"{name}@example.com", password_hash='x', credits=args.credits)
+        db.session.add(user); db.session.commit()
+        user_id = user.id
+
+    ctx = multiprocessing.get_context('spawn')
+    start, results = ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=_charge_loop, args=(args.attempts, user_id, start, results))
+             for _ in range(args.processes)]
+    for proc in procs:
+        proc.start()
+    time.sleep(2)  # let every process build its app before the start signal
+    began = time.perf_counter()
+    start.set()
+    outcomes = [results.get() for _ in procs]
+    elapsed = time.perf_counter() - began
+    for proc in procs:
+        proc.join()
+
+    charged = sum(o[0] for o in outcomes)
+    refused = sum(o[1] for o in outcomes)
+    errors = sum(o[2] for o in outcomes)
+    latencies = sorted(l for o in outcomes for l in o[3])
+    with app.app_context():
+        balance = db.session.get(User, user_id).credits
+        ledger_total = sum(t.amount for t in CreditTransaction.query.filter_by(user_id=user_id))
+
+    print(f"{args.processes} processes x {args.attempts} attempts on {app.config['SQLALCHEMY_DATABASE_URI']}")
+    print(f"charged {charged}, refused {refused}, errors {errors} in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.0f} attempts/s)")
+    print(f"latency p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+    print(f"final balance {balance}, ledger total {ledger_total}")
+    expected = min(args.credits, args.processes * args.attempts)
+    ok = charged == expected and balance == args.credits - charged and ledger_total == -charged and errors == 0
+    print("OK" if ok else "FAILED: credits were oversubscribed, lost or blocked")
+    if tmp_dir:
+        import shutil
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
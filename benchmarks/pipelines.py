@@ -0,0 +1,422 @@
+# benchmarks/pipelines.py
+"""
+Benchmarks the frontend optimizer, backend analyzer and security scanner end to end.
+
+    python benchmarks/pipelines.py run [--js-modules 400] [--photos 20] [--pages 200] [--py-files 300]
+                                       [--pipelines frontend,backend,security] [--repeat 3] [-o result.json]
+    python benchmarks/pipelines.py compare baseline.json result.json [--threshold 0.10]
+
+`run` generates a deterministic project corpus (small JS modules, large photos,
+HTML pages sharing a stylesheet, a Python package with planted secrets and
+vulnerable pinned dependencies), runs each pipeline in a fresh process with the
+socket layer replaced by a counting no-op, and prints throughput (files/s, MB/s),
+p50/p95 per-file latency and peak memory of the whole process tree as JSON.
+Node CLIs (and linters) that are not installed are replaced by shims that copy
+their input, so the suite runs offline; the shims used are listed in the result.
+
+`compare` flags every metric that got worse by more than the threshold and exits 1
+if there is any.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+PIPELINES = ('frontend', 'backend', 'security')
+SID = 'bench'
+FRONTEND_OPTIONS = {'add_csp': True, 'add_sri': True, 'purge_css': True, 'obfuscate_js': 'none'}
+# Tools replaced by a shim when missing: Node CLIs copy `input -o/--output output`, linters report nothing.
+SHIMMED_TOOLS = ('terser', 'svgo', 'javascript-obfuscator', 'critical', 'flake8', 'vulture')
+SHIM = """#!{python}
+import sys, shutil
+args = sys.argv[1:]
+if args == ['--version']:
+    print('0.0.0-shim')
+for flag in ('-o', '--output'):
+    if flag in args:
+        shutil.copyfile(args[0], args[args.index(flag) + 1])
+"""
+
+
+# --- CORPUS ---
+
+JS_LINES = [
+    "export function {name}(items, options = {{}}) {{\n",
+    "  const total = items.reduce((acc, item) => acc + item.price * (item.quantity || 1), 0);\n",
+    "  if (options.verbose) console.log('computed total', total, items.length);\n",
+    "  return items.filter(item => item.visible).map(item => ({{ ...item, label: item.name.trim() }}));\n",
+    "  document.querySelectorAll('.{cls}').forEach(el => el.classList.toggle('is-active'));\n",
+    "}}\n",
+]
+PY_LINES = [
+    "def {name}(request, *args, **kwargs):\n",
+    "    items = [row for row in request.rows if row.get('visible')]\n",
+    "    logger.info('processed %d records in %.2fs', len(items), time.time() - started)\n",
+    "    unused_total = sum(item['price'] for item in items)\n",
+    "    return {{'items': items, 'count': len(items)}}\n",
+    "\n",
+]
+
+def _aws_key(rng):
+    return 'AKIA' + ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ234567') for _ in range(16))
+
+def _write(path, text, mode='w'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode) as f:
+        f.write(text)
+
+def build_frontend(root, rng, js_modules, pages, photos, photo_mp, svgs):
+    from PIL import Image
+    classes = [f"c{i}" for i in range(400)]
+    for i in range(js_modules):
+        lines, size = [], rng.randint(1024, 6 * 1024)
+        while sum(map(len, lines)) < size:
+            lines.append(rng.choice(JS_LINES).format(name=f"fn{i}_{len(lines)}", cls=rng.choice(classes)))
+        _write(os.path.join(root, 'js', 'modules', f"mod_{i:04d}.js"), ''.join(lines))
+    rules = [f".{cls} {{ margin: {rng.randint(0, 24)}px; color: #{rng.randrange(16 ** 6):06x}; }}\n" for cls in classes]
+    _write(os.path.join(root, 'css', 'site.css'), ''.join(rules) + "@media (max-width: 600px) {\n" + ''.join(rules[:50]) + "}\n")
+    for i in range(pages):
+        used = rng.sample(classes[:200], 20)  # the other half of the stylesheet is purgeable
+        scripts = ''.join(f'<script src="../js/modules/mod_{rng.randrange(max(js_modules, 1)):04d}.js"></script>\n'
+                          for _ in range(3 if js_modules else 0))
+        body = ''.join(f'<div class="{cls}"><p>Section {n} of page {i}.</p></div>\n' for n, cls in enumerate(used))
+        _write(os.path.join(root, 'pages', f"page_{i:04d}.html"),
+               f'<!DOCTYPE html>\n<html>\n<head>\n<title>Page {i}</title>\n'
+               f'<link rel="stylesheet" href="../css/site.css">\n{scripts}</head>\n<body>\n{body}</body>\n</html>\n')
+    width = int((photo_mp * 1_000_000 * 4 / 3) ** 0.5)
+    for i in range(photos):
+        size = (width, width * 3 // 4)
+        noise = Image.effect_noise(size, rng.randint(20, 60))
+        gradient = Image.linear_gradient('L').resize(size)
+        path = os.path.join(root, 'img', f"photo_{i:03d}.jpg")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        Image.merge('RGB', (noise, gradient, Image.blend(noise, gradient, 0.5))).save(path, quality=95)
+    for i in range(svgs):
+        shapes = ''.join(f'  <circle cx="{rng.randint(0, 64)}" cy="{rng.randint(0, 64)}" r="{rng.randint(2, 12)}" fill="#{rng.randrange(16 ** 6):06x}"/>\n'
+                         for _ in range(20))
+        _write(os.path.join(root, 'icons', f"icon_{i:03d}.svg"),
+               f'<?xml version="1.0" encoding="UTF-8"?>\n<!-- generated -->\n<svg xmlns="http://www.w3.org/2000/svg" width="64" height="64">\n{shapes}</svg>\n')
+
+def build_backend(root, rng, py_files, py_kb, secrets):
+    """Returns the number of planted secrets."""
+    planted = 0
+    secret_files = set(rng.sample(range(py_files), min(secrets, py_files)))
+    for i in range(py_files):
+        lines = ["import os\nimport sys\nimport time\nimport logging\n\nlogger = logging.getLogger(__name__)\nstarted = time.time()\n\n"]
+        if i in secret_files:
+            lines.append(f'AWS_ACCESS_KEY_ID = "{_aws_key(rng)}"\n\n')
+            planted += 1
+        while sum(map(len, lines)) < py_kb * 1024:
+            lines.append(rng.choice(PY_LINES).format(name=f"handler_{i}_{len(lines)}"))
+        _write(os.path.join(root, f"pkg{i % 20}", f"module_{i:04d}.py"), ''.join(lines))
+    for n in range(20):
+        _write(os.path.join(root, f"pkg{n}", '__init__.py'), '')
+    return planted
+
+def build_dependencies(root, dump_path, rng, deps):
+    """Pinned requirements and a lockfile, plus an OSV dump with one advisory for every other package."""
+    requirements, lock, advisories = [], {'': {'name': 'bench', 'version': '1.0.0'}}, []
+    for i in range(deps):
+        version = f"1.{rng.randint(0, 9)}.{rng.randint(0, 9)}"
+        requirements.append(f"pkg-{i}=={version}\n")
+        lock[f"node_modules/npm-pkg-{i}"] = {'version': version}
+        if i % 2 == 0:
+            for ecosystem, name in (('PyPI', f"pkg-{i}"), ('npm', f"npm-pkg-{i}")):
+                advisories.append({'id': f"BENCH-{ecosystem}-{i}", 'modified': '2024-01-01T00:00:00Z',
+                                   'summary': f"Synthetic advisory for {name}",
+                                   'affected': [{'package': {'ecosystem': ecosystem, 'name': name},
+                                                 'ranges': [{'type': 'ECOSYSTEM', 'events': [{'introduced': '0'}, {'fixed': '2.0.0'}]}]}]})
+    _write(os.path.join(root, 'requirements.txt'), ''.join(requirements))
+    _write(os.path.join(root, 'package-lock.json'), json.dumps({'name': 'bench', 'lockfileVersion': 3, 'packages': lock}))
+    _write(dump_path, ''.join(json.dumps(a) + '\n' for a in advisories))
+    return len(advisories)
+
+def build_corpus(root, args):
+    """Lays out <root>/project/{site,app} and the advisory dump; returns what was planted."""
+    rng = random.Random(args.seed)
+    project = os.path.join(root, 'project')
+    build_frontend(os.path.join(project, 'site'), rng, args.js_modules, args.pages, args.photos, args.photo_mp, args.svgs)
+    secrets = build_backend(os.path.join(project, 'app'), rng, args.py_files, args.py_kb, args.secrets)
+    advisories = build_dependencies(project, os.path.join(root, 'advisories.jsonl'), rng, args.deps)
+    return {'secrets': secrets, 'vulnerable_packages': advisories}
+
+def install_shims(bin_dir):
+    """Puts a copying stand-in on PATH for every missing tool. Returns the names shimmed."""
+    shimmed = []
+    for tool in SHIMMED_TOOLS:
+        if shutil.which(tool) is None:
+            path = os.path.join(bin_dir, tool)
+            _write(path, SHIM.format(python=sys.executable))
+            os.chmod(path, 0o755)
+            shimmed.append(tool)
+    os.environ['PATH'] = bin_dir + os.pathsep + os.environ['PATH']
+    return shimmed
+
+
+# --- MEASUREMENT ---
+
+PAGE_KB = os.sysconf('SC_PAGE_SIZE') // 1024 if hasattr(os, 'sysconf') else 4
+
+def tree_rss_kb(root_pid):
+    """Current RSS of `root_pid` and all its descendants (pool workers, forkserver, CLIs), from /proc."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    total, stack = 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * PAGE_KB
+        except (OSError, IndexError, ValueError):
+            pass
+        stack.extend(children.get(pid, []))
+    return total
+
+
+class PeakMemory:
+    """Samples the process tree's RSS in the background; falls back to getrusage without /proc."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak_kb = max(self.peak_kb, tree_rss_kb(os.getpid()))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if os.path.isdir('/proc'):
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        else:
+            import resource
+            self.peak_kb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                            + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+def _inputs(root, exts=None):
+    sizes = [os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(root) for f in fs
+             if exts is None or f.rsplit('.', 1)[-1] in exts]
+    return len(sizes), sum(sizes)
+
+
+# --- PIPELINE RUNS ---
+
+def _run_once(name, project, work_dir):
+    from psuite import processing
+    from psuite.manifest import ProjectManifest
+    if name == 'frontend':
+        processed = os.path.join(work_dir, 'processed')
+        unpacked = os.path.join(project, 'site')
+        return processing.do_frontend_optimization(unpacked, processed, FRONTEND_OPTIONS, SID,
+                                                   manifest=ProjectManifest.scan(unpacked))
+    if name == 'backend':
+        processing.do_backend_analysis(os.path.join(project, 'app'), SID)
+    else:
+        processing.do_security_scan(project, SID, 'pro')
+    return []
+
+def _run_pipeline(name, project, dump_path, args, results):
+    """Child process: runs one pipeline `args.repeat` times and puts its measurements on `results`."""
+    from psuite import create_app, processing, metrics
+    app = create_app()
+    events, items = Counter(), Counter()
+    def emit(event, payload=None, room=None):
+        events[event] += 1
+        for key in ('findings', 'issues', 'vulnerabilities'):
+            items[key] += len((payload or {}).get(key, ()))
+    processing.set_emitter(emit)
+
+    work_root = tempfile.mkdtemp(prefix=f"psuite-bench-{name}-")
+    walls, latencies, peaks, errors, summary = [], [], [], 0, None
+    try:
+        with app.app_context():
+            if args.workers:
+                app.config.update(OPTIMIZER_MAX_WORKERS=args.workers, SCAN_WORKERS=args.workers, ANALYSIS_JOBS=args.workers)
+            app.config['ADVISORY_DUMP'] = dump_path
+            app.config['ADVISORY_INDEX_PATH'] = os.path.join(work_root, 'advisories.db')
+            runs = args.repeat + (1 if args.cache == 'warm' else 0)
+            for i in range(runs):
+                work_dir = os.path.join(work_root, f"run-{i}")
+                app.config['CACHE_FOLDER'] = os.path.join(work_root if args.cache == 'warm' else work_dir, 'cache')
+                events.clear(); items.clear()
+                trace = metrics.start_trace()
+                with PeakMemory() as memory:
+                    began = time.perf_counter()
+                    with metrics.traced('job', name):
+                        reports = _run_once(name, project, work_dir)
+                    wall = time.perf_counter() - began
+                processing.close_status(SID)
+                metrics.stop_trace()
+                shutil.rmtree(os.path.join(work_dir, 'processed'), ignore_errors=True)
+                if args.cache == 'warm' and i == 0:
+                    continue  # priming run
+                walls.append(wall)
+                peaks.append(memory.peak_kb)
+                latencies += [r['duration_ms'] for r in reports if 'duration_ms' in r]
+                errors += sum(r['status'] == 'error' for r in reports)
+                summary = trace.summary()
+    finally:
+        shutil.rmtree(work_root, ignore_errors=True)
+    results.put((name, {'walls': walls, 'latencies': latencies, 'peak_kb': max(peaks, default=0), 'errors': errors,
+                        'events': dict(events), 'items': dict(items), 'summary': summary}))
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run(args):
+    pipelines = [p for p in args.pipelines.split(',') if p]
+    unknown = set(pipelines) - set(PIPELINES)
+    if unknown:
+        sys.exit(f"unknown pipeline(s): {', '.join(sorted(unknown))}")
+    root = tempfile.mkdtemp(prefix='psuite-pipelines-bench-')
+    try:
+        if not os.environ.get('DATABASE_URL'):
+            os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(root, 'bench.db')}"
+        shims = install_shims(os.path.join(root, 'bin'))
+        began = time.perf_counter()
+        planted = build_corpus(root, args)
+        print(f"corpus built in {time.perf_counter() - began:.1f}s; shims: {', '.join(shims) or 'none'}", file=sys.stderr)
+        project = os.path.join(root, 'project')
+        inputs = {'frontend': _inputs(os.path.join(project, 'site')),
+                  'backend': _inputs(os.path.join(project, 'app'), {'py'}),
+                  'security': _inputs(project)}
+
+        ctx, results = multiprocessing.get_context('spawn'), {}
+        for name in pipelines:  # one process each, so peak memory is the pipeline's own
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_run_pipeline, args=(name, project, os.path.join(root, 'advisories.jsonl'), args, queue))
+            proc.start()
+            name, measured = queue.get()
+            proc.join()
+            files, size = inputs[name]
+            wall = percentile(measured['walls'], 0.5)
+            results[name] = {
+                'files': files, 'bytes': size, 'wall_seconds': round(wall, 3),
+                'files_per_s': round(files / wall, 2), 'mb_per_s': round(size / wall / 1024 / 1024, 3),
+                'p50_ms': percentile(measured['latencies'], 0.5), 'p95_ms': percentile(measured['latencies'], 0.95),
+                'peak_rss_mb': round(measured['peak_kb'] / 1024, 1), 'errors': measured['errors'],
+                'runs_seconds': [round(w, 3) for w in measured['walls']],
+                'events': measured['events'], 'findings': measured['items'], 'summary': measured['summary']}
+            print(f"{name:<10} {wall:8.2f}s {results[name]['files_per_s']:9.1f} files/s "
+                  f"{results[name]['mb_per_s']:8.2f} MB/s  peak {results[name]['peak_rss_mb']} MB", file=sys.stderr)
+    finally:
+        if not args.keep_corpus:
+            shutil.rmtree(root, ignore_errors=True)
+        else:
+            print(f"corpus kept at {root}", file=sys.stderr)
+
+    corpus = {k: getattr(args, k) for k in ('seed', 'js_modules', 'pages', 'photos', 'photo_mp', 'svgs',
+                                            'py_files', 'py_kb', 'secrets', 'deps')}
+    document = {'meta': {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'revision': _git_revision(),
+                         'python': platform.python_version(), 'platform': platform.platform(),
+                         'cpus': os.cpu_count(), 'workers': args.workers, 'repeat': args.repeat, 'cache': args.cache,
+                         'shims': shims, 'corpus': corpus, 'planted': planted},
+                'results': results}
+    text = json.dumps(document, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    return 0
+
+
+# --- COMPARISON ---
+
+# Metric -> True if higher is better.
+COMPARED = {'files_per_s': True, 'mb_per_s': True, 'wall_seconds': False,
+            'p50_ms': False, 'p95_ms': False, 'peak_rss_mb': False}
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    for key in ('corpus', 'workers', 'cache', 'shims'):
+        if baseline['meta'].get(key) != current['meta'].get(key):
+            print(f"warning: '{key}' differs between the runs, results may not be comparable", file=sys.stderr)
+    regressions = 0
+    for name in PIPELINES:
+        old, new = baseline['results'].get(name), current['results'].get(name)
+        if not old or not new:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            before, after = old.get(metric), new.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = change < -args.threshold if higher_is_better else change > args.threshold
+            regressions += worse
+            print(f"{name:<10} {metric:<13} {before:>10} -> {after:<10} {change:+7.1%}{'  REGRESSION' if worse else ''}")
+        if new.get('errors', 0) > old.get('errors', 0):
+            regressions += 1
+            print(f"{name:<10} {'errors':<13} {old.get('errors', 0):>10} -> {new['errors']:<10}  REGRESSION")
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%}" if regressions else "no regressions")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    bench = commands.add_parser('run', help="build a corpus, run the pipelines and print the results as JSON")
+    bench.add_argument('--js-modules', type=int, default=400)
+    bench.add_argument('--pages', type=int, default=200)
+    bench.add_argument('--photos', type=int, default=20)
+    bench.add_argument('--photo-mp', type=float, default=4, help="megapixels per photo")
+    bench.add_argument('--svgs', type=int, default=20)
+    bench.add_argument('--py-files', type=int, default=300)
+    bench.add_argument('--py-kb', type=int, default=8, help="size of each Python module")
+    bench.add_argument('--secrets', type=int, default=25, help="Python modules with a planted secret")
+    bench.add_argument('--deps', type=int, default=40, help="pinned Python and npm dependencies")
+    bench.add_argument('--seed', type=int, default=1)
+    bench.add_argument('--pipelines', default=','.join(PIPELINES))
+    bench.add_argument('--repeat', type=int, default=3, help="timed runs per pipeline; the median is reported")
+    bench.add_argument('--workers', type=int, default=None, help="override the optimizer/scan/linter worker counts")
+    bench.add_argument('--cache', choices=('cold', 'warm'), default='cold',
+                       help="cold: empty asset caches for every run; warm: one untimed priming run first")
+    bench.add_argument('-o', '--output', help="also write the JSON here")
+    bench.add_argument('--keep-corpus', action='store_true')
+    diff = commands.add_parser('compare', help="flag regressions between two result files")
+    diff.add_argument('baseline')
+    diff.add_argument('current')
+    diff.add_argument('--threshold', type=float, default=0.10, help="relative change counted as a regression")
+    args = parser.parse_args()
+    return run(args) if args.command == 'run' else compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
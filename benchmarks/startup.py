@@ -0,0 +1,169 @@
+# benchmarks/startup.py
+"""
+Measures how fast the app starts and how much memory a web-only process holds.
+
+    python benchmarks/startup.py [--repeat 5] [-o result.json] [--baseline baseline.json] [--threshold 0.20]
+
+Every sample is a fresh interpreter that times `import psuite`, `create_app()` and
+the first requests to the login and pricing pages, then reports its RSS and
+which processing libraries (Pillow, BeautifulSoup, minify_html, lxml) it imported;
+a web-only process should import none of them. Job worker start-up is measured
+as well: a cold spawned worker against one forked from the preloaded forkserver
+the supervisor uses. Medians are printed as JSON. With --baseline, every metric
+that got worse by more than the threshold is flagged and the exit status is 1.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import shutil
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+PAGES = ('/auth/login', '/pricing')
+HEAVY_MODULES = ('PIL', 'bs4', 'minify_html', 'lxml')
+# Metrics compared against a baseline; all of them are better when lower.
+COMPARED = ('process_ms', 'import_ms', 'create_app_ms', 'first_request_ms', 'rss_mb',
+            'worker_spawn_ms', 'worker_fork_ms')
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    import resource
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2] if values else None
+
+
+# --- WEB PROCESS ---
+
+def probe():
+    """Runs in a fresh interpreter: one start-up sample, printed as JSON."""
+    began = time.perf_counter()
+    import psuite
+    imported = time.perf_counter()
+    app = psuite.create_app()
+    created = time.perf_counter()
+    client = app.test_client()
+    for page in PAGES:
+        client.get(page)
+    served = time.perf_counter()
+    print(json.dumps({'import_ms': round((imported - began) * 1000, 1),
+                      'create_app_ms': round((created - imported) * 1000, 1),
+                      'first_request_ms': round((served - created) * 1000, 1),
+                      'rss_mb': rss_mb(),
+                      'heavy_modules': sorted(m for m in HEAVY_MODULES if m in sys.modules)}))
+
+def _sample_web():
+    began = time.perf_counter()
+    result = subprocess.run([sys.executable, __file__, '--probe'], capture_output=True, text=True, check=True)
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample['process_ms'] = round((time.perf_counter() - began) * 1000, 1)
+    return sample
+
+
+# --- JOB WORKERS ---
+
+def _worker_ready(conn):
+    from psuite import create_app
+    create_app()
+    conn.send((time.monotonic(), rss_mb()))
+    conn.close()
+
+def _start_worker(ctx):
+    receiver, sender = ctx.Pipe(duplex=False)
+    began = time.monotonic()
+    proc = ctx.Process(target=_worker_ready, args=(sender,))
+    proc.start()
+    ready, rss = receiver.recv()
+    proc.join()
+    return round((ready - began) * 1000, 1), rss
+
+def _sample_workers(repeat):
+    spawn = [_start_worker(multiprocessing.get_context('spawn')) for _ in range(repeat)]
+    result = {'worker_spawn_ms': median([ms for ms, _ in spawn]), 'worker_spawn_rss_mb': median([mb for _, mb in spawn])}
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        from psuite.jobs import WORKER_PRELOAD
+        ctx = multiprocessing.get_context('forkserver')
+        ctx.set_forkserver_preload(WORKER_PRELOAD)
+        first = _start_worker(ctx)  # includes starting and preloading the forkserver itself
+        forked = [_start_worker(ctx) for _ in range(repeat)]
+        result.update(forkserver_start_ms=first[0], worker_fork_ms=median([ms for ms, _ in forked]),
+                      worker_fork_rss_mb=median([mb for _, mb in forked]))
+    return result
+
+
+# --- COMPARISON ---
+
+def compare(baseline, current, threshold):
+    regressions = 0
+    for metric in COMPARED:
+        before, after = baseline['results'].get(metric), current['results'].get(metric)
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        worse = change > threshold
+        regressions += worse
+        print(f"{metric:<18} {before:>9} -> {after:<9} {change:+7.1%}{'  REGRESSION' if worse else ''}", file=sys.stderr)
+    added = set(current['results']['heavy_modules']) - set(baseline['results']['heavy_modules'])
+    if added:
+        regressions += 1
+        print(f"{'heavy_modules':<18} now imported by the web process: {', '.join(sorted(added))}  REGRESSION", file=sys.stderr)
+    print(f"{regressions} regression(s) beyond {threshold:.0%}" if regressions else "no regressions", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help="samples per measurement; the median is reported")
+    parser.add_argument('-o', '--output', help="also write the JSON here")
+    parser.add_argument('--baseline', help="result file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.20, help="relative change counted as a regression")
+    parser.add_argument('--probe', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.probe:
+        return probe()
+
+    tmp_dir = None
+    if not os.environ.get('DATABASE_URL'):
+        tmp_dir = tempfile.mkdtemp(prefix='psuite-startup-bench-')
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp_dir, 'startup.db')}"
+    try:
+        _sample_web()  # creates the schema and warms the OS page cache
+        samples = [_sample_web() for _ in range(args.repeat)]
+        results = {key: median([s[key] for s in samples]) for key in samples[0] if key != 'heavy_modules'}
+        results['heavy_modules'] = sorted({m for s in samples for m in s['heavy_modules']})
+        results.update(_sample_workers(args.repeat))
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    document = {'meta': {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                         'platform': platform.platform(), 'cpus': os.cpu_count(), 'repeat': args.repeat},
+                'results': results}
+    text = json.dumps(document, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            return 1 if compare(json.load(f), document, args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
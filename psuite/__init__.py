@@ -4,6 +4,7 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_socketio import SocketIO
 from flask_login import LoginManager
+from sqlalchemy import event
 
 db = SQLAlchemy()
 socketio = SocketIO()
@@ -12,13 +13,33 @@ login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'info'
 
+def _engine_options(config):
+    if config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return {'connect_args': {'timeout': config['DATABASE_BUSY_TIMEOUT']}}
+    return {'pool_size': config['DATABASE_POOL_SIZE'], 'max_overflow': config['DATABASE_MAX_OVERFLOW'],
+            'pool_pre_ping': True, 'pool_recycle': 1800}
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers (event relays, page loads) run while a job or a charge is writing.
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
 def create_app():
     app = Flask(__name__)
     basedir = os.path.abspath(os.path.dirname(__file__))
 
     app.config['SECRET_KEY'] = 'a-super-secret-key-that-you-should-change'
-    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(basedir, '..', 'instance', 'suite.db')}"
+    # DATABASE_URL switches to a server database (e.g. postgresql://...) with a connection pool.
+    app.config['SQLALCHEMY_DATABASE_URI'] = (os.environ.get('DATABASE_URL')
+                                             or f"sqlite:///{os.path.join(basedir, '..', 'instance', 'suite.db')}")
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Seconds a writer waits for SQLite's lock before failing; server pool sizing.
+    app.config['DATABASE_BUSY_TIMEOUT'] = 30
+    app.config['DATABASE_POOL_SIZE'] = 10
+    app.config['DATABASE_MAX_OVERFLOW'] = 20
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = _engine_options(app.config)
     
     app.config.from_mapping({
         'UPLOAD_FOLDER': os.path.join(basedir, '..', 'uploads'),
@@ -27,6 +48,68 @@ def create_app():
         'CACHE_FOLDER': os.path.join(basedir, '..', 'cache'),
         'ORIGINALS_FOLDER': os.path.join(basedir, '..', 'originals')
     })
+    # Upper bound on files optimized concurrently in a single frontend run.
+    app.config['OPTIMIZER_MAX_WORKERS'] = os.cpu_count() or 1
+    # Size cap for the cross-session cache of optimized assets under CACHE_FOLDER.
+    app.config['ASSET_CACHE_MAX_BYTES'] = 1024 * 1024 * 1024
+    # Incremental re-optimization: each user's last frontend run is remembered and its final
+    # outputs kept (up to ARTIFACT_STORE_MAX_BYTES), so unchanged files are restored, not rebuilt.
+    app.config['INCREMENTAL_RUNS'] = True
+    app.config['ARTIFACT_STORE_MAX_BYTES'] = 2 * 1024 * 1024 * 1024
+    # Images with more decoded pixels than this are left untouched.
+    app.config['IMAGE_MAX_PIXELS'] = 50_000_000
+    # Limits for uploaded ZIPs. Member counts and sizes are checked from the central
+    # directory before anything is extracted; members under UPLOAD_SKIP_DIRS are ignored.
+    app.config['MAX_CONTENT_LENGTH'] = 512 * 1024 * 1024
+    app.config['UPLOAD_MAX_UNCOMPRESSED_BYTES'] = 2 * 1024 * 1024 * 1024
+    app.config['UPLOAD_MAX_MEMBERS'] = 20_000
+    app.config['UPLOAD_MAX_COMPRESSION_RATIO'] = 200
+    app.config['UPLOAD_SKIP_DIRS'] = ['node_modules', '.git', '.hg', '.svn', '__MACOSX', '__pycache__', '.venv', 'venv']
+    # 'eager' builds the result ZIP while files are optimized; 'stream' zips on download instead.
+    app.config['ARCHIVE_MODE'] = 'eager'
+    app.config['ARCHIVE_DEFLATE_LEVEL'] = 6
+    # Source secret scan: worker processes, vendored trees to skip and a per-file size cap.
+    app.config['SCAN_WORKERS'] = os.cpu_count() or 1
+    app.config['SCAN_SKIP_DIRS'] = ['node_modules', 'bower_components', 'vendor', 'site-packages', '.git', '.venv', 'venv', '__pycache__']
+    app.config['SCAN_MAX_FILE_BYTES'] = 50 * 1024 * 1024
+    # Offline OSV advisory index for dependency audits. When ADVISORY_DUMP points at an
+    # osv.dev dump (ZIP, JSON or JSON lines) it is loaded incrementally before each scan.
+    app.config['ADVISORY_INDEX_PATH'] = os.path.join(app.config['CACHE_FOLDER'], 'advisories.db')
+    app.config['ADVISORY_DUMP'] = None
+    # Backend linters: flake8 --jobs value, and the size cap of the linter and audit result caches.
+    app.config['ANALYSIS_JOBS'] = os.cpu_count() or 1
+    app.config['ANALYSIS_CACHE_MAX_BYTES'] = 256 * 1024 * 1024
+    # CSS purge: names always kept (e.g. classes only added by JS) and regexes matched against names.
+    app.config['CSS_SAFELIST'] = ['drag-over']
+    app.config['CSS_SAFELIST_PATTERNS'] = []
+    # HTML hardening: CSP used when a session does not supply its own, and the referrer policy.
+    app.config['CSP_DEFAULT_POLICY'] = ("default-src 'self'; script-src 'self' 'unsafe-inline'; "
+                                        "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; "
+                                        "font-src 'self' https://fonts.gstatic.com; img-src 'self' data:;")
+    app.config['REFERRER_POLICY'] = 'strict-origin-when-cross-origin'
+    # Seconds a logged-in user's snapshot is served from memory before it is re-read.
+    app.config['USER_CACHE_TTL'] = 30
+    # Bearer token required to scrape /metrics (None = open, e.g. behind a private network).
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    # Storage janitor: seconds between passes, seconds an idle upload and an undownloaded
+    # result are kept, and the disk all sessions together may use (least recently used go first).
+    app.config['STORAGE_JANITOR_INTERVAL'] = 300
+    app.config['SESSION_TTL'] = 24 * 3600
+    app.config['RESULT_TTL'] = 6 * 3600
+    # Seconds a finished job's events are kept for clients that reload and replay them.
+    app.config['JOB_EVENT_TTL'] = 6 * 3600
+    app.config['STORAGE_QUOTA_BYTES'] = 20 * 1024 * 1024 * 1024
+    # Memory one run may use; the pre-flight estimate caps its worker processes to fit.
+    app.config['RUN_MEMORY_BUDGET_BYTES'] = 2 * 1024 * 1024 * 1024
+    # Background job workers, and how many jobs each plan may run at the same time.
+    app.config['JOB_WORKERS'] = 4
+    app.config['JOB_CONCURRENCY'] = {'free': 1, 'premium': 2, 'pro': 4}
+    # Persistent Node helpers for terser/svgo/javascript-obfuscator (0 = one process per file).
+    app.config['NODE_WORKER_POOL_SIZE'] = min(4, os.cpu_count() or 1)
+    # Critical CSS: (width, height) viewports extracted in one pass, pages extracted at once, per-page limit.
+    app.config['CRITICAL_VIEWPORTS'] = [(1200, 900)]
+    app.config['CRITICAL_CONCURRENCY'] = app.config['NODE_WORKER_POOL_SIZE']
+    app.config['CRITICAL_PAGE_TIMEOUT'] = 60
 
     # Ensure instance folder exists
     try:
@@ -40,25 +123,34 @@ def create_app():
         if folder_path and not os.path.exists(folder_path):
             os.makedirs(folder_path)
 
+    from . import node_workers, toolchain
+    node_workers.configure(app.config['NODE_WORKER_POOL_SIZE'])
+    toolchain.detect()
+
     db.init_app(app)
     socketio.init_app(app)
     login_manager.init_app(app)
     
-    from .models import User
-    
+    from .users import user_cache
+    user_cache.ttl = app.config['USER_CACHE_TTL']
+
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return user_cache.get(int(user_id))
 
     from .blueprints.main import main_bp
     from .blueprints.auth import auth_bp
     from .blueprints.tools import tools_bp
+    from .blueprints.metrics import metrics_bp
     
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(tools_bp, url_prefix='/tools')
+    app.register_blueprint(metrics_bp)
 
     with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', _sqlite_pragmas)
         db.create_all()
 
     return app
\ No newline at end of file
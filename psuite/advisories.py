@@ -0,0 +1,296 @@
+# psuite/advisories.py
+import os
+import re
+import sys
+import json
+import sqlite3
+import contextlib
+import zipfile
+from collections import namedtuple
+from packaging.version import Version, InvalidVersion
+
+Package = namedtuple('Package', 'ecosystem name version')
+Vulnerability = namedtuple('Vulnerability', 'ecosystem package version advisory_id severity summary fixed')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS advisories (id TEXT PRIMARY KEY, modified TEXT, summary TEXT, severity TEXT);
+CREATE TABLE IF NOT EXISTS affected (advisory_id TEXT, ecosystem TEXT, package TEXT, ranges TEXT, versions TEXT);
+CREATE INDEX IF NOT EXISTS affected_package ON affected (ecosystem, package);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+# --- VERSIONS ---
+
+def normalize_name(ecosystem, name):
+    return re.sub(r'[-_.]+', '-', name).lower() if ecosystem == 'PyPI' else name
+
+def _semver_key(version):
+    match = re.match(r'^v?(\d+)(?:\.(\d+))?(?:\.(\d+))?(?:-([0-9A-Za-z.-]+))?', version.strip())
+    if not match:
+        raise ValueError(f"Invalid semver: {version!r}")
+    major, minor, patch, pre = match.groups()
+    # A release sorts after its pre-releases; numeric identifiers sort before alphanumeric ones.
+    pre_ids = tuple((0, int(p), '') if p.isdigit() else (1, 0, p) for p in pre.split('.')) if pre else ()
+    return int(major), int(minor or 0), int(patch or 0), not pre, pre_ids
+
+def _pypi_key(version):
+    try:
+        return Version(version)
+    except InvalidVersion as e:
+        raise ValueError(str(e))
+
+VERSION_KEYS = {'PyPI': _pypi_key, 'npm': _semver_key}
+
+def _affected(version, ranges, versions, parse):
+    """OSV range evaluation: walks the sorted introduced/fixed/last_affected events."""
+    if version in versions:
+        return True
+    key = parse(version)
+    for rng in ranges:
+        if rng.get('type') not in ('ECOSYSTEM', 'SEMVER'):
+            continue
+        events = []
+        for event in rng.get('events', []):
+            kind, value = next(iter(event.items()))
+            try:
+                events.append((parse('0') if value == '0' else parse(value), kind))
+            except ValueError:
+                continue
+        affected = False
+        for event_key, kind in sorted(events, key=lambda e: e[0]):
+            if kind == 'introduced' and key >= event_key:
+                affected = True
+            elif kind == 'fixed' and key >= event_key:
+                affected = False
+            elif kind == 'last_affected' and key > event_key:
+                affected = False
+        if affected:
+            return True
+    return False
+
+def _fixed_versions(ranges):
+    return sorted({value for rng in ranges for event in rng.get('events', [])
+                   for kind, value in event.items() if kind == 'fixed'})
+
+
+# --- ADVISORY INDEX ---
+
+def _severity(advisory):
+    severity = (advisory.get('database_specific') or {}).get('severity')
+    return severity.lower() if isinstance(severity, str) else 'unknown'
+
+def iter_dump(path):
+    """Yields OSV advisories from a dump: a ZIP of JSON files (as published by osv.dev), a JSON file, JSON lines or a directory."""
+    if os.path.isdir(path):
+        for root, _, files in os.walk(path):
+            for filename in sorted(files):
+                if filename.endswith('.json'):
+                    yield from iter_dump(os.path.join(root, filename))
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            for name in zf.namelist():
+                if name.endswith('.json'):
+                    yield json.loads(zf.read(name))
+    elif path.endswith(('.jsonl', '.ndjson')):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        yield from (data if isinstance(data, list) else [data])
+
+
+class AdvisoryIndex:
+    """
+    Offline OSV advisory index in SQLite. Loading a dump only rewrites advisories whose
+    `modified` timestamp moved, and `generation` changes whenever anything did, so
+    cached audit results can be keyed on it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _meta(self, conn, key, default=None):
+        row = conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    @property
+    def generation(self):
+        with self._connect() as conn:
+            return int(self._meta(conn, 'generation', 0))
+
+    def is_empty(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT 1 FROM advisories LIMIT 1').fetchone() is None
+
+    def load(self, advisories):
+        """Upserts advisories, skipping unchanged ones. Returns how many were added or updated."""
+        changed = 0
+        with self._connect() as conn:
+            for advisory in advisories:
+                adv_id, modified = advisory.get('id'), advisory.get('modified', '')
+                if not adv_id:
+                    continue
+                row = conn.execute('SELECT modified FROM advisories WHERE id = ?', (adv_id,)).fetchone()
+                if row is not None and row[0] >= modified:
+                    continue
+                conn.execute('DELETE FROM affected WHERE advisory_id = ?', (adv_id,))
+                conn.execute('INSERT OR REPLACE INTO advisories VALUES (?, ?, ?, ?)',
+                             (adv_id, modified, advisory.get('summary') or advisory.get('details', '')[:200], _severity(advisory)))
+                for affected in advisory.get('affected', []):
+                    ecosystem, name = affected.get('package', {}).get('ecosystem'), affected.get('package', {}).get('name')
+                    if ecosystem in VERSION_KEYS and name:
+                        conn.execute('INSERT INTO affected VALUES (?, ?, ?, ?, ?)',
+                                     (adv_id, ecosystem, normalize_name(ecosystem, name),
+                                      json.dumps(affected.get('ranges', [])), json.dumps(affected.get('versions', []))))
+                changed += 1
+            if changed:
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('generation', ?)",
+                             (str(int(self._meta(conn, 'generation', 0)) + 1),))
+        return changed
+
+    def refresh(self, dump_path):
+        """Loads `dump_path` unless this exact file (by size and mtime) was loaded before."""
+        stat = os.stat(dump_path)
+        stamp, meta_key = f"{stat.st_size}:{stat.st_mtime_ns}", f"dump:{os.path.abspath(dump_path)}"
+        with self._connect() as conn:
+            if self._meta(conn, meta_key) == stamp:
+                return 0
+        changed = self.load(iter_dump(dump_path))
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (meta_key, stamp))
+        return changed
+
+    def audit(self, packages):
+        """Returns a Vulnerability for every (package, advisory) pair that applies."""
+        found = []
+        with self._connect() as conn:
+            for pkg in packages:
+                parse = VERSION_KEYS[pkg.ecosystem]
+                rows = conn.execute(
+                    'SELECT a.advisory_id, a.ranges, a.versions, d.severity, d.summary FROM affected a '
+                    'JOIN advisories d ON d.id = a.advisory_id WHERE a.ecosystem = ? AND a.package = ?',
+                    (pkg.ecosystem, normalize_name(pkg.ecosystem, pkg.name))).fetchall()
+                for adv_id, ranges, versions, severity, summary in rows:
+                    ranges = json.loads(ranges)
+                    try:
+                        hit = _affected(pkg.version, ranges, json.loads(versions), parse)
+                    except ValueError:
+                        continue
+                    if hit:
+                        found.append(Vulnerability(pkg.ecosystem, pkg.name, pkg.version, adv_id, severity,
+                                                   summary, _fixed_versions(ranges)))
+        return found
+
+def has_advisories(path):
+    """True if the offline index at `path` can answer audits; without advisories they run online."""
+    return os.path.exists(path) and not AdvisoryIndex(path).is_empty()
+
+
+# --- LOCKFILES ---
+
+REQUIREMENT_PIN = re.compile(r'^([A-Za-z0-9][A-Za-z0-9._-]*)(?:\[[^\]]*\])?\s*===?\s*([^\s,]+)$')
+REQUIREMENT_NAME = re.compile(r'^([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[[^\]]*\])?\s*(?:[<>=!~].*)?$')
+REQUIREMENT_HASH = re.compile(r'\s--hash[=\s]\S+')
+REQUIREMENT_INCLUDE = re.compile(r'^(-r|--requirement|-c|--constraint)(?:\s*=\s*|\s+|(?<=^-[rc]))(\S+)$')
+
+def _requirement_lines(f):
+    """Logical lines of a requirements file: `\\` continuations joined, comments, markers and hashes dropped."""
+    def clean(line):
+        return REQUIREMENT_HASH.sub('', ' ' + line.split(' #', 1)[0]).split(';', 1)[0].strip()
+
+    pending = ''
+    for raw in f:
+        raw = raw.rstrip('\r\n')
+        if raw.endswith('\\') and not raw.lstrip().startswith('#'):
+            pending += raw[:-1] + ' '
+            continue
+        line, pending = clean(pending + raw), ''
+        if line and not line.startswith('#'):
+            yield line
+    if clean(pending):
+        yield clean(pending)
+
+def parse_requirements(path, root=None):
+    """
+    Returns (pinned packages, unpinned requirement lines, included files) of a requirements
+    file. `-r` includes are followed, and pins in `-c` constraint files settle the versions
+    of unpinned names, for files inside `root` (by default the file's directory); other
+    includes come back as unpinned lines. Included files are paths relative to `root`.
+    """
+    root = os.path.realpath(root or os.path.dirname(path))
+    pinned, unpinned, included, constraints = [], [], [], {}
+    seen = {os.path.realpath(path)}
+
+    def read(file_path, constraint):
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in _requirement_lines(f):
+                include = REQUIREMENT_INCLUDE.match(line)
+                if include:
+                    target = os.path.realpath(os.path.join(os.path.dirname(file_path), include.group(2)))
+                    if os.path.commonpath([root, target]) != root or not os.path.isfile(target):
+                        unpinned.append(line)
+                    elif target not in seen:
+                        seen.add(target)
+                        included.append(os.path.relpath(target, root).replace(os.sep, '/'))
+                        read(target, constraint or include.group(1) in ('-c', '--constraint'))
+                    continue
+                if line.startswith('-'):
+                    continue
+                match = REQUIREMENT_PIN.match(line)
+                if constraint:
+                    if match:
+                        constraints[normalize_name('PyPI', match.group(1))] = Package('PyPI', match.group(1), match.group(2))
+                elif match:
+                    pinned.append(Package('PyPI', match.group(1), match.group(2)))
+                else:
+                    unpinned.append(line)
+
+    read(path, False)
+    for line in list(unpinned):
+        name = REQUIREMENT_NAME.match(line)
+        if name and normalize_name('PyPI', name.group(1)) in constraints:
+            pinned.append(constraints[normalize_name('PyPI', name.group(1))])
+            unpinned.remove(line)
+    return pinned, unpinned, included
+
+def parse_package_lock(path):
+    """Resolved packages of a package-lock.json (lockfileVersion 1, 2 or 3)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        lock = json.load(f)
+    packages = set()
+    if 'packages' in lock:
+        for key, meta in lock['packages'].items():
+            if key and 'node_modules/' in key and meta.get('version') and not meta.get('link'):
+                packages.add(Package('npm', meta.get('name') or key.rsplit('node_modules/', 1)[1], meta['version']))
+    else:
+        stack = [lock.get('dependencies', {})]
+        while stack:
+            for name, meta in stack.pop().items():
+                if meta.get('version'):
+                    packages.add(Package('npm', name, meta['version']))
+                stack.append(meta.get('dependencies', {}))
+    return sorted(packages)
+
+
+if __name__ == '__main__':
+    # python -m psuite.advisories <index.db> <dump> [<dump> ...]
+    index = AdvisoryIndex(sys.argv[1])
+    for dump in sys.argv[2:]:
+        print(f"{dump}: {index.refresh(dump)} advisories added or updated")
@@ -0,0 +1,158 @@
+# psuite/analyzers.py
+import os
+import re
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from importlib import metadata
+from . import metrics, toolchain
+from .cache import AssetCache, file_digest
+
+Issue = namedtuple('Issue', 'file line code message')
+
+ANALYZERS = {}
+
+def register(cls):
+    """Class decorator adding an analyzer to the registry; all registered analyzers run concurrently."""
+    ANALYZERS[cls.name] = cls()
+    return cls
+
+
+class Analyzer:
+    """
+    One external linter. `per_file` analyzers only look at one file at a time, so
+    their results are cached per file and only changed files are re-linted;
+    whole-program analyzers are cached for the project as a whole.
+    """
+    name = title = package = None
+    per_file = True
+    config_files = ()  # project files whose contents change the results
+    ok_exit_codes = (0,)
+
+    def command(self, paths, jobs):
+        raise NotImplementedError
+
+    def parse(self, stdout):
+        raise NotImplementedError
+
+    def version(self):
+        try:
+            return metadata.version(self.package)
+        except metadata.PackageNotFoundError:
+            return None
+
+    def config_digest(self, root):
+        digest = hashlib.sha256()
+        for name in self.config_files:
+            path = os.path.join(root, name)
+            if os.path.isfile(path):
+                digest.update(name.encode('utf-8') + b'\0' + file_digest(path).encode('ascii'))
+        return digest.hexdigest()
+
+    def run(self, root, paths, jobs, timeout_seconds):
+        toolchain.require(self.name)
+        result = metrics.run_command(self.command(paths, jobs), root, timeout_seconds, check=False)
+        if result.returncode not in self.ok_exit_codes:
+            raise RuntimeError(result.stderr.strip() or f"{self.package} failed with exit code {result.returncode}")
+        return self.parse(result.stdout)
+
+
+@register
+class Flake8(Analyzer):
+    name, title, package = 'flake8', 'Flake8 (Code Style)', 'flake8'
+    config_files = ('setup.cfg', 'tox.ini', '.flake8')
+    ok_exit_codes = (0, 1)
+
+    def command(self, paths, jobs):
+        return ['flake8', f'--jobs={jobs}', '--format=%(path)s\t%(row)d\t%(code)s\t%(text)s', '--', *paths]
+
+    def parse(self, stdout):
+        issues = []
+        for line in stdout.splitlines():
+            parts = line.split('\t', 3)
+            if len(parts) == 4:
+                issues.append(Issue(os.path.normpath(parts[0]), int(parts[1]), parts[2], parts[3]))
+        return issues
+
+
+@register
+class Vulture(Analyzer):
+    name, title, package = 'vulture', 'Vulture (Dead Code)', 'vulture'
+    per_file = False  # dead code is only dead with respect to the whole program
+    config_files = ('pyproject.toml',)
+    ok_exit_codes = (0, 3)
+    line_re = re.compile(r'^(.+?):(\d+): (.*)$')
+
+    def command(self, paths, jobs):
+        return ['vulture', '--', *paths]
+
+    def parse(self, stdout):
+        issues = []
+        for line in stdout.splitlines():
+            match = self.line_re.match(line.strip())
+            if match:
+                message = match.group(3)
+                code = '-'.join(message.split("'", 1)[0].split()[:2]).lower() or 'vulture'
+                issues.append(Issue(os.path.normpath(match.group(1)), int(match.group(2)), code, message))
+        return issues
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _run_per_file(analyzer, root, files, digests, cache, jobs, timeout_seconds):
+    version, config = analyzer.version(), analyzer.config_digest(root)
+    keys = {path: AssetCache.make_key(digests[path], analyzer.name, version, {'path': path, 'config': config})
+            for path in files}
+    issues, stale = [], []
+    for path in files:
+        cached = cache.get_value(keys[path]) if cache is not None else None
+        if cached is None:
+            stale.append(path)
+        else:
+            issues.extend(Issue(path, *record) for record in cached)
+    fresh = []
+    for chunk in _chunks(stale, 1000):  # keeps the command line well under ARG_MAX
+        fresh.extend(analyzer.run(root, chunk, jobs, timeout_seconds))
+    by_file = {path: [] for path in stale}
+    for issue in fresh:
+        by_file.setdefault(issue.file, []).append(issue)
+    if cache is not None:
+        for path in stale:
+            cache.put_value(keys[path], [[i.line, i.code, i.message] for i in by_file[path]])
+    return sorted(issues + fresh, key=lambda i: (i.file, i.line)), len(files) - len(stale)
+
+def _run_whole_program(analyzer, root, files, digests, cache, jobs, timeout_seconds):
+    tree = hashlib.sha256('\0'.join(f"{path}\0{digests[path]}" for path in files).encode('utf-8')).hexdigest()
+    key = AssetCache.make_key(tree, analyzer.name, analyzer.version(), {'config': analyzer.config_digest(root)})
+    cached = cache.get_value(key) if cache is not None else None
+    if cached is not None:
+        return [Issue(*record) for record in cached], len(files)
+    issues = analyzer.run(root, files, jobs, timeout_seconds)  # one call: it must see every module
+    if cache is not None:
+        cache.put_value(key, [list(issue) for issue in issues])
+    return issues, 0
+
+def run_analyzers(root, files, cache=None, jobs=1, timeout_seconds=120, analyzers=None, digests=None):
+    """
+    Runs every analyzer over `files` (paths relative to `root`) at the same time.
+    Returns {name: (issues, files_reused)} in registry order, with the exception
+    in place of the tuple when an analyzer fails. Known content `digests` are reused.
+    """
+    analyzers = list((analyzers or ANALYZERS).values())
+    digests = dict(digests or {})
+    for path in files:
+        if digests.get(path) is None:
+            digests[path] = file_digest(os.path.join(root, path))
+    with ThreadPoolExecutor(max_workers=len(analyzers) or 1) as pool:
+        futures = {a.name: pool.submit(_run_per_file if a.per_file else _run_whole_program,
+                                       a, root, files, digests, cache, jobs, timeout_seconds)
+                   for a in analyzers}
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            results[name] = e
+    return results
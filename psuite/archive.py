@@ -0,0 +1,78 @@
+# psuite/archive.py
+import os
+import zipfile
+
+CHUNK_SIZE = 1024 * 1024
+# Formats that are already compressed; deflating them again only burns CPU.
+STORED_EXTS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'avif', 'ico', 'woff', 'woff2', 'ttf', 'otf', 'eot',
+               'mp3', 'mp4', 'webm', 'ogg', 'pdf', 'zip', 'gz', 'br', 'bz2', 'xz', '7z'}
+
+
+def _compression_for(path):
+    ext = path.rsplit('.', 1)[1].lower() if '.' in path else ''
+    return zipfile.ZIP_STORED if ext in STORED_EXTS else zipfile.ZIP_DEFLATED
+
+
+class _ChunkSink:
+    """Write-only, unseekable file object that hands out what was written so far."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ArchiveWriter:
+    """
+    Appends files to a ZIP as soon as they are final, instead of archiving the whole
+    output directory at the end. Already-compressed formats are stored as-is.
+    """
+
+    def __init__(self, target, compresslevel=6):
+        self._zip = zipfile.ZipFile(target, 'w', compresslevel=compresslevel)
+
+    def _open(self, path, arcname):
+        # Opening by name makes ZipFile apply its own compression and compresslevel to the entry.
+        self._zip.compression = _compression_for(path)
+        return self._zip.open(arcname.replace('\\', '/'), 'w', force_zip64=os.path.getsize(path) > zipfile.ZIP64_LIMIT)
+
+    def add(self, path, arcname):
+        with open(path, 'rb') as src, self._open(path, arcname) as dst:
+            while chunk := src.read(CHUNK_SIZE):
+                dst.write(chunk)
+
+    def close(self):
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def stream_directory(directory, compresslevel=6):
+    """Yields a ZIP of `directory` chunk by chunk, without writing the archive to disk."""
+    sink = _ChunkSink()
+    writer = ArchiveWriter(sink, compresslevel)
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            with open(path, 'rb') as src, writer._open(path, os.path.relpath(path, directory)) as dst:
+                while chunk := src.read(CHUNK_SIZE):
+                    dst.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    writer.close()
+    yield sink.drain()
@@ -2,7 +2,9 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import login_user, logout_user, login_required, current_user
+from sqlalchemy.exc import IntegrityError
 from psuite.models import User
+from psuite.users import find_by_username_or_email
 from psuite import db
 
 auth_bp = Blueprint('auth', __name__, template_folder='../templates/auth')
@@ -28,12 +30,12 @@ def register():
         username = request.form['username']
         email = request.form['email']
         
-        # FIXED: Check for existing username OR email
-        if User.query.filter_by(username=username).first():
-            flash('Username already exists.', 'warning')
-            return redirect(url_for('auth.register'))
-        if User.query.filter_by(email=email).first():
-            flash('Email address is already registered.', 'warning')
+        # Check for existing username OR email in one indexed query
+        for existing in find_by_username_or_email(username, email):
+            if existing.username == username:
+                flash('Username already exists.', 'warning')
+            else:
+                flash('Email address is already registered.', 'warning')
             return redirect(url_for('auth.register'))
             
         hashed_pw = generate_password_hash(request.form['password'], method='pbkdf2:sha256')
@@ -42,7 +44,12 @@ def register():
         new_user = User(username=username, email=email, password_hash=hashed_pw)
         
         db.session.add(new_user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:  # registered concurrently since the check above
+            db.session.rollback()
+            flash('Username or email address is already registered.', 'warning')
+            return redirect(url_for('auth.register'))
         flash('Registration successful! Please log in.', 'success')
         return redirect(url_for('auth.login'))
     return render_template('register.html')
@@ -1,6 +1,7 @@
 # psuite/blueprints/main.py
 from flask import Blueprint, render_template
 from flask_login import login_required, current_user
+from psuite import storage
 
 main_bp = Blueprint('main', __name__, template_folder='../templates')
 
@@ -18,4 +19,4 @@ def pricing():
 def account():
     # FIXED: Removed confusing credit width calculation.
     # The new template handles this logic directly with the user object.
-    return render_template('account.html')
\ No newline at end of file
+    return render_template('account.html', storage_bytes=storage.user_usage(current_user.id))
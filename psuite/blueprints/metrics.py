@@ -0,0 +1,22 @@
+# psuite/blueprints/metrics.py
+import hmac
+from flask import Blueprint, Response, request, current_app, abort
+from psuite.models import MetricTotal
+from psuite.users import user_cache
+from psuite import metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def prometheus_metrics():
+    # Scrapers authenticate with a bearer token when METRICS_TOKEN is set.
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        abort(401)
+    totals = {}
+    for row in MetricTotal.query.all():
+        totals.setdefault((row.kind, row.name), {})[row.field] = row.value
+    cache = user_cache.stats()
+    extra = [('psuite_user_cache_hits_total', 'counter', "User cache hits in this web process.", cache['hits']),
+             ('psuite_user_cache_misses_total', 'counter', "User cache misses in this web process.", cache['misses'])]
+    return Response(metrics.render(totals, extra), mimetype='text/plain; version=0.0.4')
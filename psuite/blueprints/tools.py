@@ -2,14 +2,19 @@
 import os
 import uuid
 import zipfile
-import shutil
-from flask import (Blueprint, render_template, request, jsonify, 
+from flask import (Blueprint, Response, render_template, request, jsonify, 
                    send_from_directory, current_app)
 from flask_login import login_required, current_user
-from psuite import socketio, db
-from psuite.processing import (do_frontend_optimization, do_backend_analysis, 
-                               do_security_scan, generate_critical_css,
-                               send_status, cleanup)
+from flask_socketio import join_room
+from psuite import socketio, db, ledger, storage
+from psuite.models import Job, SessionStorage
+from psuite.users import user_cache
+from psuite.jobs import job_room, job_status, cancel_job, record_event, replay_job_events
+from psuite.archive import stream_directory
+from psuite.ingest import ArchiveExtractor, ArchiveRejected
+from psuite.manifest import ProjectManifest, archive_stamp
+from psuite.processing import cleanup
+from psuite.estimate import TOOLS, UploadProfile, estimate
 
 tools_bp = Blueprint('tools', __name__, template_folder='../templates')
 
@@ -40,25 +45,63 @@ def upload_files():
         return jsonify({'error': 'Invalid file type. Please upload a ZIP file.'}), 400
 
     session_id = str(uuid.uuid4())
-    unpacked_path = os.path.join(current_app.config['UNPACKED_FOLDER'], session_id)
     original_zip_path = os.path.join(current_app.config['ORIGINALS_FOLDER'], f"{session_id}.zip")
-    
-    os.makedirs(unpacked_path, exist_ok=True)
     os.makedirs(os.path.dirname(original_zip_path), exist_ok=True)
     
+    # Only the central directory is read here; the job extracts members as it processes them.
+    # It is also all the project manifest needs, so the tree is never walked for it.
     try:
         file.save(original_zip_path)
-        with zipfile.ZipFile(original_zip_path, 'r') as zf: zf.extractall(unpacked_path)
+        extractor = ArchiveExtractor(original_zip_path, None, current_app.config)
+        ProjectManifest.from_members(extractor.members, archive_stamp(original_zip_path)).save(
+            ProjectManifest.path_for(current_app.config['ORIGINALS_FOLDER'], session_id))
     except zipfile.BadZipFile:
-        cleanup(unpacked_path); cleanup(original_zip_path)
+        cleanup(original_zip_path)
         return jsonify({'error': 'The uploaded file is not a valid ZIP archive.'}), 400
+    except ArchiveRejected as e:
+        cleanup(original_zip_path)
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        cleanup(unpacked_path); cleanup(original_zip_path)
+        cleanup(original_zip_path)
         return jsonify({'error': f'An unexpected error occurred: {e}'}), 500
-        
+
+    storage.track(current_app.config, session_id, current_user.id)
     return jsonify({'session_id': session_id})
 
 
+def _owns_upload(session_id):
+    upload = db.session.get(SessionStorage, session_id)
+    return upload is not None and upload.user_id == current_user.id
+
+@tools_bp.route('/estimate', methods=['POST'])
+@login_required
+def estimate_run():
+    # Pre-flight preview: predicted time, peak memory and per-stage breakdown before any credits are spent.
+    data = request.get_json(silent=True) or {}
+    try:
+        session_id = str(uuid.UUID(data['session_id']))
+    except (KeyError, ValueError, TypeError):
+        return jsonify({'error': 'Invalid upload session.'}), 400
+    if data.get('tool') not in TOOLS:
+        return jsonify({'error': 'Unknown tool.'}), 400
+    if not _owns_upload(session_id):
+        return jsonify({'error': 'Upload not found.'}), 404
+    zip_path = os.path.join(current_app.config['ORIGINALS_FOLDER'], f"{session_id}.zip")
+    try:
+        extractor = ArchiveExtractor(zip_path, None, current_app.config)
+        profile = UploadProfile.from_archive(zip_path, extractor.members)
+    except (zipfile.BadZipFile, ArchiveRejected, OSError):
+        return jsonify({'error': 'Upload not found.'}), 404
+    est = estimate(data['tool'], profile, data.get('options') or {}, current_app.config, current_user.plan)
+    return jsonify(est.to_dict())
+
+
+@tools_bp.errorhandler(413)
+def upload_too_large(e):
+    limit_mb = current_app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({'error': f'The upload is larger than the {limit_mb} MB limit.'}), 413
+
+
 @tools_bp.route('/download-all/<filename>')
 @login_required
 def download_all_as_zip(filename):
@@ -66,60 +109,104 @@ def download_all_as_zip(filename):
     if '..' in filename or filename.startswith('/'): return "Invalid filename", 400
     directory = current_app.config['PROCESSED_FOLDER']
     zip_path = os.path.join(directory, filename)
-    if not os.path.exists(zip_path):
+    try:
+        session_id = str(uuid.UUID(filename.removeprefix('optimized_').removesuffix('.zip')))
+    except ValueError:
+        session_id = None
+    if os.path.exists(zip_path):
+        response = send_from_directory(directory, filename, as_attachment=True)
+        if session_id: storage.track(current_app.config, session_id, downloaded=True)
+        @response.call_on_close
+        def cleanup_zip():
+            try: os.remove(zip_path)
+            except Exception as e: print(f"Error cleaning up zip file {zip_path}: {e}")
+        return response
+
+    # ARCHIVE_MODE 'stream': the job left its output folder behind; zip it while sending.
+    processed_path = os.path.join(directory, session_id) if session_id else None
+    if processed_path is None or not os.path.isdir(processed_path):
         return "File not found or has already been downloaded and cleaned up.", 404
-    response = send_from_directory(directory, filename, as_attachment=True)
-    @response.call_on_close
-    def cleanup_zip():
-        try: os.remove(zip_path)
-        except Exception as e: print(f"Error cleaning up zip file {zip_path}: {e}")
+    storage.track(current_app.config, session_id, downloaded=True)
+    response = Response(stream_directory(processed_path, current_app.config['ARCHIVE_DEFLATE_LEVEL']),
+                        mimetype='application/zip',
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
+    response.call_on_close(lambda: cleanup(processed_path))
     return response
 
 
+# --- JOB API ---
+def _get_own_job(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None or job.user_id != current_user.id:
+        return None
+    return job
+
+@tools_bp.route('/jobs/<job_id>')
+@login_required
+def get_job(job_id):
+    job = _get_own_job(job_id)
+    if job is None: return jsonify({'error': 'Job not found.'}), 404
+    return jsonify(job_status(job))
+
+@tools_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job_route(job_id):
+    job = _get_own_job(job_id)
+    if job is None: return jsonify({'error': 'Job not found.'}), 404
+    return jsonify(job_status(cancel_job(job)))
+
+
 # --- WEBSOCKET HANDLERS ---
-# ... (code is identical to the fixed app.py, but now uses 'socketio' directly)
+# Handlers only queue a job; the worker pool runs it and its events reach the
+# client through the job's room, which survives page reloads.
+def _submit_job(tool, data):
+    sid = request.sid
+    try:
+        session_id = str(uuid.UUID(data['session_id']))
+    except (KeyError, ValueError, TypeError):
+        socketio.emit('processing_error', {'message': 'Invalid upload session.'}, room=sid); return
+    if not _owns_upload(session_id):
+        socketio.emit('processing_error', {'message': 'Upload not found.'}, room=sid); return
+    job_id = str(uuid.uuid4())
+    # The charge and the job are committed together, so a job always has its credits.
+    credits = ledger.charge(current_user.id, ledger.JOB_COST, job_id)
+    if credits is None: socketio.emit('processing_error', {'message': 'Insufficient credits.'}, room=sid); return
+    job = Job(id=job_id, user_id=current_user.id, tool=tool, session_id=session_id,
+              options=data.get('options', {}), plan=current_user.plan)
+    db.session.add(job); db.session.commit()
+    user_cache.invalidate(current_user.id)
+    join_room(job_room(job.id))
+    record_event(job.id, 'status_update', {'message': 'Job queued. Waiting for a free worker...', 'type': 'info'})
+    socketio.emit('job_submitted', {'job_id': job.id}, room=sid)
+    socketio.emit('credits_updated', {'credits': credits}, room=sid)
+
 @socketio.on('run_frontend_optimization')
 @login_required
 def handle_frontend_optimization(data):
-    if current_user.credits < 1: socketio.emit('processing_error', {'message': 'Insufficient credits.'}, room=request.sid); return
-    current_user.credits -= 1; db.session.commit()
-    
-    sid, session_id, options = request.sid, data['session_id'], data.get('options', {})
-    unpacked_path = os.path.join(current_app.config['UNPACKED_FOLDER'], session_id)
-    processed_path = os.path.join(current_app.config['PROCESSED_FOLDER'], session_id)
-    final_zip_name = f"optimized_{session_id}.zip"
-    final_zip_path_base = os.path.join(current_app.config['PROCESSED_FOLDER'], f"optimized_{session_id}")
-    
-    try:
-        file_reports = do_frontend_optimization(unpacked_path, processed_path, options, sid)
-        if current_user.plan == 'pro' and options.get('generate_critical_css'):
-            generate_critical_css(processed_path, sid)
-        send_status(sid, "Finalizing and creating ZIP archive...", 'info')
-        shutil.make_archive(final_zip_path_base, 'zip', processed_path)
-        send_status(sid, "Archive created successfully.", 'success')
-        socketio.emit('processing_complete', {'final_zip_name': final_zip_name, 'file_tree': file_reports}, room=sid)
-    except Exception as e:
-        send_status(sid, f"A critical error occurred: {e}", 'error')
-        socketio.emit('processing_error', {'message': str(e)}, room=sid)
-    finally:
-        cleanup(unpacked_path); cleanup(processed_path)
-        socketio.emit('credits_updated', {'credits': current_user.credits}, room=sid)
-
+    _submit_job('frontend_optimization', data)
 
 @socketio.on('run_backend_analysis')
 @login_required
 def handle_backend_analysis(data):
-    if current_user.credits < 1: socketio.emit('processing_error', {'message': 'Insufficient credits.'}, room=request.sid); return
-    current_user.credits -= 1; db.session.commit()
-    sid, session_id = request.sid, data['session_id']
-    unpacked_path = os.path.join(current_app.config['UNPACKED_FOLDER'], session_id)
-    try:
-        do_backend_analysis(unpacked_path, sid)
-        socketio.emit('analysis_complete', room=sid)
-    except Exception as e:
-        send_status(sid, f"A critical error occurred: {e}", 'error')
-    finally:
-        cleanup(unpacked_path)
-        socketio.emit('credits_updated', {'credits': current_user.credits}, room=sid)
+    _submit_job('backend_analysis', data)
+
+@socketio.on('run_security_scan')
+@login_required
+def handle_security_scan(data):
+    _submit_job('security_scan', data)
+
+@socketio.on('resume_job')
+@login_required
+def handle_resume_job(data):
+    job = _get_own_job(data.get('job_id'))
+    if job is None: socketio.emit('job_status', {'job_id': data.get('job_id'), 'status': 'unknown'}, room=request.sid); return
+    join_room(job_room(job.id))
+    socketio.emit('job_status', job_status(job), room=request.sid)
+    replay_job_events(job.id, request.sid, after_id=data.get('last_event_id') or 0)
 
-# ... handle_security_scan follows the same pattern ...
\ No newline at end of file
+@socketio.on('cancel_job')
+@login_required
+def handle_cancel_job(data):
+    job = _get_own_job(data.get('job_id'))
+    if job is not None:
+        socketio.emit('job_status', job_status(cancel_job(job)), room=request.sid)
@@ -0,0 +1,136 @@
+# psuite/cache.py
+import os
+import json
+import hashlib
+import tempfile
+from . import storage
+
+
+def file_digest(path):
+    """Returns the hex SHA-256 of a file's contents."""
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+class AssetCache:
+    """
+    Content-addressed store for tool outputs, shared by every session.
+    Each entry is an artifact file plus a small JSON sidecar; entries are evicted
+    least-recently-used first once the store grows past `max_bytes`.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def make_key(digest, tool, version, options=None):
+        payload = json.dumps([digest, tool, version, options or {}], sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.root, key[:2], key)
+        return base + '.bin', base + '.json'
+
+    def get(self, key, out_path):
+        """Copies a cached artifact to `out_path`. Returns its metadata, or None on a miss."""
+        blob_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            storage.clone(blob_path, out_path)
+            os.utime(blob_path)  # mtime doubles as the LRU timestamp
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return meta
+
+    def put(self, key, src_path, **meta):
+        """Stores `src_path` under `key` along with any JSON-serializable metadata."""
+        blob_path, meta_path = self._paths(key)
+        try:
+            replaced = self._write_blob(blob_path, lambda tmp_path: storage.clone(src_path, tmp_path))
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+        except OSError:
+            return
+        self._stored(blob_path, replaced)
+
+    def get_value(self, key):
+        """Returns a JSON value stored with put_value, or None on a miss."""
+        blob_path, _ = self._paths(key)
+        try:
+            with open(blob_path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            os.utime(blob_path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put_value(self, key, value):
+        """Stores a JSON-serializable value (e.g. analyzer results) under `key`."""
+        blob_path, _ = self._paths(key)
+        def write(tmp_path):
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+        try:
+            replaced = self._write_blob(blob_path, write)
+        except OSError:
+            return
+        self._stored(blob_path, replaced)
+
+    def _write_blob(self, blob_path, write):
+        """Atomically writes a blob. Returns the size of the blob it replaced, 0 if new."""
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path))
+        os.close(fd)
+        try:
+            write(tmp_path)
+            try:
+                replaced = os.path.getsize(blob_path)
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, blob_path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return replaced
+
+    def _stored(self, blob_path, replaced=0):
+        if self._size is not None:
+            self._size += os.path.getsize(blob_path) - replaced
+        self._evict()
+
+    def _entries(self):
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.bin'):
+                    stat = entry.stat()
+                    yield stat.st_mtime, stat.st_size, entry.path
+
+    def _evict(self):
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        if self._size <= self.max_bytes:
+            return
+        for _, size, blob_path in sorted(self._entries()):
+            for path in (blob_path, blob_path[:-len('.bin')] + '.json'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._size -= size
+            if self._size <= self.max_bytes:
+                break
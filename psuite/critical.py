@@ -0,0 +1,96 @@
+# psuite/critical.py
+import os
+import re
+import hashlib
+import tempfile
+from . import node_workers, toolchain
+
+STYLESHEET_LINK = re.compile(r'<link\b[^>]*\brel\s*=\s*["\']?stylesheet["\']?[^>]*>', re.IGNORECASE)
+REL_STYLESHEET = re.compile(r'\brel\s*=\s*["\']?stylesheet["\']?', re.IGNORECASE)
+HREF = re.compile(r'\bhref\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.IGNORECASE)
+START_TAG = re.compile(r'<([a-zA-Z][\w-]*)([^>]*)>')
+ATTR = re.compile(r'\b(class|id)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.IGNORECASE)
+HEAD_END = re.compile(r'</head\s*>', re.IGNORECASE)
+
+
+def stylesheets(html, page_path, base):
+    """Local stylesheets linked from a page, as absolute paths under `base`."""
+    paths = []
+    for tag in STYLESHEET_LINK.findall(html):
+        match = HREF.search(tag)
+        href = next((g for g in match.groups() if g), '') if match else ''
+        href = href.split('?', 1)[0].split('#', 1)[0]
+        if not href or re.match(r'^(?:[a-z]+:)?//', href, re.IGNORECASE) or href.startswith('data:'):
+            continue
+        path = os.path.join(base, href.lstrip('/')) if href.startswith('/') else os.path.join(os.path.dirname(page_path), href)
+        path = os.path.normpath(path)
+        if path.startswith(os.path.normpath(base) + os.sep) and os.path.isfile(path):
+            paths.append(path)
+    return paths
+
+def layout_signature(html):
+    """Hash of the page skeleton (tags, ids and classes), ignoring text content."""
+    digest = hashlib.sha256()
+    for name, attrs in START_TAG.findall(html):
+        parts = [name.lower()]
+        for attr, *values in ATTR.findall(attrs):
+            value = next((v for v in values if v), '')
+            parts.append(f"{attr.lower()}={' '.join(sorted(value.split()))}")
+        digest.update(' '.join(parts).encode('utf-8') + b'\n')
+    return digest.hexdigest()
+
+def inline_critical(html, css):
+    """Inlines `css` ahead of the stylesheets and turns them into non-blocking preloads."""
+    style = f'<style>{css}</style>'
+    first = STYLESHEET_LINK.search(html)
+    if first:
+        html = html[:first.start()] + style + html[first.start():]
+    else:
+        head_end = HEAD_END.search(html)
+        if head_end is None:
+            return style + html
+        html = html[:head_end.start()] + style + html[head_end.start():]
+
+    def defer(match):
+        tag = match.group(0)
+        preload = REL_STYLESHEET.sub('rel="preload" as="style" onload="this.onload=null;this.rel=\'stylesheet\'"', tag, count=1)
+        return f'{preload}<noscript>{tag}</noscript>'
+    return STYLESHEET_LINK.sub(defer, html)
+
+def inline_into(html_path, css):
+    """Rewrites a page with `css` inlined, replacing the file atomically."""
+    with open(html_path, 'r', encoding='utf-8', errors='replace') as f:
+        html = inline_critical(f.read(), css)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(html_path), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(html)
+    os.replace(tmp_path, html_path)
+
+
+def extract(html_path, base, viewports, timeout_seconds, span=None):
+    """
+    Critical CSS of one page across all `viewports` ((width, height) pairs). Runs on a
+    pooled Node worker that keeps its headless browser open between pages; without
+    one, falls back to one `critical` CLI run per viewport. Those runs are traced on
+    their own, so the caller's `span` is then skipped.
+    """
+    from .processing import _run_command
+    options = {'base': base, 'dimensions': [{'width': w, 'height': h} for w, h in viewports],
+               'timeout': timeout_seconds * 1000}
+    fd, out_path = tempfile.mkstemp(suffix='.css')
+    os.close(fd)
+    try:
+        if node_workers.run_tool('critical', html_path, out_path, options, timeout_seconds):
+            with open(out_path, 'r', encoding='utf-8') as f:
+                return f.read()
+    finally:
+        os.remove(out_path)
+    toolchain.require('critical')
+    if span is not None:
+        span.skip = True
+    chunks = []
+    for width, height in viewports:
+        result = _run_command(['critical', html_path, '--base', base, '-w', str(width), '-h', str(height)],
+                              cwd=base, timeout_seconds=timeout_seconds, in_path=html_path)
+        chunks.append(result.stdout.strip())
+    return '\n'.join(chunks)
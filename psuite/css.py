@@ -0,0 +1,248 @@
+# psuite/css.py
+import os
+import re
+import time
+import tempfile
+import functools
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+CssResult = namedtuple('CssResult', 'original_size purged_bytes minified_bytes new_size seconds cpu_seconds')
+
+# Words as purgecss' default extractor sees them: class, id and tag names all show up here.
+CONTENT_TOKEN = re.compile(rb'[A-Za-z0-9_-]+')
+# Grouping at-rules whose body is more rules; every other block (@keyframes, @font-face,
+# @page...) is kept as a whole and only minified.
+GROUPING_AT_RULES = {'media', 'supports', 'layer', 'container', 'document', '-moz-document', 'scope'}
+# Selector parts that are never matched against content.
+ALWAYS_USED = {'html', 'body', '*'}
+SMALL_CSS_BYTES = 1024 * 1024  # below this, a process pool costs more than it saves
+
+_STRING_OR_COMMENT = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/)|(\s+)', re.DOTALL)
+_SELECTOR_PUNCT = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|\s*([,>+~])\s*')
+_DECL_PUNCT = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|\s*([{};:,])\s*|(\()\s+|\s+(\))')
+_PRELUDE_PUNCT = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|\s*([:,])\s*|(\()\s+|\s+(\))')
+_PSEUDO = re.compile(r'::?[\w-]+(\((?:[^()]|\([^()]*\))*\))?')
+_ATTRIBUTE = re.compile(r'\[[^\]]*\]')
+_SELECTOR_TOKEN = re.compile(r'([.#]?)(-?[_a-zA-Z][\w-]*)')
+
+
+# --- USAGE INDEX ---
+
+def build_usage_index(paths):
+    """Every word in the given HTML/JS files, read once; selectors are purged against it."""
+    used = set()
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                used.update(token.decode('ascii') for token in CONTENT_TOKEN.findall(f.read()))
+        except OSError:
+            continue
+    return frozenset(used)
+
+def _selector_used(selector, used, safelist, patterns):
+    if '\\' in selector:
+        return True  # escaped names (e.g. md\:flex) are not worth guessing at
+    bare = _ATTRIBUTE.sub(' ', _PSEUDO.sub(' ', selector))
+    for prefix, name in _SELECTOR_TOKEN.findall(bare):
+        if name in ALWAYS_USED or name in safelist or any(p.search(name) for p in patterns):
+            continue
+        if name not in used and not (prefix == '' and name.lower() in used):
+            return False
+    return True
+
+
+# --- PARSER ---
+
+def _scan_to(css, i, stops):
+    """Index of the first char in `stops` at nesting depth 0, skipping strings and comments."""
+    depth, n = 0, len(css)
+    while i < n:
+        c = css[i]
+        if c in '"\'':
+            end = css.find(c, i + 1)
+            while end != -1 and css[end - 1] == '\\':
+                end = css.find(c, end + 1)
+            i = n if end == -1 else end + 1
+            continue
+        if c == '/' and css.startswith('/*', i):
+            end = css.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        if c in '([':
+            depth += 1
+        elif c in ')]':
+            depth = max(depth - 1, 0)
+        elif depth == 0 and c in stops:
+            return i
+        i += 1
+    return n
+
+def _block_end(css, i):
+    """Index of the '}' closing a block whose body starts at `i`."""
+    depth = 1
+    while True:
+        i = _scan_to(css, i, '{}')
+        if i >= len(css):
+            return i
+        depth += 1 if css[i] == '{' else -1
+        if depth == 0:
+            return i
+        i += 1
+
+def parse(css, i=0):
+    """
+    Parses a stylesheet into ('rule', selector, body), ('group', prelude, children),
+    ('block', prelude, body), ('statement', text) and ('comment', text) nodes, each
+    paired with the number of source bytes it spans. Returns (nodes, end).
+    """
+    nodes, n = [], len(css)
+    while i < n:
+        while i < n and css[i].isspace():
+            i += 1
+        if i >= n:
+            break
+        start = i
+        if css.startswith('/*', i):
+            end = css.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            if css.startswith('/*!', start):
+                nodes.append((('comment', css[start:i]), i - start))
+            continue
+        if css[i] == '}':
+            return nodes, i + 1
+        stop = _scan_to(css, i, '{;}')
+        prelude = css[i:stop].strip()
+        if stop >= n or css[stop] != '{':
+            if prelude:
+                nodes.append((('statement', prelude), stop + 1 - start))
+            i = stop + 1 if stop < n and css[stop] == ';' else stop
+            continue
+        at_name = prelude[1:].split(None, 1)[0].split('(', 1)[0].lower() if prelude.startswith('@') else None
+        if at_name in GROUPING_AT_RULES:
+            children, i = parse(css, stop + 1)
+            nodes.append((('group', prelude, children), i - start))
+            continue
+        end = _block_end(css, stop + 1)
+        body = css[stop + 1:end]
+        i = end + 1
+        nodes.append((('block' if at_name else 'rule', prelude, body), i - start))
+    return nodes, i
+
+
+# --- MINIFIER ---
+
+def _collapse(text):
+    """Drops comments and collapses whitespace, leaving strings untouched."""
+    def repl(match):
+        string, comment, _ = match.groups()
+        return string if string else '' if comment else ' '
+    return _STRING_OR_COMMENT.sub(repl, text).strip()
+
+def _tighten(pattern, text):
+    return pattern.sub(lambda m: next(g for g in m.groups() if g is not None), _collapse(text))
+
+def _split_selectors(selector):
+    parts, i = [], 0
+    while i <= len(selector):
+        stop = _scan_to(selector, i, ',')
+        parts.append(selector[i:stop])
+        i = stop + 1
+    return parts
+
+def _minify_body(body):
+    body = _tighten(_DECL_PUNCT, body)
+    while ';;' in body:
+        body = body.replace(';;', ';')
+    return body.replace(';}', '}').strip(';')
+
+def _serialize(nodes, used, safelist, patterns):
+    """Returns (minified css, source bytes dropped by the purge)."""
+    out, purged = [], 0
+    for node, span in nodes:
+        kind = node[0]
+        if kind == 'comment':
+            out.append(node[1])
+        elif kind == 'statement':
+            out.append(_tighten(_PRELUDE_PUNCT, node[1]) + ';')
+        elif kind == 'group':
+            inner, inner_purged = _serialize(node[2], used, safelist, patterns)
+            if inner:
+                out.append(f"{_tighten(_PRELUDE_PUNCT, node[1])}{{{inner}}}")
+                purged += inner_purged
+            else:
+                purged += span
+        elif kind == 'block':
+            out.append(f"{_tighten(_PRELUDE_PUNCT, node[1])}{{{_minify_body(node[2])}}}")
+        else:
+            selectors = _split_selectors(node[1])
+            if used is not None:
+                kept = [s for s in selectors if _selector_used(s, used, safelist, patterns)]
+                if not kept:
+                    purged += span
+                    continue
+                purged += sum(len(s) + 1 for s in selectors if s not in kept)
+                selectors = kept
+            body = _minify_body(node[2])
+            if body:
+                out.append(f"{','.join(_tighten(_SELECTOR_PUNCT, s) for s in selectors)}{{{body}}}")
+    return ''.join(out), purged
+
+def optimize(css, used=None, safelist=(), patterns=()):
+    """
+    Purges (when a usage index is given) and minifies a stylesheet in one parse.
+    Returns (css, bytes removed by the purge); the rest of the size change is minification.
+    """
+    nodes, i = parse(css)
+    while i < len(css):  # a stray '}' ends parse() early; carry on after it
+        more, i = parse(css, i)
+        nodes.extend(more)
+    return _serialize(nodes, used, frozenset(safelist), [re.compile(p) for p in patterns])
+
+
+# --- STYLESHEETS ---
+
+_worker_args = None
+
+def _init_worker(used, safelist, patterns):
+    global _worker_args
+    _worker_args = (used, safelist, patterns)
+
+def _optimize_file(path):
+    started, cpu = time.perf_counter(), time.thread_time()
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            source = f.read()
+        css, purged = optimize(source, *_worker_args)
+        original_size = os.path.getsize(path)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(css)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        return path, e
+    new_size = os.path.getsize(path)
+    purged = min(purged, original_size - new_size) if new_size < original_size else 0
+    return path, CssResult(original_size, purged, original_size - new_size - purged, new_size,
+                           time.perf_counter() - started, time.thread_time() - cpu)
+
+@functools.lru_cache(maxsize=1)
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+def optimize_stylesheets(paths, used=None, safelist=(), patterns=(), workers=None):
+    """
+    Purges and minifies every stylesheet in place, in parallel when there is enough CSS.
+    Yields (path, CssResult) as they finish, or (path, exception) for a stylesheet that failed.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) < 2 or sum(os.path.getsize(p) for p in paths) < SMALL_CSS_BYTES:
+        _init_worker(used, safelist, patterns)
+        for path in paths:
+            yield _optimize_file(path)
+        return
+    with ProcessPoolExecutor(min(workers, len(paths)), mp_context=_mp_context(), initializer=_init_worker,
+                             initargs=(used, safelist, patterns)) as pool:
+        yield from pool.map(_optimize_file, paths)
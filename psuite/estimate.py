@@ -0,0 +1,319 @@
+# psuite/estimate.py
+import math
+import struct
+import zipfile
+from .advisories import has_advisories
+from .processing import IMAGE_EXTS, PROCESS_POOL_EXTS
+from .scanner import SCAN_EXTS, SMALL_SCAN_BYTES
+
+MB = 1024 * 1024
+TOOLS = ('frontend_optimization', 'backend_analysis', 'security_scan')
+NODE_EXTS = {'js', 'svg'}  # run on the Node daemons, whose pool size bounds them instead
+
+# A series needs this many fitted calls before its own history replaces the prior.
+MIN_SAMPLES = 20
+# Priors for each traced (kind, name): (seconds per call, seconds per MB of input).
+PRIORS = {
+    ('filetype', 'jpg'): (0.02, 0.6), ('filetype', 'jpeg'): (0.02, 0.6), ('filetype', 'png'): (0.02, 1.5),
+    ('filetype', 'svg'): (0.3, 2.0), ('filetype', 'js'): (0.4, 4.0), ('filetype', 'html'): (0.005, 0.2),
+    ('stage', 'css'): (0.01, 0.5), ('stage', 'sri'): (0.005, 0.05), ('stage', 'archive'): (0.01, 0.05),
+    ('stage', 'extract'): (0.01, 0.02), ('stage', 'analysis'): (1.0, 4.0), ('stage', 'source-scan'): (0.05, 0.05),
+    ('tool', 'critical'): (3.0, 0.0), ('tool', 'pip-audit'): (8.0, 0.0), ('tool', 'npm'): (6.0, 0.0),
+}
+DEFAULT_PRIOR = (0.001, 0.02)  # files that are only copied
+# Resident size before any work: a warmed pool worker, a Node daemon, a linter, a headless browser.
+BASE_RSS_MB = {'worker': 70, 'node': 60, 'linter': 50, 'critical': 300}
+# Decoded pixels take 4 bytes (RGBA), and transposing or quantizing holds about two more copies.
+IMAGE_BYTES_PER_PIXEL = 3 * 4
+# Image headers read to find dimensions; past IMAGE_SAMPLE images the rest are extrapolated
+# from the pixels per byte of the largest ones, which are measured first.
+IMAGE_HEADER_BYTES = 256 * 1024
+IMAGE_SAMPLE = 200
+# Timeouts are this multiple of the predicted time, within these bounds (seconds).
+TIMEOUT_FACTOR = 10
+FILE_TIMEOUT = (30, 600)
+STAGE_TIMEOUT = (120, 1800)
+
+
+def _ext(rel_path):
+    name = rel_path.rsplit('/', 1)[-1]
+    return name.rsplit('.', 1)[1].lower() if '.' in name else ''
+
+def _clamp(value, bounds):
+    return int(min(max(value, bounds[0]), bounds[1]))
+
+
+# --- SAMPLING ---
+
+def image_size(f):
+    """(width, height) from the header of a PNG or JPEG read from the file object `f`, or None."""
+    buf = f.read(24)
+    if buf[:8] == b'\x89PNG\r\n\x1a\n' and buf[12:16] == b'IHDR':
+        return struct.unpack('>II', buf[16:24])
+    if buf[:2] != b'\xff\xd8':
+        return None
+    pos = 2
+    while pos + 9 <= IMAGE_HEADER_BYTES:
+        while len(buf) < pos + 9:
+            chunk = f.read(max(4096, pos + 9 - len(buf)))
+            if not chunk:
+                return None
+            buf += chunk
+        if buf[pos] != 0xFF:
+            return None
+        marker = buf[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+        elif marker == 0x01 or 0xD0 <= marker <= 0xD8:  # markers without a length
+            pos += 2
+        elif 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):  # start of frame
+            height, width = struct.unpack('>HH', buf[pos + 5:pos + 9])
+            return width, height
+        else:
+            pos += 2 + struct.unpack('>H', buf[pos + 2:pos + 4])[0]
+    return None
+
+
+class UploadProfile:
+    """
+    What the cost of a run depends on, sampled from an upload's central directory and
+    image headers before anything is extracted: per-path sizes, image pixel counts and
+    whether the dependency manifests are present.
+    """
+
+    def __init__(self, sizes, pixels):
+        self.sizes = sizes
+        self.pixels = pixels
+
+    @classmethod
+    def from_archive(cls, zip_path, members):
+        """Profiles the (ZipInfo, rel_path) pairs of an ingest.ArchiveExtractor."""
+        sizes = {rel_path: info.file_size for info, rel_path in members}
+        images = sorted(((info, rel_path) for info, rel_path in members if _ext(rel_path) in IMAGE_EXTS),
+                        key=lambda member: member[0].file_size, reverse=True)
+        pixels, measured_bytes = {}, 0
+        with zipfile.ZipFile(zip_path) as zf:
+            for info, rel_path in images[:IMAGE_SAMPLE]:
+                try:
+                    with zf.open(info) as f:
+                        size = image_size(f)
+                except (OSError, zipfile.BadZipFile, struct.error):
+                    size = None
+                if size:
+                    pixels[rel_path] = size[0] * size[1]
+                    measured_bytes += info.file_size
+        ratio = sum(pixels.values()) / measured_bytes if measured_bytes else 0
+        for info, rel_path in images[IMAGE_SAMPLE:]:
+            pixels[rel_path] = int(info.file_size * ratio)
+        return cls(sizes, pixels)
+
+    def paths(self, exts=None, skip_dirs=()):
+        skip_dirs = set(skip_dirs)
+        return [p for p in self.sizes if (exts is None or _ext(p) in exts) and not skip_dirs.intersection(p.split('/')[:-1])]
+
+    def bytes(self, paths):
+        return sum(self.sizes[p] for p in paths)
+
+    def summary(self):
+        """Counts and bytes per file type, plus image and JS details, for the preview."""
+        types = {}
+        for rel_path, size in self.sizes.items():
+            entry = types.setdefault(_ext(rel_path) or 'other', {'count': 0, 'bytes': 0})
+            entry['count'] += 1
+            entry['bytes'] += size
+        js = sorted(self.sizes[p] for p in self.paths({'js'}))
+        return {'files': len(self.sizes), 'bytes': sum(self.sizes.values()),
+                'types': dict(sorted(types.items(), key=lambda item: -item[1]['bytes'])),
+                'images': {'count': len(self.pixels), 'megapixels': round(sum(self.pixels.values()) / 1e6, 1),
+                           'max_megapixels': round(max(self.pixels.values(), default=0) / 1e6, 1)},
+                'js_modules': {'count': len(js), 'median_bytes': js[len(js) // 2] if js else 0,
+                               'max_bytes': js[-1] if js else 0},
+                'package_lock': 'package-lock.json' in self.sizes,
+                'requirements': 'requirements.txt' in self.sizes}
+
+
+# --- COST MODEL ---
+
+class CostModel:
+    """
+    Predicts the wall time of one call of a traced stage, tool or file type as
+    a + b * MB in. a and b are fitted by least squares to the sums metrics.persist()
+    keeps for every run; series with too little history use PRIORS instead.
+    """
+
+    def __init__(self, totals):
+        self.totals = totals
+        self._fits = {}
+
+    @classmethod
+    def load(cls):
+        from .models import MetricTotal
+        totals = {}
+        for row in MetricTotal.query.filter(MetricTotal.kind.in_(('stage', 'tool', 'filetype'))):
+            totals.setdefault((row.kind, row.name), {})[row.field] = row.value
+        return cls(totals)
+
+    def fit(self, kind, name):
+        """(seconds per call, seconds per MB, 'history' or 'prior') for one series."""
+        key = (kind, name)
+        if key not in self._fits:
+            fields = self.totals.get(key, {})
+            n = fields.get('fit:n', 0)
+            if n < MIN_SAMPLES:
+                self._fits[key] = PRIORS.get(key, DEFAULT_PRIOR) + ('prior',)
+            else:
+                sx, sy, sxx, sxy = (fields.get(f'fit:{f}', 0) for f in ('x', 'y', 'xx', 'xy'))
+                spread = n * sxx - sx * sx
+                slope = max((n * sxy - sx * sy) / spread, 0.0) if spread > 1e-12 else 0.0
+                self._fits[key] = (max((sy - slope * sx) / n, 0.0), slope, 'history')
+        return self._fits[key]
+
+    def seconds(self, kind, name, nbytes=0):
+        per_call, per_mb, _ = self.fit(kind, name)
+        return per_call + per_mb * nbytes / MB
+
+    def rss_mb(self, kind, name, default):
+        """Peak RSS seen for a series' child processes, or `default` when none was recorded."""
+        kb = self.totals.get((kind, name), {}).get('max_rss_kb', 0)
+        return kb / 1024 if kb else default
+
+
+# --- ESTIMATES ---
+
+class Estimate:
+    """
+    Predicted runtime and peak memory of each stage of one run, plus the schedule
+    derived from them: worker count, per-file-type and per-stage timeouts, and a
+    per-file cost used to start the most expensive files first.
+    """
+
+    def __init__(self, tool, profile, model):
+        self.tool = tool
+        self.profile = profile
+        self.model = model
+        self.stages = []
+        self.workers = 1
+        self.file_timeouts = {}
+        self.stage_timeouts = {}
+
+    def add_stage(self, name, seconds, peak_mb, basis):
+        self.stages.append({'stage': name, 'seconds': round(seconds, 2), 'peak_mb': round(peak_mb), 'basis': basis})
+
+    @property
+    def seconds(self):
+        return sum(stage['seconds'] for stage in self.stages)
+
+    @property
+    def peak_mb(self):
+        return max((stage['peak_mb'] for stage in self.stages), default=0)
+
+    def file_seconds(self, rel_path, size):
+        return self.model.seconds('filetype', _ext(rel_path) or 'other', size)
+
+    def describe(self):
+        return (f"Estimated run time ~{self.seconds:.0f}s, peak memory ~{self.peak_mb} MB "
+                f"({len(self.profile.sizes)} files, {self.workers} worker(s)).")
+
+    def to_dict(self):
+        return {'tool': self.tool, 'seconds': round(self.seconds, 1), 'peak_mb': self.peak_mb, 'workers': self.workers,
+                'stages': self.stages, 'file_timeouts': self.file_timeouts, 'stage_timeouts': self.stage_timeouts,
+                'profile': self.profile.summary()}
+
+
+def _basis(*fits):
+    return 'history' if fits and all(fit[2] == 'history' for fit in fits) else 'prior'
+
+def _makespan(costs, workers):
+    """Time to run `costs` on `workers` slots, largest first: the slower of the even split and the longest job."""
+    return max(sum(costs) / workers, max(costs)) if costs else 0.0
+
+def _frontend(est, options, config, plan):
+    profile, model = est.profile, est.model
+    paths = profile.paths()
+    costs = {p: est.file_seconds(p, profile.sizes[p]) for p in paths}
+    image_mb = sorted((px * IMAGE_BYTES_PER_PIXEL / MB for px in profile.pixels.values()), reverse=True)
+    # Every pool worker may decode one of the largest images at the same time.
+    per_worker_mb = BASE_RSS_MB['worker'] + (image_mb[0] if image_mb else 0)
+    budget_mb = config['RUN_MEMORY_BUDGET_BYTES'] / MB
+    workers = min(config.get('OPTIMIZER_MAX_WORKERS') or 1, max(len(paths), 1))
+    est.workers = max(1, min(workers, int(budget_mb // per_worker_mb)))
+
+    pool = [costs[p] for p in paths if _ext(p) in PROCESS_POOL_EXTS]
+    node = [costs[p] for p in paths if _ext(p) in NODE_EXTS]
+    rest = [costs[p] for p in paths if _ext(p) not in PROCESS_POOL_EXTS | NODE_EXTS]
+    node_slots = max(1, min(est.workers, config.get('NODE_WORKER_POOL_SIZE') or 1))
+    seconds = max(_makespan(pool, est.workers), _makespan(node, node_slots)) + _makespan(rest, est.workers)
+    peak = BASE_RSS_MB['worker'] + (est.workers * BASE_RSS_MB['worker'] + sum(image_mb[:est.workers]) if pool else 0)
+    if node:
+        peak += node_slots * model.rss_mb('tool', 'terser', BASE_RSS_MB['node'])
+    exts = {_ext(p) for p in paths}
+    est.add_stage('optimize-files', seconds, peak, _basis(*(model.fit('filetype', e or 'other') for e in exts)))
+    for ext in exts & NODE_EXTS:
+        largest = max(profile.sizes[p] for p in profile.paths({ext}))
+        est.file_timeouts[ext] = _clamp(TIMEOUT_FACTOR * model.seconds('filetype', ext, largest), FILE_TIMEOUT)
+
+    css_bytes = profile.bytes(profile.paths({'css'}))
+    if css_bytes:
+        est.add_stage('css', model.seconds('stage', 'css', css_bytes), BASE_RSS_MB['worker'] * (1 + est.workers),
+                      _basis(model.fit('stage', 'css')))
+    pages = profile.paths({'html', 'htm'})
+    if options.get('add_sri') and pages:
+        est.add_stage('sri', model.seconds('stage', 'sri', profile.bytes(pages)), BASE_RSS_MB['worker'],
+                      _basis(model.fit('stage', 'sri')))
+    if plan == 'pro' and options.get('generate_critical_css') and pages:
+        slots = max(1, min(config.get('CRITICAL_CONCURRENCY') or 1, len(pages)))
+        est.add_stage('critical-css', model.seconds('tool', 'critical') * math.ceil(len(pages) / slots),
+                      BASE_RSS_MB['worker'] + slots * model.rss_mb('tool', 'critical', BASE_RSS_MB['critical']),
+                      _basis(model.fit('tool', 'critical')))
+    if config['ARCHIVE_MODE'] == 'eager':
+        est.add_stage('archive', model.seconds('stage', 'archive', profile.bytes(paths)), BASE_RSS_MB['worker'],
+                      _basis(model.fit('stage', 'archive')))
+
+def _extract(est):
+    total = est.profile.bytes(est.profile.paths())
+    est.add_stage('extract', est.model.seconds('stage', 'extract', total), BASE_RSS_MB['worker'],
+                  _basis(est.model.fit('stage', 'extract')))
+
+def _backend(est, config):
+    model, py_files = est.model, est.profile.paths({'py'}, config['SCAN_SKIP_DIRS'])
+    _extract(est)
+    est.workers = max(1, min(config['ANALYSIS_JOBS'], len(py_files)))
+    seconds = model.seconds('stage', 'analysis', est.profile.bytes(py_files)) if py_files else 0.0
+    linters = model.rss_mb('tool', 'flake8', BASE_RSS_MB['linter']) * est.workers + model.rss_mb('tool', 'vulture', BASE_RSS_MB['linter'])
+    est.add_stage('analysis', seconds, BASE_RSS_MB['worker'] + linters, _basis(model.fit('stage', 'analysis')))
+    est.stage_timeouts['analysis'] = _clamp(TIMEOUT_FACTOR * seconds, STAGE_TIMEOUT)
+
+def _security(est, config, plan):
+    profile, model = est.profile, est.model
+    _extract(est)
+    # Audits run online only without the offline index; with it they take milliseconds.
+    # The scan loads ADVISORY_DUMP into the index before it checks, so a dump counts too.
+    offline = bool(config['ADVISORY_DUMP']) or has_advisories(config['ADVISORY_INDEX_PATH'])
+    audits = []
+    if 'requirements.txt' in profile.sizes:
+        audits.append(('tool', 'pip-audit'))
+    if plan in ('premium', 'pro') and 'package-lock.json' in profile.sizes:
+        audits.append(('tool', 'npm'))
+    if audits:
+        seconds = 0.1 * len(audits) if offline else sum(model.seconds(*audit) for audit in audits)
+        est.add_stage('dependencies', seconds, BASE_RSS_MB['worker'] + BASE_RSS_MB['linter'],
+                      'prior' if offline else _basis(*(model.fit(*audit) for audit in audits)))
+    scanned = [p for p in profile.paths(None, config['SCAN_SKIP_DIRS']) if p.endswith(SCAN_EXTS)
+               and not p.endswith(('.min.js', '.bundle.js')) and profile.sizes[p] <= config['SCAN_MAX_FILE_BYTES']]
+    budget_workers = int(config['RUN_MEMORY_BUDGET_BYTES'] / MB // BASE_RSS_MB['worker'])
+    est.workers = max(1, min(config['SCAN_WORKERS'], budget_workers, len(scanned)))
+    if profile.bytes(scanned) < SMALL_SCAN_BYTES:
+        est.workers = 1  # scanned in process, see scanner.scan_directory
+    est.add_stage('source-scan', model.seconds('stage', 'source-scan', profile.bytes(scanned)),
+                  BASE_RSS_MB['worker'] * (1 + est.workers), _basis(model.fit('stage', 'source-scan')))
+
+def estimate(tool, profile, options, config, plan='free', model=None):
+    """Estimate for running `tool` on an UploadProfile, from the cost model of past runs."""
+    est = Estimate(tool, profile, model or CostModel.load())
+    if tool == 'frontend_optimization':
+        _frontend(est, options or {}, config, plan)
+    elif tool == 'backend_analysis':
+        _backend(est, config)
+    else:
+        _security(est, config, plan)
+    return est
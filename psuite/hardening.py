@@ -0,0 +1,132 @@
+# psuite/hardening.py
+import os
+import re
+import base64
+import hashlib
+import tempfile
+
+# The markup that matters for hardening: comments and raw-text elements are skipped
+# whole, so a '<meta' or '<head' inside them is never mistaken for a real tag.
+TOKEN = re.compile(r'<!--.*?-->|<(script|style|textarea|title)\b[^>]*>.*?</\1\s*>|<(/?)([a-zA-Z][\w-]*)\b([^>]*)>',
+                   re.IGNORECASE | re.DOTALL)
+ATTR = re.compile(r'([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?')
+SCRIPT_TAG = re.compile(r'<script\b([^>]*)>', re.IGNORECASE)
+# Head elements a policy meta may replace: http-equiv value or meta name -> header.
+MANAGED_META = {('http-equiv', 'content-security-policy'): 'csp', ('name', 'referrer'): 'referrer'}
+
+
+class MalformedHTML(Exception):
+    """Raised when the markup is too broken to patch without a full parse."""
+
+
+def attributes(attrs):
+    """Parses the attribute text of a start tag into {lowercase name: value}."""
+    return {m.group(1).lower(): next((v for v in m.groups()[1:] if v is not None), '') for m in ATTR.finditer(attrs)}
+
+def _attr_escape(value):
+    return value.replace('&', '&amp;').replace('"', '&quot;')
+
+def _policy_tags(csp, referrer):
+    tags = []
+    if csp:
+        tags.append(f'<meta http-equiv="Content-Security-Policy" content="{_attr_escape(csp)}">')
+    if referrer:
+        tags.append(f'<meta name="referrer" content="{_attr_escape(referrer)}">')
+    return ''.join(tags)
+
+def harden(html, csp=None, referrer=None):
+    """
+    Replaces any CSP / referrer-policy meta tags in the head with the given policies,
+    in one pass over the tag stream and without building a DOM. Pages without a
+    <head> are returned unchanged. Raises MalformedHTML for markup it cannot place.
+    """
+    managed = {kind for kind, value in (('csp', csp), ('referrer', referrer)) if value}
+    if not managed:
+        return html
+    if html.count('<!--') != html.count('-->'):
+        raise MalformedHTML("Unbalanced comment.")
+    out, last, head_end = [], 0, None
+    for match in TOKEN.finditer(html):
+        closing, name, attrs = match.group(2), (match.group(3) or '').lower(), match.group(4) or ''
+        if name == 'head' and not closing:
+            if head_end is not None:
+                raise MalformedHTML("More than one <head>.")
+            head_end = match.end()
+            out.append(html[last:head_end])
+            out.append(_policy_tags(csp, referrer))
+            last = head_end
+        elif name == 'meta' and head_end is not None:
+            values = attributes(attrs)
+            kind = next((k for (attr, value), k in MANAGED_META.items()
+                         if values.get(attr, '').strip().lower() == value), None)
+            if kind in managed:
+                out.append(html[last:match.start()])
+                last = match.end()
+        elif name == 'head' and closing or name == 'body':
+            break
+    if head_end is None:
+        return html
+    out.append(html[last:])
+    return ''.join(out)
+
+def harden_dom(html, csp=None, referrer=None):
+    """Full-parse fallback for markup harden() gives up on."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    if soup.head is None:
+        return html
+    for attr, value in (('http-equiv', 'Content-Security-Policy'), ('name', 'referrer')):
+        if (csp if attr == 'http-equiv' else referrer):
+            for tag in soup.find_all('meta', attrs={attr: re.compile(f'^{value}$', re.IGNORECASE)}):
+                tag.decompose()
+    for attr, value, content in (('name', 'referrer', referrer), ('http-equiv', 'Content-Security-Policy', csp)):
+        if content:
+            tag = soup.new_tag('meta', attrs={attr: value, 'content': content})
+            soup.head.insert(0, tag)
+    return str(soup)
+
+
+# --- SUBRESOURCE INTEGRITY ---
+
+def integrity(path):
+    with open(path, 'rb') as f:
+        return 'sha384-' + base64.b64encode(hashlib.file_digest(f, 'sha384').digest()).decode('ascii')
+
+def add_integrity(html, resolve):
+    """
+    Adds (or refreshes) integrity="sha384-..." on every <script src> that
+    `resolve(src)` maps to a local file path; other scripts are left alone.
+    """
+    def patch(match):
+        attrs = match.group(1)
+        src = attributes(attrs).get('src')
+        path = resolve(src) if src else None
+        if not path:
+            return match.group(0)
+        attrs = re.sub(r'\s+integrity\s*=\s*(?:"[^"]*"|\'[^\']*\'|[^\s>]+)', '', attrs, flags=re.IGNORECASE)
+        return f'<script integrity="{integrity(path)}"{attrs}>'
+    return SCRIPT_TAG.sub(patch, html)
+
+def local_resolver(page_path, base):
+    """Maps a script src on `page_path` to a file under `base`, or None if it is remote or missing."""
+    def resolve(src):
+        src = src.split('?', 1)[0].split('#', 1)[0]
+        if not src or re.match(r'^(?:[a-z][a-z0-9+.-]*:|//)', src, re.IGNORECASE):
+            return None
+        path = os.path.join(base, src.lstrip('/')) if src.startswith('/') else os.path.join(os.path.dirname(page_path), src)
+        path = os.path.normpath(path)
+        return path if path.startswith(os.path.normpath(base) + os.sep) and os.path.isfile(path) else None
+    return resolve
+
+def add_integrity_to_page(page_path, base):
+    """Rewrites a page with SRI hashes on its local scripts. Returns True if anything changed."""
+    with open(page_path, 'r', encoding='utf-8', errors='replace') as f:
+        html = f.read()
+    patched = add_integrity(html, local_resolver(page_path, base))
+    if patched == html:
+        return False
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(page_path), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(patched)
+    os.replace(tmp_path, page_path)
+    return True
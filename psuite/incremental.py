@@ -0,0 +1,93 @@
+# psuite/incremental.py
+import os
+import json
+import tempfile
+from .cache import AssetCache, file_digest
+
+
+class IncrementalRun:
+    """
+    Diff of one frontend run against the same user's previous run. The previous
+    run is a small JSON manifest: per file the input digest, final output digest
+    and report message, plus the options key and the keys of the project-wide
+    stages. Final outputs are kept in a content-addressed artifact store, so an
+    unchanged file gets its previous output back instead of being rebuilt.
+    """
+
+    def __init__(self, path, store):
+        self.path = path
+        self.store = store
+        self.previous = self._load(path)
+        self.options_key = None  # set by the run once its effective options are known
+        self.stages = {}
+        self.reused_stages = set()
+
+    @classmethod
+    def for_user(cls, config, user_id):
+        store = AssetCache(os.path.join(config['CACHE_FOLDER'], 'artifacts'), config['ARTIFACT_STORE_MAX_BYTES'])
+        return cls(os.path.join(config['CACHE_FOLDER'], 'runs', f"{user_id}.json"), store)
+
+    @staticmethod
+    def _load(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        return {'options': data.get('options'), 'files': data.get('files', {}), 'stages': data.get('stages', {})}
+
+    @staticmethod
+    def _sibling_key(output_digest, suffix):
+        return AssetCache.make_key(output_digest, suffix, None)
+
+    def restore(self, rel_path, digest, out_path):
+        """Copies the previous output of an unchanged file to `out_path`. Returns its entry, or None."""
+        entry = self.previous['files'].get(rel_path)
+        if entry is None or digest is None or entry['input'] != digest or self.previous['options'] != self.options_key:
+            return None
+        if self.store.get(entry['output'], out_path) is None:
+            return None
+        for suffix in entry.get('siblings', []):
+            if self.store.get(self._sibling_key(entry['output'], suffix), out_path + suffix) is None:
+                return None
+        return entry
+
+    def reuse_stage(self, name, key, reports):
+        """
+        Records this run's key for a project-wide stage. Returns True if the stage can be
+        skipped: its key is the one of the previous run and every file it covers was restored.
+        """
+        self.stages[name] = key
+        if self.previous['stages'].get(name) == key and all(r.get('incremental') == 'reused' for r in reports):
+            self.reused_stages.add(name)
+            return True
+        return False
+
+    def invalidate_stage(self, name):
+        """Makes the next run redo a stage, e.g. one that only partly succeeded."""
+        self.stages.pop(name, None)
+
+    def save(self, manifest, processed_path, reports, sibling_suffixes=()):
+        """Stores the final outputs of this run and makes it the one the next run is diffed against."""
+        files = {}
+        for report in reports:
+            digest = manifest.digest(report['path'])
+            out_path = os.path.join(processed_path, report['path'])
+            if report['status'] == 'error' or digest is None or not os.path.isfile(out_path):
+                continue
+            previous = self.previous['files'].get(report['path'])
+            if report.get('incremental') == 'reused' and previous is not None:
+                files[report['path']] = previous
+                continue
+            output = file_digest(out_path)
+            siblings = [suffix for suffix in sibling_suffixes if os.path.exists(out_path + suffix)]
+            self.store.put(output, out_path)
+            for suffix in siblings:
+                self.store.put(self._sibling_key(output, suffix), out_path + suffix)
+            files[report['path']] = {'input': digest, 'output': output, 'status': report['status'],
+                                     'message': report['message'], 'siblings': siblings}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'options': self.options_key, 'stages': self.stages, 'files': files}, f)
+        os.replace(tmp_path, self.path)
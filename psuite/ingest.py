@@ -0,0 +1,92 @@
+# psuite/ingest.py
+import os
+import hashlib
+import zipfile
+import posixpath
+
+CHUNK_SIZE = 1024 * 1024
+# Members smaller than this are never rejected for their compression ratio;
+# tiny, repetitive text files legitimately compress very well.
+RATIO_CHECK_MIN_BYTES = 1024 * 1024
+
+
+class ArchiveRejected(Exception):
+    """Raised when an upload breaks one of the configured archive limits."""
+
+
+def _safe_member_path(name):
+    """Normalized relative path of a ZIP member, or None if it would escape the target."""
+    path = posixpath.normpath(name.replace('\\', '/'))
+    if path.startswith('/') or path == '..' or path.startswith('../') or ':' in path.split('/')[0]:
+        return None
+    return path
+
+
+class ArchiveExtractor:
+    """
+    Checks an uploaded ZIP against the limits in `config` using only its central
+    directory, then extracts it one member at a time. Iterating yields each member's
+    relative path as soon as it is on disk, so processing can start on the first
+    file while the rest are still being written. Each member is hashed as it is
+    written, and the digest recorded in `manifest` when one is given.
+    """
+
+    def __init__(self, zip_path, dest, config, manifest=None):
+        self.zip_path = zip_path
+        self.dest = dest
+        self.manifest = manifest
+        self.max_bytes = config['UPLOAD_MAX_UNCOMPRESSED_BYTES']
+        skip_dirs = set(config['UPLOAD_SKIP_DIRS'])
+        with zipfile.ZipFile(zip_path) as zf:
+            infos = zf.infolist()
+        if len(infos) > config['UPLOAD_MAX_MEMBERS'] * 10:
+            raise ArchiveRejected(f"Archive has {len(infos):,} entries, too many to inspect.")
+
+        self.members, total = [], 0
+        for info in infos:
+            if info.is_dir():
+                continue
+            rel_path = _safe_member_path(info.filename)
+            if rel_path is None:
+                raise ArchiveRejected(f"Archive member '{info.filename}' points outside the project.")
+            if skip_dirs.intersection(rel_path.split('/')[:-1]):
+                continue
+            total += info.file_size
+            if total > self.max_bytes:
+                raise ArchiveRejected(f"Archive expands to more than {self.max_bytes // (1024 * 1024):,} MB.")
+            if info.file_size >= RATIO_CHECK_MIN_BYTES and \
+                    info.file_size > config['UPLOAD_MAX_COMPRESSION_RATIO'] * max(info.compress_size, 1):
+                raise ArchiveRejected(f"'{rel_path}' is compressed suspiciously well; refusing to extract it.")
+            self.members.append((info, rel_path))
+        if len(self.members) > config['UPLOAD_MAX_MEMBERS']:
+            raise ArchiveRejected(f"Archive has {len(self.members):,} files; the limit is {config['UPLOAD_MAX_MEMBERS']:,}.")
+
+    def __len__(self):
+        return len(self.members)
+
+    def prioritize(self, cost):
+        """Extracts (and so yields) the members in descending `cost(rel_path, size)` order."""
+        self.members.sort(key=lambda member: cost(member[1], member[0].file_size), reverse=True)
+
+    def __iter__(self):
+        os.makedirs(self.dest, exist_ok=True)
+        written = 0
+        with zipfile.ZipFile(self.zip_path) as zf:
+            for info, rel_path in self.members:
+                out_path = os.path.join(self.dest, *rel_path.split('/'))
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                digest = hashlib.sha256()
+                with zf.open(info) as src, open(out_path, 'wb') as dst:
+                    # Headers can lie, so the cap is enforced on the bytes actually written too.
+                    while chunk := src.read(CHUNK_SIZE):
+                        written += len(chunk)
+                        if written > self.max_bytes:
+                            raise ArchiveRejected("Archive expands to more than its declared size.")
+                        dst.write(chunk)
+                        digest.update(chunk)
+                if self.manifest is not None:
+                    self.manifest.update(rel_path, digest=digest.hexdigest(), size=os.path.getsize(out_path))
+                yield rel_path
+
+    def extract_all(self):
+        return list(self)
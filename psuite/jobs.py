@@ -0,0 +1,381 @@
+# psuite/jobs.py
+import os
+import time
+import signal
+import socket
+import functools
+import multiprocessing
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, func, select, update
+from . import db, socketio, processing, ledger, metrics, storage
+from .incremental import IncrementalRun
+from .models import Job, JobEvent, User
+from .users import user_cache
+from .ingest import ArchiveExtractor
+from .estimate import UploadProfile, estimate
+from .manifest import ProjectManifest, archive_stamp
+from .archive import ArchiveWriter
+from .processing import (do_frontend_optimization, do_backend_analysis,
+                         do_security_scan, generate_critical_css,
+                         archive_outputs, send_status, cleanup)
+
+ACTIVE_STATES = ('running', 'cancelling')
+TERMINAL_STATES = ('done', 'failed', 'cancelled')
+POLL_INTERVAL = 0.5
+# Workers are forked from a forkserver that has already imported the app and the processing
+# libraries, so starting or replacing one costs a fork and create_app(), not a cold interpreter.
+WORKER_PRELOAD = ['psuite.jobs'] + processing.PROCESSING_MODULES
+
+def job_room(job_id):
+    return f"job:{job_id}"
+
+def record_event(job_id, event, payload=None, room=None):
+    """Stores an event for the web process to relay. Signature matches processing.set_emitter."""
+    db.session.add(JobEvent(job_id=job_id, event=event, payload=payload or {}))
+    db.session.commit()
+
+def job_status(job):
+    return {'job_id': job.id, 'tool': job.tool, 'status': job.status, 'error': job.error,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None}
+
+def cancel_job(job):
+    """Cancels a queued job at once; running jobs are killed by the supervisor."""
+    if job.status == 'queued':
+        if _set_status(job.id, ('queued',), 'cancelled', error='Cancelled by user.'):
+            ledger.refund(job.id)  # it never ran
+    elif job.status == 'running':
+        _set_status(job.id, ('running',), 'cancelling')
+    db.session.refresh(job)
+    if job.status == 'cancelled':
+        _announce_end(job.id, job.user_id, 'Job cancelled.')
+    return job
+
+def _set_status(job_id, from_states, status, **values):
+    """Conditional status transition. Returns True if this caller made it."""
+    if status in TERMINAL_STATES:
+        values['finished_at'] = datetime.utcnow()
+    result = db.session.execute(update(Job).where(Job.id == job_id, Job.status.in_(from_states))
+                                .values(status=status, **values))
+    db.session.commit()
+    return result.rowcount == 1
+
+def _announce_end(job_id, user_id, message):
+    record_event(job_id, 'status_update', {'message': message, 'type': 'error'})
+    record_event(job_id, 'processing_error', {'message': message})
+    user = db.session.get(User, user_id)
+    if user is not None:
+        record_event(job_id, 'credits_updated', {'credits': user.credits})
+
+
+# --- TOOL RUNNERS (executed inside a worker process) ---
+
+def _open_upload(job, unpacked_path):
+    """Extractor for the job's upload, recording digests into the upload's saved manifest."""
+    zip_path = os.path.join(current_app.config['ORIGINALS_FOLDER'], f"{job.session_id}.zip")
+    extractor = ArchiveExtractor(zip_path, unpacked_path, current_app.config)
+    stamp = archive_stamp(zip_path)
+    extractor.manifest = (ProjectManifest.load(_manifest_path(job), stamp)
+                          or ProjectManifest.from_members(extractor.members, stamp))
+    return extractor
+
+def _manifest_path(job):
+    return ProjectManifest.path_for(current_app.config['ORIGINALS_FOLDER'], job.session_id)
+
+def _preflight(job, upload, room):
+    """Estimates the run from its upload and past runs; the estimate sets its workers, timeouts and order."""
+    with metrics.traced('stage', 'preflight'):
+        plan = estimate(job.tool, UploadProfile.from_archive(upload.zip_path, upload.members), job.options or {},
+                        current_app.config, job.plan)
+    send_status(room, plan.describe(), 'info')
+    return plan
+
+def _extract_all(upload):
+    with metrics.traced('stage', 'extract') as span:
+        span.bytes_in = sum(info.file_size for info, _ in upload.members)
+        upload.extract_all()
+
+def _run_frontend_optimization(job, room):
+    config = current_app.config
+    unpacked_path = os.path.join(config['UNPACKED_FOLDER'], job.session_id)
+    processed_path = os.path.join(config['PROCESSED_FOLDER'], job.session_id)
+    final_zip_name = f"optimized_{job.session_id}.zip"
+    final_zip_path = os.path.join(config['PROCESSED_FOLDER'], final_zip_name)
+    options = job.options or {}
+    critical = job.plan == 'pro' and options.get('generate_critical_css')
+    # Critical CSS rewrites pages and stylesheets in place, so those wait for it.
+    deferred = {'html', 'css'} if critical else set()
+    # In 'stream' mode the output folder is kept and zipped on the fly by the download route.
+    archive = ArchiveWriter(final_zip_path, config['ARCHIVE_DEFLATE_LEVEL']) if config['ARCHIVE_MODE'] == 'eager' else None
+    run = IncrementalRun.for_user(config, job.user_id) if config['INCREMENTAL_RUNS'] else None
+    finished = False
+    try:
+        upload = _open_upload(job, unpacked_path)
+        plan = _preflight(job, upload, room)
+        upload.prioritize(plan.file_seconds)  # longest files first, so none starts last and runs alone
+        file_reports = do_frontend_optimization(unpacked_path, processed_path,
+                                                dict(options, file_timeouts=plan.file_timeouts), room,
+                                                max_workers=plan.workers, files=upload, archive=archive,
+                                                defer_exts=deferred, manifest=upload.manifest, run=run, critical=critical)
+        upload.manifest.save(_manifest_path(job))
+        if critical and run is not None and 'html' in run.reused_stages:
+            send_status(room, "Pages and stylesheets are unchanged; reused the previous Critical CSS.", 'info')
+        elif critical:
+            with metrics.traced('stage', 'critical-css'):
+                failed = generate_critical_css(processed_path, room, upload.manifest)
+            if failed and run is not None:
+                run.invalidate_stage('html')  # retry the failed pages next time
+        if run is not None:
+            with metrics.traced('stage', 'store-run'):
+                run.save(upload.manifest, processed_path, file_reports,
+                         [suffix for _, suffix in processing.IMAGE_SIBLING_FORMATS.values()])
+        if archive is not None:
+            send_status(room, "Finalizing ZIP archive...", 'info')
+            with metrics.traced('stage', 'archive', out_path=final_zip_path) as span:
+                span.bytes_in = sum(r.get('new_size') or 0 for r in file_reports)
+                archive_outputs(archive, processed_path, file_reports, deferred)
+                archive.close()
+            send_status(room, "Archive created successfully.", 'success')
+        finished = True
+        processing.emit('processing_complete', {'final_zip_name': final_zip_name, 'file_tree': upload.manifest.tree(),
+                                                'files': file_reports, 'summary': metrics.current_trace().summary()},
+                        room=room)
+    finally:
+        cleanup(unpacked_path)
+        if archive is not None:
+            if not finished:
+                archive.close(); cleanup(final_zip_path)
+            cleanup(processed_path)
+        elif not finished:
+            cleanup(processed_path)
+
+def _run_backend_analysis(job, room):
+    unpacked_path = os.path.join(current_app.config['UNPACKED_FOLDER'], job.session_id)
+    try:
+        upload = _open_upload(job, unpacked_path)
+        plan = _preflight(job, upload, room)
+        _extract_all(upload)
+        upload.manifest.save(_manifest_path(job))
+        do_backend_analysis(unpacked_path, room, upload.manifest, timeout_seconds=plan.stage_timeouts['analysis'])
+        processing.emit('analysis_complete', {'summary': metrics.current_trace().summary()}, room=room)
+    finally:
+        cleanup(unpacked_path)
+
+def _run_security_scan(job, room):
+    unpacked_path = os.path.join(current_app.config['UNPACKED_FOLDER'], job.session_id)
+    try:
+        upload = _open_upload(job, unpacked_path)
+        plan = _preflight(job, upload, room)
+        _extract_all(upload)
+        upload.manifest.save(_manifest_path(job))
+        with metrics.traced('stage', 'security-scan'):
+            do_security_scan(unpacked_path, room, job.plan, upload.manifest, workers=plan.workers)
+        processing.emit('analysis_complete', {'summary': metrics.current_trace().summary()}, room=room)
+    finally:
+        cleanup(unpacked_path)
+
+TOOL_RUNNERS = {
+    'frontend_optimization': _run_frontend_optimization,
+    'backend_analysis': _run_backend_analysis,
+    'security_scan': _run_security_scan,
+}
+
+def supervisor_id(pid=None):
+    return f"{socket.gethostname()}:{pid or os.getpid()}"
+
+def _claim_next_job(pid, supervisor):
+    """Atomically moves the oldest runnable queued job to 'running', honouring JOB_CONCURRENCY."""
+    limits = current_app.config['JOB_CONCURRENCY']
+    queued = Job.query.filter_by(status='queued').order_by(Job.created_at).limit(50).all()
+    for job in queued:
+        running = (select(func.count()).select_from(Job)
+                   .where(Job.status.in_(ACTIVE_STATES), Job.plan == job.plan).scalar_subquery())
+        result = db.session.execute(
+            update(Job).where(Job.id == job.id, Job.status == 'queued', running < limits.get(job.plan, 1))
+            .values(status='running', worker_pid=pid, supervisor=supervisor, started_at=datetime.utcnow()))
+        db.session.commit()
+        if result.rowcount == 1:
+            db.session.refresh(job)
+            return job
+    db.session.rollback()
+    return None
+
+def _execute(job):
+    room = job_room(job.id)
+    processing.set_emitter(functools.partial(record_event, job.id))
+    trace = metrics.start_trace()
+    try:
+        with metrics.traced('job', job.tool):
+            TOOL_RUNNERS[job.tool](job, room)
+        _set_status(job.id, ('running',), 'done')
+    except Exception as e:
+        db.session.rollback()
+        send_status(room, f"A critical error occurred: {e}", 'error')
+        processing.emit('processing_error', {'message': str(e)}, room=room)
+        if _set_status(job.id, ('running',), 'failed', error=str(e)):
+            ledger.refund(job.id)
+            send_status(room, "Your credit has been refunded.", 'info')
+    finally:
+        user = db.session.get(User, job.user_id)
+        if user is not None:  # deleted while the job ran
+            processing.emit('credits_updated', {'credits': user.credits}, room=room)
+        processing.close_status(room)
+        metrics.stop_trace()
+        metrics.persist(trace)
+        storage.track(current_app.config, job.session_id, job.user_id)
+
+def _worker_main(supervisor):
+    """Entry point of one worker process: claims and runs jobs for `supervisor` until terminated."""
+    from . import create_app
+    app = create_app()
+    parent_pid = os.getppid()  # the supervisor, or its forkserver, which exits along with it
+    with app.app_context():
+        while os.getppid() == parent_pid:
+            job = _claim_next_job(os.getpid(), supervisor)
+            if job is None:
+                db.session.remove()
+                time.sleep(POLL_INTERVAL)
+                continue
+            _execute(job)
+            db.session.remove()
+
+
+# --- SUPERVISOR ---
+
+def _exit_on_sigterm(signum, frame):
+    raise SystemExit(0)
+
+def _orphaned(job):
+    """True if the job's supervisor ran on this host and is gone (its pid may have been reused by us)."""
+    host, _, pid = (job.supervisor or '').rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    if int(pid) == os.getpid():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+def run_workers(app, num_workers=None, parent_pid=None):
+    """
+    Keeps `num_workers` worker processes alive and enforces cancellation by killing
+    the process that runs a 'cancelling' job. Blocks until SIGTERM/SIGINT, or until
+    `parent_pid` (the web server that started us) goes away. Supervisors on other
+    hosts may share the database; each only touches the jobs its own workers claimed.
+    """
+    num_workers = num_workers or app.config['JOB_WORKERS']
+    ctx = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+    if ctx.get_start_method() == 'forkserver':
+        ctx.set_forkserver_preload(WORKER_PRELOAD)
+    workers, me = {}, supervisor_id()
+    next_sweep = time.monotonic()
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    with app.app_context():
+        # Active jobs of a previous supervisor on this host died with its workers.
+        for job in Job.query.filter(Job.status.in_(ACTIVE_STATES)).all():
+            if _orphaned(job) and _set_status(job.id, ACTIVE_STATES, 'failed', error='Worker restarted.'):
+                ledger.refund(job.id)
+                _announce_end(job.id, job.user_id, 'Job was interrupted by a worker restart.')
+        try:
+            while parent_pid is None or os.getppid() == parent_pid:
+                for slot in range(num_workers):
+                    proc = workers.get(slot)
+                    if proc is not None and proc.is_alive():
+                        continue
+                    if proc is not None:
+                        _fail_jobs_of(me, proc.pid, f"Worker exited with code {proc.exitcode}.")
+                    workers[slot] = ctx.Process(target=_worker_main, args=(me,), name=f"psuite-job-worker-{slot}")
+                    workers[slot].start()
+
+                by_pid = {proc.pid: proc for proc in workers.values()}
+                for job in Job.query.filter_by(status='cancelling', supervisor=me).all():
+                    proc = by_pid.get(job.worker_pid)
+                    if proc is not None:
+                        proc.terminate()
+                        proc.join(5)
+                    if _set_status(job.id, ('cancelling',), 'cancelled', error='Cancelled by user.'):
+                        _cleanup_session(job)
+                        _announce_end(job.id, job.user_id, 'Job cancelled.')
+                if time.monotonic() >= next_sweep:
+                    next_sweep = time.monotonic() + app.config['STORAGE_JANITOR_INTERVAL']
+                    _sweep_storage(app.config)
+                db.session.remove()
+                time.sleep(POLL_INTERVAL)
+        finally:
+            for proc in workers.values():
+                proc.terminate()
+            for proc in workers.values():
+                proc.join(5)
+
+def _prune_job_events(config):
+    """Deletes the events of jobs that finished more than JOB_EVENT_TTL seconds ago."""
+    cutoff = datetime.utcnow() - timedelta(seconds=config['JOB_EVENT_TTL'])
+    finished = select(Job.id).where(Job.status.in_(TERMINAL_STATES), Job.finished_at < cutoff)
+    db.session.execute(delete(JobEvent).where(JobEvent.job_id.in_(finished)))
+    db.session.commit()
+
+def _sweep_storage(config):
+    try:
+        evicted, freed = storage.sweep(config)
+        _prune_job_events(config)
+    except Exception as e:  # the janitor must never take the supervisor down
+        db.session.rollback()
+        print(f"Storage janitor failed: {e}")
+        return
+    if evicted or freed:
+        print(f"Storage janitor: evicted {evicted} session(s), freed {freed / (1024 * 1024):.1f} MB.")
+
+def _cleanup_session(job):
+    """Removes what a killed job left behind: its work folders and any partial result archive."""
+    for path in storage.session_paths(current_app.config, job.session_id)['result']:
+        cleanup(path)
+
+def _fail_jobs_of(supervisor, pid, reason):
+    for job in Job.query.filter(Job.supervisor == supervisor, Job.worker_pid == pid,
+                                Job.status.in_(ACTIVE_STATES)).all():
+        if _set_status(job.id, ACTIVE_STATES, 'failed', error=reason):
+            ledger.refund(job.id)
+            _cleanup_session(job)
+            _announce_end(job.id, job.user_id, f"A critical error occurred: {reason}")
+
+def _supervisor_main(parent_pid):
+    from . import create_app
+    run_workers(create_app(), parent_pid=parent_pid)
+
+def start_worker_pool():
+    """Runs the supervisor in its own process, so the web server never executes jobs itself."""
+    proc = multiprocessing.get_context('spawn').Process(target=_supervisor_main, args=(os.getpid(),),
+                                                        name='psuite-job-supervisor')
+    proc.start()
+    return proc
+
+
+# --- EVENT RELAY (runs in the web process) ---
+
+def relay_job_events(app, interval=0.25):
+    """Forwards job events recorded by the workers to the clients in each job's room."""
+    with app.app_context():
+        last_id = db.session.query(func.max(JobEvent.id)).scalar() or 0
+        while True:
+            events = JobEvent.query.filter(JobEvent.id > last_id).order_by(JobEvent.id).limit(500).all()
+            for event in events:
+                if event.event == 'credits_updated':  # refunded in a worker process
+                    job = db.session.get(Job, event.job_id)
+                    if job is not None:
+                        user_cache.invalidate(job.user_id)
+                socketio.emit(event.event, dict(event.payload or {}, event_id=event.id), room=job_room(event.job_id))
+                last_id = event.id
+            db.session.remove()
+            socketio.sleep(interval)
+
+def replay_job_events(job_id, sid, after_id=0):
+    """Re-sends a job's events to one client, e.g. after a page reload."""
+    events = JobEvent.query.filter(JobEvent.job_id == job_id, JobEvent.id > after_id).order_by(JobEvent.id).all()
+    for event in events:
+        socketio.emit(event.event, dict(event.payload or {}, event_id=event.id), room=sid)
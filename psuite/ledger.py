@@ -0,0 +1,48 @@
+# psuite/ledger.py
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from . import db
+from .models import User, CreditTransaction
+from .users import user_cache
+
+# Credits charged per tool run.
+JOB_COST = 1
+
+
+def _balance(user_id):
+    return db.session.execute(select(User.credits).where(User.id == user_id)).scalar_one()
+
+def charge(user_id, amount, job_id=None):
+    """
+    Takes `amount` credits with a single conditional UPDATE, so concurrent charges can
+    never drive the balance below zero. Returns the new balance, or None if the user
+    cannot afford it. Does not commit: the caller commits it together with the job, then
+    invalidates the user's cache entry (earlier, a concurrent read would re-cache the old balance).
+    """
+    result = db.session.execute(update(User).where(User.id == user_id, User.credits >= amount)
+                                .values(credits=User.credits - amount))
+    if result.rowcount != 1:
+        db.session.rollback()
+        return None
+    balance = _balance(user_id)
+    db.session.add(CreditTransaction(user_id=user_id, job_id=job_id, kind='charge', amount=-amount,
+                                     balance_after=balance))
+    return balance
+
+def refund(job_id):
+    """Gives back what `job_id` was charged, once. Returns the new balance, or None if nothing was refunded."""
+    charged = CreditTransaction.query.filter_by(job_id=job_id, kind='charge').first()
+    if charged is None:
+        return None
+    try:
+        db.session.execute(update(User).where(User.id == charged.user_id)
+                           .values(credits=User.credits - charged.amount))
+        balance = _balance(charged.user_id)
+        db.session.add(CreditTransaction(user_id=charged.user_id, job_id=job_id, kind='refund',
+                                         amount=-charged.amount, balance_after=balance))
+        db.session.commit()
+    except IntegrityError:  # already refunded by another process
+        db.session.rollback()
+        return None
+    user_cache.invalidate(charged.user_id)
+    return balance
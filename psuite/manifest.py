@@ -0,0 +1,143 @@
+# psuite/manifest.py
+import os
+import json
+import time
+import tempfile
+from .cache import file_digest
+
+FILE_TYPES = {
+    'html': 'html', 'htm': 'html', 'css': 'stylesheet', 'js': 'script', 'mjs': 'script', 'ts': 'script',
+    'png': 'image', 'jpg': 'image', 'jpeg': 'image', 'gif': 'image', 'webp': 'image', 'avif': 'image',
+    'svg': 'svg', 'py': 'python', 'json': 'config', 'yml': 'config', 'yaml': 'config', 'toml': 'config',
+    'ini': 'config', 'cfg': 'config', 'conf': 'config', 'env': 'config', 'txt': 'text', 'md': 'text',
+}
+
+def _ext(rel_path):
+    name = rel_path.rsplit('/', 1)[-1]
+    return name.rsplit('.', 1)[1].lower() if '.' in name else ''
+
+def detect_type(rel_path):
+    return FILE_TYPES.get(_ext(rel_path), 'other')
+
+def archive_stamp(zip_path):
+    stat = os.stat(zip_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class ProjectManifest:
+    """
+    Index of one project's files: '/'-separated relative path -> size, mtime, content
+    digest and detected type. It is built once per upload and saved next to it, so
+    every stage (and every later run on the same upload) queries it instead of
+    walking the tree again. Digests are filled in as files are extracted.
+    """
+
+    def __init__(self, entries=None, source=None):
+        self.entries = entries or {}
+        self.source = source  # archive_stamp() of the upload it describes
+
+    @staticmethod
+    def path_for(originals_folder, session_id):
+        return os.path.join(originals_folder, f"{session_id}.manifest.json")
+
+    @classmethod
+    def from_members(cls, members, source=None):
+        """Builds the manifest from (ZipInfo, rel_path) pairs, before anything is extracted."""
+        entries = {}
+        for info, rel_path in members:
+            entries[rel_path] = {'size': info.file_size, 'mtime': time.mktime(info.date_time + (0, 0, -1)),
+                                 'digest': None, 'type': detect_type(rel_path)}
+        return cls(dict(sorted(entries.items())), source)
+
+    @classmethod
+    def scan(cls, root):
+        """Builds the manifest of a directory with a single os.scandir pass."""
+        entries, stack = {}, [('', root)]
+        while stack:
+            prefix, directory = stack.pop()
+            with os.scandir(directory) as it:
+                for entry in it:
+                    rel_path = prefix + entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((rel_path + '/', entry.path))
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        entries[rel_path] = {'size': stat.st_size, 'mtime': stat.st_mtime,
+                                             'digest': None, 'type': detect_type(rel_path)}
+        return cls(dict(sorted(entries.items())))
+
+    @classmethod
+    def load(cls, path, source=None):
+        """Returns the saved manifest, or None if it is missing or describes another archive."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if source is not None and data.get('source') != source:
+            return None
+        return cls(data['entries'], data.get('source'))
+
+    def save(self, path):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'source': self.source, 'entries': self.entries}, f)
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, rel_path):
+        return rel_path in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def get(self, rel_path):
+        return self.entries.get(rel_path)
+
+    def paths(self, exts=None, skip_dirs=()):
+        """Relative paths, optionally limited to extensions and outside `skip_dirs`."""
+        skip_dirs = set(skip_dirs)
+        return [p for p in self.entries
+                if (exts is None or _ext(p) in exts) and not skip_dirs.intersection(p.split('/')[:-1])]
+
+    def update(self, rel_path, **values):
+        self.entries.setdefault(rel_path, {'digest': None, 'type': detect_type(rel_path)}).update(values)
+
+    def digest(self, rel_path, root=None):
+        """Content digest of a file, hashing it under `root` the first time if needed."""
+        entry = self.entries.get(rel_path)
+        if entry is None:
+            return file_digest(os.path.join(root, rel_path)) if root else None
+        if entry.get('digest') is None and root is not None:
+            entry['digest'] = file_digest(os.path.join(root, rel_path))
+        return entry.get('digest')
+
+    def tree(self):
+        """Nested {'name', 'type', 'children'} nodes for the results view, with generated siblings."""
+        root = _Dir()
+        for rel_path, entry in self.entries.items():
+            *dirs, name = rel_path.split('/')
+            node = root
+            for part in dirs:
+                node = node.setdefault(part, _Dir())
+            node[name] = entry
+            for suffix in entry.get('outputs', ()):
+                node[name + suffix] = {'type': detect_type(name + suffix)}
+
+        def build(level):
+            nodes = []
+            for name in sorted(level):
+                value = level[name]
+                if isinstance(value, _Dir):
+                    nodes.append({'name': name, 'type': 'directory', 'children': build(value)})
+                else:
+                    nodes.append({'name': name, 'type': 'file', 'kind': value['type'],
+                                  'size': value.get('size'), 'output_size': value.get('output_size')})
+            return nodes
+        return build(root)
+
+
+class _Dir(dict):
+    """A directory level while nesting paths in ProjectManifest.tree()."""
@@ -0,0 +1,262 @@
+# psuite/metrics.py
+import os
+import time
+import threading
+import contextlib
+import subprocess
+from collections import namedtuple
+
+# kind: 'job', 'stage', 'tool' or 'filetype'; status: 'ok', 'error' or 'timeout'.
+Sample = namedtuple('Sample', 'kind name wall cpu max_rss_kb bytes_in bytes_out status')
+# Upper bounds (seconds) of the duration histogram buckets.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Trace:
+    """The samples recorded during one job run, from any thread."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def add(self, sample):
+        with self._lock:
+            self.samples.append(sample)
+
+    def summary(self):
+        """Per-stage, per-tool and per-file-type totals, for the run's final event."""
+        groups = {}
+        for s in list(self.samples):
+            totals = groups.setdefault(s.kind, {}).setdefault(s.name, {
+                'calls': 0, 'errors': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                'max_rss_kb': 0, 'bytes_in': 0, 'bytes_out': 0})
+            totals['calls'] += 1
+            totals['errors'] += s.status != 'ok'
+            totals['wall_seconds'] += s.wall
+            totals['cpu_seconds'] += s.cpu
+            totals['max_rss_kb'] = max(totals['max_rss_kb'], s.max_rss_kb)
+            totals['bytes_in'] += s.bytes_in
+            totals['bytes_out'] += s.bytes_out
+        for by_name in groups.values():
+            for totals in by_name.values():
+                totals['wall_seconds'] = round(totals['wall_seconds'], 3)
+                totals['cpu_seconds'] = round(totals['cpu_seconds'], 3)
+        return {'wall_seconds': round(time.perf_counter() - self.started, 3), 'stages': groups.get('stage', {}),
+                'tools': groups.get('tool', {}), 'file_types': groups.get('filetype', {})}
+
+
+# --- RECORDING ---
+
+_trace = None
+_local = threading.local()
+
+def start_trace():
+    global _trace
+    _trace = Trace()
+    return _trace
+
+def stop_trace():
+    global _trace
+    trace, _trace = _trace, None
+    return trace
+
+def current_trace():
+    return _trace
+
+def record(sample):
+    collector = getattr(_local, 'collector', None)
+    if collector is not None:
+        collector.append(sample)
+    elif _trace is not None:
+        _trace.add(sample)
+
+@contextlib.contextmanager
+def collecting():
+    """Gathers this thread's samples into a list instead of the run trace, e.g. to ship them back from a pool worker."""
+    previous = getattr(_local, 'collector', None)
+    _local.collector = samples = []
+    try:
+        yield samples
+    finally:
+        _local.collector = previous
+
+def _size(path):
+    try:
+        return os.path.getsize(path) if path else 0
+    except OSError:
+        return 0
+
+
+class Span:
+    """What traced() yields; the block may rename it, set byte counts or drop it."""
+    __slots__ = ('name', 'bytes_in', 'bytes_out', 'skip')
+
+    def __init__(self, name):
+        self.name, self.bytes_in, self.bytes_out, self.skip = name, None, None, False
+
+
+@contextlib.contextmanager
+def traced(kind, name, in_path=None, out_path=None):
+    """Records wall time, this thread's CPU time and bytes in/out of the enclosed block."""
+    span, status = Span(name), 'ok'
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield span
+    except subprocess.TimeoutExpired:
+        status = 'timeout'
+        raise
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        if not span.skip:
+            record(Sample(kind, span.name, time.perf_counter() - wall, time.thread_time() - cpu, 0,
+                          span.bytes_in if span.bytes_in is not None else _size(in_path),
+                          span.bytes_out if span.bytes_out is not None else _size(out_path), status))
+
+def run_command(cmd, cwd, timeout_seconds=300, check=True, in_path=None, out_path=None):
+    """
+    subprocess.run() with capture_output=True and text=True, that also records the
+    child's wall time, CPU time and peak RSS. The child is reaped with os.wait4, so
+    its resource usage is its own even when other threads run commands at the same time.
+    """
+    name = os.path.basename(cmd[0] if isinstance(cmd, (list, tuple)) else cmd.split()[0])
+    if not hasattr(os, 'wait4'):
+        with traced('tool', name, in_path, out_path):
+            return subprocess.run(cmd, cwd=cwd, shell=isinstance(cmd, str), check=check, capture_output=True,
+                                  text=True, encoding='utf-8', errors='replace', timeout=timeout_seconds)
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=cwd, shell=isinstance(cmd, str), stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, text=True, encoding='utf-8', errors='replace')
+    timed_out = threading.Event()
+    def kill():
+        timed_out.set()
+        proc.kill()
+    output = {}
+    readers = [threading.Thread(target=lambda key, pipe: output.__setitem__(key, pipe.read()), args=item, daemon=True)
+               for item in (('stdout', proc.stdout), ('stderr', proc.stderr))]
+    timer = threading.Timer(timeout_seconds, kill)
+    timer.start()
+    usage = None
+    try:
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+        _, wait_status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(wait_status)
+    finally:
+        timer.cancel()
+        for pipe in (proc.stdout, proc.stderr):
+            pipe.close()
+        if usage is None:  # interrupted before the child was reaped
+            proc.kill()
+            proc.wait()
+        status = 'timeout' if timed_out.is_set() else 'ok' if proc.returncode == 0 or not check else 'error'
+        record(Sample('tool', name, time.perf_counter() - started,
+                      usage.ru_utime + usage.ru_stime if usage else 0.0, usage.ru_maxrss if usage else 0,
+                      _size(in_path), _size(out_path), status))
+    stdout, stderr = output.get('stdout', ''), output.get('stderr', '')
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(cmd, timeout_seconds, output=stdout, stderr=stderr)
+    if check and proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+# --- STORAGE ---
+
+def _deltas(samples):
+    totals = {}
+    def add(key, value):
+        totals[key] = totals.get(key, 0) + value
+    for s in samples:
+        add((s.kind, s.name, 'calls'), 1)
+        add((s.kind, s.name, 'errors'), s.status == 'error')
+        add((s.kind, s.name, 'timeouts'), s.status == 'timeout')
+        add((s.kind, s.name, 'wall_seconds'), s.wall)
+        add((s.kind, s.name, 'cpu_seconds'), s.cpu)
+        add((s.kind, s.name, 'bytes_in'), s.bytes_in)
+        add((s.kind, s.name, 'bytes_out'), s.bytes_out)
+        bucket = next((str(le) for le in BUCKETS if s.wall <= le), '+Inf')
+        add((s.kind, s.name, f'bucket:{bucket}'), 1)
+        key = (s.kind, s.name, 'max_rss_kb')
+        totals[key] = max(totals.get(key, 0), s.max_rss_kb)
+        if s.status == 'ok':  # sums for the cost model's least-squares fit of wall time on MB in
+            mb = s.bytes_in / (1024 * 1024)
+            for field, value in (('n', 1), ('x', mb), ('y', s.wall), ('xx', mb * mb), ('xy', mb * s.wall)):
+                add((s.kind, s.name, f'fit:{field}'), value)
+    return totals
+
+def persist(trace, attempts=3):
+    """Adds a finished run's samples to the cumulative totals served by /metrics. Best effort."""
+    from sqlalchemy import case, update
+    from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+    from . import db
+    from .models import MetricTotal
+    deltas = _deltas(trace.samples)
+    for _ in range(attempts):
+        try:
+            for (kind, name, field), value in deltas.items():
+                column = MetricTotal.value
+                new_value = case((column < value, value), else_=column) if field == 'max_rss_kb' else column + value
+                result = db.session.execute(update(MetricTotal).where(
+                    MetricTotal.kind == kind, MetricTotal.name == name, MetricTotal.field == field).values(value=new_value))
+                if result.rowcount == 0:
+                    db.session.add(MetricTotal(kind=kind, name=name, field=field, value=value))
+                    db.session.flush()
+            db.session.commit()
+            return
+        except IntegrityError:  # another worker created the same series first
+            db.session.rollback()
+        except SQLAlchemyError:
+            db.session.rollback()
+            return
+
+
+# --- EXPOSITION ---
+
+# Prometheus label name for each sample kind.
+LABELS = {'job': 'tool', 'stage': 'stage', 'tool': 'tool', 'filetype': 'type'}
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def render(totals, extra=()):
+    """
+    Prometheus text format for {(kind, name): {field: value}} totals, as stored by
+    persist(). `extra` adds (name, type, help, value) single-sample families.
+    """
+    lines = []
+    by_kind = {}
+    for (kind, name), fields in sorted(totals.items()):
+        by_kind.setdefault(kind, []).append((name, fields))
+    for kind, series in by_kind.items():
+        prefix, label = f"psuite_{kind}", LABELS.get(kind, 'name')
+        lines += [f"# HELP {prefix}_duration_seconds Wall time per {kind}.", f"# TYPE {prefix}_duration_seconds histogram"]
+        for name, fields in series:
+            labels, cumulative = f'{label}="{_escape(name)}"', 0
+            for le in BUCKETS:
+                cumulative += fields.get(f'bucket:{le}', 0)
+                lines.append(f'{prefix}_duration_seconds_bucket{{{labels},le="{le}"}} {_number(cumulative)}')
+            lines.append(f'{prefix}_duration_seconds_bucket{{{labels},le="+Inf"}} {_number(fields.get("calls", 0))}')
+            lines.append(f'{prefix}_duration_seconds_sum{{{labels}}} {_number(fields.get("wall_seconds", 0))}')
+            lines.append(f'{prefix}_duration_seconds_count{{{labels}}} {_number(fields.get("calls", 0))}')
+        for field, suffix, kind_, help_text in (
+                ('cpu_seconds', 'cpu_seconds_total', 'counter', 'CPU time (user + system)'),
+                ('errors', 'errors_total', 'counter', 'Failed calls'),
+                ('timeouts', 'timeouts_total', 'counter', 'Calls that timed out'),
+                ('bytes_in', 'bytes_in_total', 'counter', 'Input bytes'),
+                ('bytes_out', 'bytes_out_total', 'counter', 'Output bytes'),
+                ('max_rss_kb', 'max_rss_bytes', 'gauge', 'Peak resident set size of child processes')):
+            lines += [f"# HELP {prefix}_{suffix} {help_text} per {kind}.", f"# TYPE {prefix}_{suffix} {kind_}"]
+            for name, fields in series:
+                value = fields.get(field, 0) * (1024 if field == 'max_rss_kb' else 1)
+                lines.append(f'{prefix}_{suffix}{{{label}="{_escape(name)}"}} {_number(value)}')
+    for name, type_, help_text, value in extra:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {type_}", f"{name} {_number(value)}"]
+    return '\n'.join(lines) + '\n'
@@ -1,4 +1,5 @@
 # psuite/models.py
+from datetime import datetime
 from . import db
 from flask_login import UserMixin
 
@@ -9,4 +10,59 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(150), unique=True, nullable=False)
     password_hash = db.Column(db.String(150), nullable=False)
     credits = db.Column(db.Integer, default=10)
-    plan = db.Column(db.String(50), default='free')
\ No newline at end of file
+    plan = db.Column(db.String(50), default='free')
+
+class Job(db.Model):
+    """One queued tool run. Status: queued -> running -> done/failed, or cancelling -> cancelled."""
+    id = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    tool = db.Column(db.String(50), nullable=False)
+    session_id = db.Column(db.String(36), nullable=False)
+    options = db.Column(db.JSON, default=dict)
+    # Plan at submission time; the worker pool's concurrency limits are per plan.
+    plan = db.Column(db.String(50), nullable=False, default='free')
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    worker_pid = db.Column(db.Integer)
+    # "host:pid" of the supervisor whose worker runs the job; only it recovers or kills the job.
+    supervisor = db.Column(db.String(255), index=True)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+class JobEvent(db.Model):
+    """A Socket.IO event emitted by a job, relayed to the job's room by the web process."""
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(36), db.ForeignKey('job.id'), nullable=False, index=True)
+    event = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON)
+
+class CreditTransaction(db.Model):
+    """One change to a user's credits. A job is charged at most once and refunded at most once."""
+    __table_args__ = (db.UniqueConstraint('job_id', 'kind'),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    job_id = db.Column(db.String(36), index=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'charge' or 'refund'
+    amount = db.Column(db.Integer, nullable=False)  # signed: charges are negative
+    balance_after = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class MetricTotal(db.Model):
+    """Cumulative value of one field (calls, wall_seconds, bucket:<le>...) of one traced stage/tool/file type."""
+    __table_args__ = (db.UniqueConstraint('kind', 'name', 'field'),)
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    field = db.Column(db.String(50), nullable=False)
+    value = db.Column(db.Float, nullable=False, default=0)
+
+class SessionStorage(db.Model):
+    """Bytes one upload session holds on disk: its upload (ZIP + manifest) and its results."""
+    session_id = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    upload_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    result_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    downloaded_at = db.Column(db.DateTime)
@@ -0,0 +1,72 @@
+// psuite/node/worker.js
+// Long-lived helper for terser, svgo, javascript-obfuscator and critical. Reads one JSON
+// job per line on stdin and answers with one JSON line per job, strictly in order.
+const fs = require('fs');
+const path = require('path');
+const readline = require('readline');
+
+const load = (name) => { try { return require(name); } catch (e) { return null; } };
+const terser = load('terser');
+const svgo = load('svgo');
+const obfuscator = load('javascript-obfuscator');
+const critical = load('critical');
+const puppeteer = load('puppeteer');
+
+// One headless browser per worker, reused by every critical job it runs. With `pipe`
+// the browser talks to us over its stdio, so it exits as soon as this process does.
+let browser = null;
+const getBrowser = async () => {
+    if (!browser || !browser.isConnected()) {
+        browser = await need(puppeteer, 'puppeteer').launch({ headless: 'new', pipe: true, args: ['--no-sandbox'] });
+    }
+    return browser;
+};
+
+const need = (mod, name) => { if (!mod) throw new Error(`${name} is not installed.`); return mod; };
+
+const handlers = {
+    ping: async () => ({ tools: { terser: !!terser, svgo: !!svgo, 'javascript-obfuscator': !!obfuscator, critical: !!critical && !!puppeteer } }),
+    terser: async (job) => {
+        const code = fs.readFileSync(job.input, 'utf8');
+        const result = await need(terser, 'terser').minify(code, job.options || {});
+        fs.writeFileSync(job.output, result.code);
+    },
+    svgo: async (job) => {
+        const data = fs.readFileSync(job.input, 'utf8');
+        const result = need(svgo, 'svgo').optimize(data, { path: job.input, ...(job.options || {}) });
+        fs.writeFileSync(job.output, result.data);
+    },
+    'javascript-obfuscator': async (job) => {
+        const code = fs.readFileSync(job.input, 'utf8');
+        const result = need(obfuscator, 'javascript-obfuscator').obfuscate(code, job.options || {});
+        fs.writeFileSync(job.output, result.getObfuscatedCode());
+    },
+    critical: async (job) => {
+        const options = job.options || {};
+        const result = await need(critical, 'critical').generate({
+            base: options.base,
+            src: path.relative(options.base, job.input),
+            dimensions: options.dimensions,
+            inline: false,
+            penthouse: { timeout: options.timeout, puppeteer: { getBrowser } },
+        });
+        fs.writeFileSync(job.output, typeof result === 'string' ? result : result.css);
+    },
+};
+
+const reply = (message) => process.stdout.write(JSON.stringify(message) + '\n');
+
+let queue = Promise.resolve();
+readline.createInterface({ input: process.stdin }).on('line', (line) => {
+    queue = queue.then(async () => {
+        let job;
+        try {
+            job = JSON.parse(line);
+            const handler = handlers[job.tool];
+            if (!handler) throw new Error(`Unknown tool: ${job.tool}`);
+            reply({ id: job.id, ok: true, result: (await handler(job)) || null });
+        } catch (e) {
+            reply({ id: job ? job.id : null, ok: false, error: String((e && e.message) || e) });
+        }
+    });
+});
@@ -0,0 +1,205 @@
+# psuite/node_workers.py
+import os
+import json
+import time
+import queue
+import atexit
+import select
+import threading
+import itertools
+import subprocess
+from . import toolchain
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(__file__), 'node', 'worker.js')
+HEALTH_CHECK_INTERVAL = 60  # seconds a worker may sit idle before it is pinged again
+
+
+class NodeWorkerError(Exception):
+    """Raised when a Node worker crashes or answers with a malformed message."""
+
+
+class NodeJobError(Exception):
+    """Raised when a tool reports a failure for a job, like a non-zero CLI exit."""
+
+
+class NodeWorker:
+    """One `node worker.js` process speaking the JSON-lines job protocol."""
+
+    def __init__(self, env):
+        self.env = env
+        self.proc = None
+        self.tools = {}
+        self.last_used = 0.0
+        self._buffer = b''
+        self._ids = itertools.count(1)
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self):
+        self.stop()
+        self.proc = subprocess.Popen(['node', WORKER_SCRIPT], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL, env=self.env)
+        self._buffer = b''
+        self.tools = self.request([{'tool': 'ping'}], [10])[0]['result']['tools']
+
+    def stop(self):
+        if self.proc is not None:
+            try:
+                self.proc.kill()
+                self.proc.wait(timeout=5)
+            except (OSError, subprocess.SubprocessError):
+                pass
+            for pipe in (self.proc.stdin, self.proc.stdout):
+                try:
+                    pipe.close()
+                except OSError:
+                    pass
+        self.proc = None
+
+    def _readline(self, timeout):
+        deadline = time.monotonic() + timeout
+        fd = self.proc.stdout.fileno()
+        while b'\n' not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                return None
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise NodeWorkerError("Node worker exited unexpectedly.")
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b'\n', 1)
+        return line
+
+    def request(self, jobs, timeouts):
+        """
+        Pipelines a batch of jobs and returns their responses in order.
+        Each job gets its own timeout, counted from the previous answer; a timeout
+        kills the worker so a runaway job cannot block the next caller.
+        """
+        jobs = [dict(job, id=next(self._ids)) for job in jobs]
+        try:
+            self.proc.stdin.write(b''.join(json.dumps(job).encode('utf-8') + b'\n' for job in jobs))
+            self.proc.stdin.flush()
+            responses = []
+            for job, timeout in zip(jobs, timeouts):
+                line = self._readline(timeout)
+                if line is None:
+                    self.stop()
+                    raise subprocess.TimeoutExpired(['node', WORKER_SCRIPT, job['tool']], timeout)
+                response = json.loads(line)
+                if response.get('id') != job['id']:
+                    raise NodeWorkerError(f"Out-of-order response from Node worker: {response!r}")
+                responses.append(response)
+        except (OSError, ValueError, NodeWorkerError):
+            self.stop()
+            raise
+        self.last_used = time.monotonic()
+        return responses
+
+
+class NodeWorkerPool:
+    """A fixed set of Node workers handed out to one caller at a time."""
+
+    def __init__(self, size, env):
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(NodeWorker(env))
+
+    def _checkout(self):
+        worker = self._idle.get()
+        try:
+            if not worker.alive():
+                worker.start()  # first use, or restart after a crash or timeout
+            elif time.monotonic() - worker.last_used > HEALTH_CHECK_INTERVAL:
+                try:
+                    worker.request([{'tool': 'ping'}], [10])
+                except (subprocess.TimeoutExpired, OSError, ValueError, NodeWorkerError):
+                    worker.start()
+        except Exception:
+            worker.stop()
+            self._idle.put(worker)
+            raise
+        return worker
+
+    def supports(self, tool):
+        """Starts a worker if needed and reports whether it can load `tool`."""
+        worker = self._checkout()
+        self._idle.put(worker)
+        return bool(worker.tools.get(tool))
+
+    def run_batch(self, jobs, timeouts):
+        """Runs jobs on a single worker. Raises on the first failed job."""
+        worker = self._checkout()
+        try:
+            responses = worker.request(jobs, timeouts)
+        finally:
+            self._idle.put(worker)
+        for response in responses:
+            if not response.get('ok'):
+                raise NodeJobError(response.get('error') or "Node worker job failed.")
+        return responses
+
+    def run(self, tool, in_path, out_path, options=None, timeout_seconds=300):
+        return self.run_batch([{'tool': tool, 'input': in_path, 'output': out_path, 'options': options or {}}],
+                              [timeout_seconds])[0]
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                return
+
+
+_pool, _pool_size, _pool_unavailable = None, 0, False
+_pool_lock = threading.Lock()
+
+def configure(size):
+    """Sets the pool size. 0 disables the daemons and keeps the one-shot CLI path."""
+    global _pool_size
+    _pool_size = size
+
+def _global_node_path():
+    if not toolchain.available('npm'):
+        return ''
+    try:
+        return subprocess.run(['npm', 'root', '-g'], capture_output=True, text=True, timeout=30).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+def get_pool():
+    """Returns the process-wide pool, or None when Node is missing or daemons are disabled."""
+    global _pool, _pool_unavailable
+    if _pool is not None or _pool_unavailable or _pool_size <= 0:
+        return _pool
+    with _pool_lock:
+        if _pool is None and not _pool_unavailable:
+            if not toolchain.available('node'):
+                _pool_unavailable = True
+                return None
+            env = dict(os.environ)
+            node_path = [p for p in (env.get('NODE_PATH'), _global_node_path()) if p]
+            env['NODE_PATH'] = os.pathsep.join(node_path)
+            _pool = NodeWorkerPool(_pool_size, env)
+            atexit.register(_pool.close)
+    return _pool
+
+def run_tool(tool, in_path, out_path, options=None, timeout_seconds=300):
+    """
+    Runs `tool` on a pooled worker. Returns False when the daemon is unavailable,
+    cannot load the tool or crashes mid-job, so the caller can fall back to the CLI.
+    """
+    pool = get_pool()
+    if pool is None:
+        return False
+    try:
+        if not pool.supports(tool):
+            return False
+    except (subprocess.TimeoutExpired, OSError, ValueError, NodeWorkerError):
+        return False
+    try:
+        pool.run(tool, in_path, out_path, options, timeout_seconds)
+    except (OSError, ValueError, NodeWorkerError):
+        return False
+    return True
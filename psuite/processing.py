@@ -3,20 +3,85 @@ import shutil
 import zipfile
 import subprocess
 import json
-import re
-from PIL import Image
-import cssmin
-import minify_html
-from bs4 import BeautifulSoup
+import time
+import queue
+import functools
+import threading
+import multiprocessing
+from importlib import metadata
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from flask import current_app
 from . import socketio
+from . import node_workers
+from . import critical
+from . import css
+from . import hardening
+from . import metrics
+from . import storage
+from . import toolchain
+from .cache import AssetCache, file_digest
+from .progress import ProgressChannel
+from .analyzers import ANALYZERS, run_analyzers
+from .manifest import ProjectManifest
+from .scanner import RULES as SCAN_RULES, scan_directory
+from .advisories import (AdvisoryIndex, Package, Vulnerability, has_advisories,
+                         parse_requirements, parse_package_lock)
 
 # --- HELPER FUNCTIONS ---
 
+# Job workers have no client connections, so they swap this for one that records events.
+_emitter = socketio.emit
+_channels = {}
+
+def set_emitter(emit):
+    """Routes every event emitted by the processing functions through `emit(event, payload, room=...)`."""
+    global _emitter
+    _emitter = emit
+
+def _emit_now(event, payload=None, room=None):
+    _emitter(event, payload, room=room)
+    socketio.sleep(0) # Let the server send the message
+
+def emit(event, payload=None, room=None):
+    flush_status(room) # Status lines sent before this event must arrive before it
+    _emit_now(event, payload, room=room)
+
+def progress_channel(room):
+    """Returns the ProgressChannel buffering status updates for `room`."""
+    if room not in _channels:
+        _channels[room] = ProgressChannel(room, _emit_now)
+    return _channels[room]
+
+def flush_status(room=None):
+    """
+    Sends the buffered status lines of `room` now, or of every room if None. Channels
+    owned by another thread are left for it; pool threads only queue.
+    """
+    for channel in (list(_channels.values()) if room is None else [_channels.get(room)]):
+        if channel is not None and channel.owner == threading.get_ident():
+            channel.flush()
+
+def _as_completed_flushing(futures, room):
+    """
+    Yields `futures` as they complete, like as_completed. While it waits, the status lines
+    of `room` still go out every `max_delay`, not only when the next future finishes.
+    """
+    pending, channel = set(futures), progress_channel(room)
+    while pending:
+        done, pending = wait(pending, timeout=channel.max_delay, return_when=FIRST_COMPLETED)
+        if not done:
+            flush_status(room)
+        yield from done
+
+def close_status(room):
+    """Flushes and forgets the channel of a finished run."""
+    channel = _channels.pop(room, None)
+    if channel is not None:
+        channel.flush()
+
 def send_status(sid, message, status_type='info'):
-    """Sends a status update to a specific client via WebSocket."""
-    socketio.emit('status_update', {'message': message, 'type': status_type}, room=sid)
-    socketio.sleep(0.01) # Give the server a moment to send the message
+    """Queues a status update for a specific client; it goes out with the next batch."""
+    progress_channel(sid).status(message, status_type)
 
 def cleanup(path):
     """Safely removes a file or directory."""
@@ -28,275 +93,767 @@ def cleanup(path):
         except OSError:
             pass
 
-def _run_command(cmd, cwd, timeout_seconds=300, check_exit_code=True):
+def _run_command(cmd, cwd, timeout_seconds=300, check_exit_code=True, in_path=None, out_path=None):
     """
-    Executes a shell command and returns the result.
+    Executes a command (an argv list, or a string for the shell) and returns the result.
     check_exit_code=False is crucial for tools that use non-zero exits to report findings.
+    Its wall/CPU time, peak RSS and the sizes of `in_path`/`out_path` go to the run's trace.
     """
-    return subprocess.run(
-        cmd, 
-        cwd=cwd, 
-        shell=True, 
-        check=check_exit_code, 
-        capture_output=True, 
-        text=True, 
-        timeout=timeout_seconds
-    )
-
-def _build_file_tree(directory):
-    """Builds a nested dictionary representing a file tree."""
-    tree = []
-    for item in sorted(os.listdir(directory)):
-        path = os.path.join(directory, item)
-        node = {'name': item}
-        if os.path.isdir(path):
-            node['type'] = 'directory'
-            node['children'] = _build_file_tree(path)
-        else:
-            node['type'] = 'file'
-        tree.append(node)
-    return tree
+    flush_status() # Tools can run for minutes; show what led up to them first
+    return metrics.run_command(cmd, cwd, timeout_seconds, check_exit_code, in_path, out_path)
 
 # --- INDIVIDUAL PROCESSING MODULES (Largely unchanged, minor robustness improvements) ---
-def _optimize_image(in_path, out_path):
+# Default cap on decoded pixels per image; each pixel costs up to 4 bytes in RGBA.
+IMAGE_MAX_PIXELS = 50_000_000
+# Sibling formats written next to an optimized image, e.g. photo.jpg -> photo.jpg.webp.
+IMAGE_SIBLING_FORMATS = {'image_webp': ('WEBP', '.webp'), 'image_avif': ('AVIF', '.avif')}
+
+def _optimize_image(in_path, out_path, options=None):
+    """
+    Re-encodes an image without its EXIF/ICC metadata and text chunks; transparency
+    is kept. The pixel budget is checked
+    against the header before anything is decoded, and every step works on whole
+    Pillow images, so peak memory stays a small multiple of the decoded size.
+    """
+    from PIL import Image, ImageOps
+    options = options or {}
+    max_pixels = options.get('image_max_pixels') or IMAGE_MAX_PIXELS
     with Image.open(in_path) as img:
-        img_data = list(img.getdata())
-        stripped_img = Image.new(img.mode, img.size)
-        stripped_img.putdata(img_data)
-        stripped_img.save(out_path, optimize=True, quality=80)
-    return "Optimized"
+        if img.width * img.height > max_pixels:
+            raise ValueError(f"Image is {img.width}x{img.height}, over the {max_pixels:,} pixel budget. Left unchanged.")
+        fmt = img.format
+        ImageOps.exif_transpose(img, in_place=True)  # bake in the rotation before EXIF goes away
+        img.info = {k: v for k, v in img.info.items() if k == 'transparency'}
+        details = []
+        if fmt in ('JPEG', 'MPO'):
+            img.save(out_path, 'JPEG', quality=80, optimize=True, progressive=True)
+            details.append('progressive JPEG')
+        elif fmt == 'PNG' and options.get('png_quantize') and img.mode not in ('P', '1', 'L'):
+            # A transparent colour key (tRNS) would not survive quantizing; turn it into alpha first.
+            source = img.convert('RGBA') if 'transparency' in img.info or img.mode == 'LA' else img
+            method = Image.Quantize.FASTOCTREE if source.mode == 'RGBA' else Image.Quantize.MEDIANCUT
+            source.quantize(256, method=method).save(out_path, 'PNG', optimize=True)
+            details.append('256-colour palette')
+        else:
+            img.save(out_path, fmt, optimize=True)
+
+        Image.init()
+        for option, (sibling_fmt, suffix) in IMAGE_SIBLING_FORMATS.items():
+            if not options.get(option):
+                continue
+            if sibling_fmt not in Image.SAVE:
+                details.append(f"{sibling_fmt} unsupported")
+                continue
+            sibling = img if img.mode in ('RGB', 'RGBA', 'L') and 'transparency' not in img.info else img.convert('RGBA')
+            sibling.save(out_path + suffix, sibling_fmt, quality=80)
+            details.append(f"+{sibling_fmt} {os.path.getsize(out_path + suffix) / 1024:.1f} KB")
+    return "Optimized" + (f" ({', '.join(details)})" if details else "")
+
+def _run_node_tool(tool, cmd, in_path, out_path, node_options, timeout_seconds=300):
+    """Runs a Node CLI job on the pooled workers, falling back to a one-shot subprocess."""
+    with metrics.traced('tool', tool, in_path, out_path) as span:
+        span.skip = not node_workers.run_tool(tool, in_path, out_path, node_options, timeout_seconds)
+    if span.skip:
+        toolchain.require(tool)
+        _run_command(cmd, cwd=os.path.dirname(in_path), timeout_seconds=timeout_seconds, in_path=in_path, out_path=out_path)
 
 def _process_js(in_path, out_path, options):
+    timeout_seconds = options.get('file_timeouts', {}).get('js', 300)
     info, current_input, tmp_path = "", in_path, None
     if options.get('obfuscate_js', 'none') != 'none':
         tmp_path = out_path + ".tmp.js"
         info = f"Obfuscated ({options['obfuscate_js']})"
         cmd = ['javascript-obfuscator', current_input, '--output', tmp_path, '--compact', 'true']
+        node_options = {'compact': True}
         if options['obfuscate_js'] == 'strong':
             cmd.extend(['--string-array', 'true', '--transform-object-keys', 'true'])
+            node_options.update(stringArray=True, transformObjectKeys=True)
         try:
-            _run_command(cmd, cwd=os.path.dirname(in_path))
+            _run_node_tool('javascript-obfuscator', cmd, current_input, tmp_path, node_options, timeout_seconds)
             current_input = tmp_path
         except subprocess.TimeoutExpired:
-            raise Exception("JS Obfuscation timed out.")
+            raise Exception(f"JS Obfuscation timed out after {timeout_seconds}s.")
         except Exception as e:
             print(f"Obfuscation failed: {e}")
     try:
-        _run_command(['terser', current_input, '-o', out_path, '--compress', '--mangle'], cwd=os.path.dirname(in_path))
+        _run_node_tool('terser', ['terser', current_input, '-o', out_path, '--compress', '--mangle'],
+                       current_input, out_path, {'compress': True, 'mangle': True}, timeout_seconds)
         info += " & Minified"
     except subprocess.TimeoutExpired:
-        raise Exception("JS Minification (Terser) timed out.")
+        raise Exception(f"JS Minification (Terser) timed out after {timeout_seconds}s.")
     finally:
         if tmp_path:
             cleanup(tmp_path)
     return info.strip(" &")
 
-def _process_svg(in_path, out_path):
+def _process_svg(in_path, out_path, options):
+    timeout_seconds = options.get('file_timeouts', {}).get('svg', 120)
     try:
-        _run_command(['svgo', in_path, '-o', out_path], cwd=os.path.dirname(in_path), timeout_seconds=120)
+        _run_node_tool('svgo', ['svgo', in_path, '-o', out_path], in_path, out_path, {}, timeout_seconds)
         return "SVG Optimized"
     except subprocess.TimeoutExpired:
-        raise Exception("SVG Optimization timed out.")
+        raise Exception(f"SVG Optimization timed out after {timeout_seconds}s.")
 
 def _harden_html(in_path, out_path, options):
+    import minify_html
     with open(in_path, 'r', encoding='utf-8') as f:
         code = f.read()
     info = ""
     if options.get('add_csp'):
-        soup = BeautifulSoup(code, 'html.parser')
-        # Remove any existing CSP meta tags to avoid conflicts
-        for tag in soup.find_all('meta', attrs={'http-equiv': 'Content-Security-Policy'}):
-            tag.decompose()
-        csp_tag = soup.new_tag('meta')
-        csp_tag['http-equiv'] = 'Content-Security-Policy'
-        # A reasonably strict but common CSP
-        csp_tag['content'] = "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; font-src 'self' https://fonts.gstatic.com; img-src 'self' data:;"
-        if soup.head:
-            soup.head.insert(0, csp_tag)
-        code = str(soup)
+        csp, referrer = options.get('csp_policy'), options.get('referrer_policy')
+        try:
+            code = hardening.harden(code, csp, referrer)
+        except hardening.MalformedHTML:
+            code = hardening.harden_dom(code, csp, referrer)
         info = "Hardened (CSP) & "
     minified = minify_html.minify(code, minify_js=True, minify_css=True)
     with open(out_path, 'w', encoding='utf-8') as f:
         f.write(minified)
     return info + "Minified"
 
-def _purge_css(processed_dir):
-    content_files = [os.path.join(r, f) for r, _, fs in os.walk(processed_dir) for f in fs if f.endswith(('.html', '.js'))]
-    css_files = [os.path.join(r, f) for r, _, fs in os.walk(processed_dir) for f in fs if f.endswith('.css')]
-    if css_files and content_files:
-        try:
-            # Safelist classes that are added dynamically by JS
-            cmd = ['purgecss', '--css'] + css_files + ['--content'] + content_files + ['--output', processed_dir, '--safelist', 'drag-over']
-            _run_command(cmd, cwd=processed_dir, timeout_seconds=180)
-        except subprocess.TimeoutExpired:
-            raise Exception("PurgeCSS timed out.")
-        except Exception as e:
-            print(f"PurgeCSS failed: {e}")
+def _csp_policy(options, default):
+    """The session's CSP if it is a usable header value, else `default`."""
+    policy = ' '.join(str(options.get('csp_policy') or '').split())
+    return policy if policy and not set(policy) & set('"<>') else default
 
-def _minify_css(file_path):
-    with open(file_path, 'r+', encoding='utf-8') as f:
-        minified = cssmin.cssmin(f.read())
-        f.seek(0)
-        f.write(minified)
-        f.truncate()
+def _add_sri(processed_dir, reports, sid):
+    """Pins every local <script src> with an integrity hash once all JS outputs are final."""
+    pages = [r for r in reports if _file_ext(r['path']) in ('html', 'htm')]
+    patched = 0
+    for report in pages:
+        try:
+            if hardening.add_integrity_to_page(os.path.join(processed_dir, report['path']), processed_dir):
+                patched += 1
+                report['new_size'] = os.path.getsize(os.path.join(processed_dir, report['path']))
+                report['bytes_saved'] = report['original_size'] - report['new_size']
+        except OSError as e:
+            send_status(sid, f"{report['path']}: could not add SRI hashes: {e}", 'error')
+    send_status(sid, f"Added SRI hashes to local scripts in {patched} of {len(pages)} page(s).")
 
-def generate_critical_css(processed_dir, sid):
-    html_files = [os.path.join(r, f) for r, _, fs in os.walk(processed_dir) for f in fs if f.endswith('.html')]
-    if not html_files:
+def _optimize_css(processed_dir, manifest, reports, sid, purge, max_workers):
+    """Purges (optionally) and minifies every stylesheet in one in-process pass per file."""
+    config = current_app.config
+    css_reports = {os.path.join(processed_dir, r['path']): r for r in reports if _file_ext(r['path']) == 'css'}
+    if not css_reports:
         return
-    send_status(sid, "Generating Critical CSS (Pro feature)...")
+    used = None
+    if purge:
+        content = [os.path.join(processed_dir, p) for p in manifest.paths({'html', 'htm', 'js'})]
+        used = css.build_usage_index(content) if content else None
+    purged = minified = 0
+    for path, result in css.optimize_stylesheets(list(css_reports), used, config['CSS_SAFELIST'],
+                                                 config['CSS_SAFELIST_PATTERNS'], max_workers):
+        report = css_reports[path]
+        if isinstance(result, Exception):
+            report['status'], report['message'] = 'error', f"CSS optimization failed: {result}"
+            metrics.record(metrics.Sample('tool', 'css-optimizer', 0.0, 0.0, 0, report['original_size'], 0, 'error'))
+            continue
+        metrics.record(metrics.Sample('tool', 'css-optimizer', result.seconds, result.cpu_seconds, 0,
+                                      result.original_size, result.new_size, 'ok'))
+        purged, minified = purged + result.purged_bytes, minified + result.minified_bytes
+        report['new_size'], report['status'] = result.new_size, 'success'
+        report['bytes_saved'] = report['original_size'] - result.new_size
+        report['message'] = (f"Purged {result.purged_bytes:,} B & " if used is not None else '') + \
+            f"Minified {result.minified_bytes:,} B"
+    summary = f"purge removed {purged:,} B, " if used is not None else ''
+    send_status(sid, f"CSS: {summary}minification removed {minified:,} B across {len(css_reports)} stylesheet(s).")
+
+def generate_critical_css(processed_dir, sid, manifest=None):
+    """
+    Inlines above-the-fold CSS into every page. Pages in the same directory with the same
+    stylesheets and layout skeleton share one extraction; extractions run in parallel on
+    the pooled headless browsers, each bounded by CRITICAL_PAGE_TIMEOUT. Returns the
+    number of pages that failed.
+    """
+    manifest = manifest or ProjectManifest.scan(processed_dir)
+    pages = manifest.paths({'html'})
+    if not pages:
+        return 0
+    config = current_app.config
+    viewports = [tuple(v) for v in config.get('CRITICAL_VIEWPORTS') or [(1200, 900)]]
+    timeout_seconds = config.get('CRITICAL_PAGE_TIMEOUT', 60)
+    sizes = ', '.join(f"{w}x{h}" for w, h in viewports)
+    send_status(sid, f"Generating Critical CSS (Pro feature) for {len(pages)} page(s) at {sizes}...")
+
+    groups, sheet_digests = {}, {}
+    for rel_path in pages:
+        html_path = os.path.join(processed_dir, rel_path)
+        with open(html_path, 'r', encoding='utf-8', errors='replace') as f:
+            html = f.read()
+        sheets = critical.stylesheets(html, html_path, processed_dir)
+        if not sheets:
+            send_status(sid, f"{rel_path}: no local stylesheets, skipped.")
+            continue
+        for path in sheets:
+            if path not in sheet_digests:
+                sheet_digests[path] = file_digest(path)
+        # Critical rebases url()s against the page, so only pages in one directory can share.
+        key = (os.path.dirname(rel_path), tuple(sheet_digests[p] for p in sheets), critical.layout_signature(html))
+        groups.setdefault(key, []).append(rel_path)
+    if not groups:
+        return 0
+
+    def extract(rel_path):
+        started = time.monotonic()
+        html_path = os.path.join(processed_dir, rel_path)
+        with metrics.traced('tool', 'critical', html_path) as span:
+            css = critical.extract(html_path, processed_dir, viewports, timeout_seconds, span)
+            span.bytes_out = len(css)
+        return css, time.monotonic() - started
+
+    channel = progress_channel(sid)
+    total, done, failed = sum(len(paths) for paths in groups.values()), 0, 0
+    flush_status()
+    with ThreadPoolExecutor(max_workers=min(config.get('CRITICAL_CONCURRENCY') or 1, len(groups))) as pool:
+        futures = {pool.submit(extract, paths[0]): paths for paths in groups.values()}
+        for future in _as_completed_flushing(futures, sid):
+            paths = futures[future]
+            try:
+                css, elapsed = future.result()
+            except subprocess.TimeoutExpired:
+                css, error = None, f"timed out after {timeout_seconds}s"
+            except Exception as e:
+                css, error = None, f"failed: {e}"
+            for i, rel_path in enumerate(paths):
+                done += 1
+                if css is None:
+                    failed += 1
+                    channel.status(f"[{done}/{total}] {rel_path}: Critical CSS {error}", 'error')
+                    continue
+                started = time.monotonic()
+                critical.inline_into(os.path.join(processed_dir, rel_path), css)
+                manifest.update(rel_path, output_size=os.path.getsize(os.path.join(processed_dir, rel_path)))
+                if i == 0:
+                    message = f"{elapsed * 1000:.0f} ms"
+                else:
+                    message = f"reused from {paths[0]} ({(time.monotonic() - started) * 1000:.0f} ms)"
+                channel.status(f"[{done}/{total}] {rel_path}: {message}", 'info')
+            channel.progress(pages_done=done, pages_total=total)
+    if failed < total:
+        send_status(sid, f"Critical CSS has been inlined into {total - failed} page(s) from {len(groups)} extraction(s).", 'success')
+    return failed
+
+
+# --- PER-FILE EXECUTION ENGINE ---
+
+IMAGE_EXTS = {'png', 'jpg', 'jpeg'}
+# Pillow and minify_html hold the GIL, so they go to a process pool. Everything else
+# (terser, svgo, javascript-obfuscator, plain copies) just waits on I/O or a child process.
+PROCESS_POOL_EXTS = IMAGE_EXTS | {'html'}
+# Forking while the thread pool is spawning subprocesses lets pool workers inherit
+# half-set-up pipes, so worker processes come from a clean forkserver instead.
+_MP_CONTEXT = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+# The web process never imports these; the forkserver imports them once and every pool
+# worker it forks starts warm instead of paying for them on its first file.
+PROCESSING_MODULES = ['PIL.Image', 'PIL.ImageOps', 'minify_html', 'bs4']
+POOL_PRELOAD = ['psuite.processing'] + PROCESSING_MODULES
+if _MP_CONTEXT.get_start_method() == 'forkserver':
+    _MP_CONTEXT.set_forkserver_preload(POOL_PRELOAD)
+
+def _file_ext(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+def _dispatch_file(in_path, out_path, ext, options):
+    if ext in IMAGE_EXTS:
+        with metrics.traced('tool', 'Pillow', in_path, out_path):
+            return _optimize_image(in_path, out_path, options), 'success'
+    if ext == 'svg':
+        return _process_svg(in_path, out_path, options), 'success'
+    if ext == 'js':
+        return _process_js(in_path, out_path, options), 'success'
+    if ext == 'html':
+        with metrics.traced('tool', 'minify-html', in_path, out_path):
+            return _harden_html(in_path, out_path, options), 'success'
+    storage.passthrough(in_path, out_path)
+    if ext == 'css':
+        return 'Copied, pending final processing.', 'info'
+    return 'Copied as-is.', 'warning'
+
+def _process_file(in_path, out_path, ext, options):
+    """Runs the optimizer matching the file type. Returns the report fields it produced."""
+    start = time.perf_counter()
+    with metrics.collecting() as samples:  # shipped back with the report, even from a worker process
+        try:
+            message, status = _dispatch_file(in_path, out_path, ext, options)
+        except Exception as e:
+            e.samples = samples
+            raise
+    return {'message': message, 'status': status, 'duration_ms': round((time.perf_counter() - start) * 1000, 1),
+            'trace': [tuple(sample) for sample in samples]}
+
+def _finish_report(report, in_path, out_path, run):
+    """Fills in a file report from the outcome of `run`, a zero-arg callable."""
     try:
-        for html_path in html_files:
-            _run_command(['critical', html_path, '--inline', '--base', processed_dir, '-w', '1200', '-h', '900', '--extract'], cwd=processed_dir)
-        send_status(sid, "Critical CSS has been inlined.", 'success')
-    except subprocess.TimeoutExpired:
-        send_status(sid, "Critical CSS generation timed out.", 'error')
+        report.update(run())
+        report['new_size'] = os.path.getsize(out_path)
     except Exception as e:
-        send_status(sid, f"Critical CSS generation failed: {e}", 'error')
+        report['message'] = str(e)
+        report['trace'] = getattr(e, 'samples', [])
+        report['new_size'] = report['original_size']
+        if not os.path.exists(out_path): storage.passthrough(in_path, out_path)
+    report['bytes_saved'] = report['original_size'] - report['new_size']
+    return report
 
+IMAGE_OPTIONS = ('image_max_pixels', 'png_quantize') + tuple(IMAGE_SIBLING_FORMATS)
+# Tools behind each cacheable file type, and the options that change their output.
+CACHED_TOOLS = {
+    'png': (('Pillow',), IMAGE_OPTIONS),
+    'jpg': (('Pillow',), IMAGE_OPTIONS),
+    'jpeg': (('Pillow',), IMAGE_OPTIONS),
+    'svg': (('svgo',), ()),
+    'js': (('terser', 'javascript-obfuscator'), ('obfuscate_js',)),
+    'html': (('minify-html',), ('add_csp', 'csp_policy', 'referrer_policy')),
+}
+# Raised when an optimizer's output changes without a tool upgrade, so outputs cached or
+# kept from earlier runs are rebuilt. 2: images keep their transparency.
+OUTPUT_REVISIONS = {'png': 2, 'jpg': 2, 'jpeg': 2}
 
-# --- HIGH-LEVEL TOOL FUNCTIONS ---
+@functools.lru_cache(maxsize=None)
+def _tool_version(tool):
+    """Version of a Python package or Node CLI, looked up once per process."""
+    try:
+        return metadata.version(tool)
+    except metadata.PackageNotFoundError:
+        pass
+    if not toolchain.available(tool):
+        return 'missing'
+    try:
+        return subprocess.run([tool, '--version'], capture_output=True, text=True, timeout=30).stdout.strip() or 'unknown'
+    except (OSError, subprocess.SubprocessError):
+        return 'unknown'
 
-def do_frontend_optimization(unpacked_path, processed_path, options, sid):
-    send_status(sid, "Optimizing assets...")
-    reports_dict = {}
-    for root, _, files in os.walk(unpacked_path):
-        for filename in files:
-            in_path = os.path.join(root, filename)
-            rel_path = os.path.relpath(in_path, unpacked_path)
-            out_path = os.path.join(processed_path, rel_path)
+def _asset_cache_key(in_path, ext, options, digest=None):
+    tools, option_names = CACHED_TOOLS[ext]
+    relevant = {name: options.get(name) for name in option_names}
+    version = {tool: _tool_version(tool) for tool in tools}
+    if ext in OUTPUT_REVISIONS:
+        version['revision'] = OUTPUT_REVISIONS[ext]
+    return AssetCache.make_key(digest or file_digest(in_path), ext, version, relevant)
+
+def _record_file_trace(report, samples):
+    """Adds a file's tool samples to the run trace, plus one sample for its file type."""
+    samples = [metrics.Sample(*sample) for sample in samples]
+    for sample in samples:
+        metrics.record(sample)
+    metrics.record(metrics.Sample('filetype', _file_ext(report['path']) or 'other', report.get('duration_ms', 0) / 1000,
+                                  sum(s.cpu for s in samples), max((s.max_rss_kb for s in samples), default=0),
+                                  report['original_size'], report['new_size'],
+                                  'error' if report['status'] == 'error' else 'ok'))
+
+def _report_progress(sid, done, total, report, bytes_saved):
+    channel = progress_channel(sid)
+    reused = " (unchanged, reused)" if report.get('incremental') == 'reused' else ''
+    channel.status(f"[{done}/{total}] {report['path']}: {report['message']}{reused}", report['status'])
+    channel.progress(files_done=done, files_total=total, bytes_saved=bytes_saved)
+
+def _run_file_jobs(files, unpacked_path, processed_path, options, sid, max_workers, cache=None, on_done=None,
+                   manifest=None, run=None):
+    """
+    Optimizes every file in `files`, a sized iterable of paths relative to `unpacked_path`.
+    It is consumed lazily, so files can still be arriving (e.g. from the archive) while
+    earlier ones are processed. Streams per-file progress and returns the reports in the
+    order of `files`, no matter which file finishes first. Outputs found in `cache` are
+    restored instead of rebuilt. `on_done(rel_path, out_path)` runs as each output is final.
+    Sizes and digests already in `manifest` are used instead of re-reading the inputs.
+    With an incremental `run`, files unchanged since the user's previous run get that
+    run's final output back and are marked 'reused'; the rest are marked 'reprocessed'.
+    """
+    total, done, saved = len(files), 0, 0
+    reports_dict, cache_keys = {}, {}
+    completed = queue.SimpleQueue()
+
+    def finish(rel_path, in_path, out_path, run):
+        nonlocal done, saved
+        done += 1
+        report = _finish_report(reports_dict[rel_path], in_path, out_path, run)
+        saved += report['bytes_saved']
+        _record_file_trace(report, report.pop('trace', []))
+        if rel_path in cache_keys and report['status'] == 'success':
+            key = cache_keys[rel_path]
+            siblings = [suffix for _, suffix in IMAGE_SIBLING_FORMATS.values() if os.path.exists(out_path + suffix)]
+            for suffix in siblings:
+                cache.put(AssetCache.make_key(key, suffix, None), out_path + suffix)
+            cache.put(key, out_path, message=report['message'], siblings=siblings)
+        _report_progress(sid, done, total, report, saved)
+        if on_done is not None:
+            on_done(rel_path, out_path)
+
+    def restored(rel_path, out_path, **fields):
+        nonlocal done, saved
+        done += 1
+        report, new_size = reports_dict[rel_path], os.path.getsize(out_path)
+        report.update(fields, new_size=new_size, bytes_saved=report['original_size'] - new_size)
+        saved += report['bytes_saved']
+        _report_progress(sid, done, total, report, saved)
+        if on_done is not None:
+            on_done(rel_path, out_path)
+        return True
+
+    def restore_from_cache(rel_path, in_path, out_path, ext):
+        digest = manifest.digest(rel_path) if manifest is not None else None
+        report, key = reports_dict[rel_path], _asset_cache_key(in_path, ext, options, digest)
+        entry = cache.get(key, out_path)
+        if entry is None or not all(cache.get(AssetCache.make_key(key, suffix, None), out_path + suffix)
+                                    for suffix in entry.get('siblings', [])):
+            report['cache'], cache_keys[rel_path] = 'miss', key
+            return False
+        return restored(rel_path, out_path, message=entry['message'], status='success', cache='hit')
+
+    def restore_previous(rel_path, in_path, out_path):
+        digest = manifest.digest(rel_path, unpacked_path) if manifest is not None else file_digest(in_path)
+        entry = run.restore(rel_path, digest, out_path)
+        if entry is None:
+            reports_dict[rel_path]['incremental'] = 'reprocessed'
+            return False
+        return restored(rel_path, out_path, message=entry['message'], status=entry['status'], incremental='reused')
+
+    threads = processes = None
+    if max_workers > 1:
+        threads = ThreadPoolExecutor(max_workers=max_workers)
+        processes = ProcessPoolExecutor(max_workers=max_workers, mp_context=_MP_CONTEXT)
+    try:
+        in_flight = 0
+        for rel_path in files:
+            in_path, out_path = os.path.join(unpacked_path, rel_path), os.path.join(processed_path, rel_path)
+            filename, ext = os.path.basename(rel_path), _file_ext(rel_path)
             os.makedirs(os.path.dirname(out_path), exist_ok=True)
-            report = {'name': filename, 'path': rel_path.replace('\\', '/'), 'original_size': os.path.getsize(in_path), 'status': 'error', 'message': 'Unknown error.'}
+            entry = manifest.get(rel_path) if manifest is not None else None
+            original_size = entry['size'] if entry and entry.get('size') is not None else os.path.getsize(in_path)
+            reports_dict[rel_path] = {'name': filename, 'path': rel_path.replace('\\', '/'), 'original_size': original_size, 'status': 'error', 'message': 'Unknown error.'}
+            if run is not None and restore_previous(rel_path, in_path, out_path):
+                continue
+            if cache is not None and ext in CACHED_TOOLS and restore_from_cache(rel_path, in_path, out_path, ext):
+                continue
+            if threads is None:
+                finish(rel_path, in_path, out_path, lambda: _process_file(in_path, out_path, ext, options))
+                continue
+            pool = processes if ext in PROCESS_POOL_EXTS else threads
+            future = pool.submit(_process_file, in_path, out_path, ext, options)
+            future.add_done_callback(lambda f, job=(rel_path, in_path, out_path): completed.put((job, f)))
+            in_flight += 1
+            while not completed.empty():
+                job, future = completed.get()
+                finish(*job, future.result)
+                in_flight -= 1
+        channel = progress_channel(sid)
+        while in_flight:
             try:
-                ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
-                if ext in {'png', 'jpg', 'jpeg'}:
-                    report['message'], report['status'] = _optimize_image(in_path, out_path), 'success'
-                elif ext == 'svg':
-                    report['message'], report['status'] = _process_svg(in_path, out_path), 'success'
-                elif ext == 'js':
-                    report['message'], report['status'] = _process_js(in_path, out_path, options), 'success'
-                elif ext == 'html':
-                    report['message'], report['status'] = _harden_html(in_path, out_path, options), 'success'
-                elif ext == 'css':
-                    shutil.copy2(in_path, out_path)
-                    report['message'], report['status'] = 'Copied, pending final processing.', 'info'
-                else:
-                    shutil.copy2(in_path, out_path)
-                    report['message'], report['status'] = 'Copied as-is.', 'warning'
-                report['new_size'] = os.path.getsize(out_path)
-            except Exception as e:
-                report['message'] = str(e)
-                report['new_size'] = report['original_size']
-                if not os.path.exists(out_path): shutil.copy2(in_path, out_path)
-            reports_dict[rel_path] = report
-
-    if options.get('purge_css'):
-        send_status(sid, "Purging unused CSS...")
-        _purge_css(processed_path)
-    
-    send_status(sid, "Minifying all CSS...")
-    for path, report in reports_dict.items():
-        if path.endswith('.css'):
-            css_file_path = os.path.join(processed_path, path)
-            _minify_css(css_file_path)
-            report['new_size'] = os.path.getsize(css_file_path)
-            report['message'] = 'Purged & Minified' if options.get('purge_css') else 'Minified'
-            report['status'] = 'success'
+                job, future = completed.get(timeout=channel.max_delay)
+            except queue.Empty:
+                flush_status(sid)  # a slow file must not hold back the lines already queued
+                continue
+            finish(*job, future.result)
+            in_flight -= 1
+    finally:
+        for pool in (threads, processes):
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+    return list(reports_dict.values())
+
+
+def _archive_file(archive, out_path, rel_path):
+    archive.add(out_path, rel_path)
+    for _, suffix in IMAGE_SIBLING_FORMATS.values():
+        if os.path.exists(out_path + suffix):
+            archive.add(out_path + suffix, rel_path + suffix)
+
+def archive_outputs(archive, processed_path, reports, exts):
+    """Adds the outputs of every reported file with one of `exts` to `archive`."""
+    for report in reports:
+        if _file_ext(report['path']) in exts:
+            _archive_file(archive, os.path.join(processed_path, report['path']), report['path'])
+
+
+# --- HIGH-LEVEL TOOL FUNCTIONS ---
+
+FINDINGS_BATCH = 200  # records per 'security_findings'/'lint_issues' event
+
+# Project-wide stages and the file types whose final outputs they produce.
+STAGE_EXTS = {'css': ('css',), 'html': ('html', 'htm')}
+
+def _stage_keys(manifest, unpacked_path, options, critical):
+    """Keys of the project-wide stages, from the digests of every input they read."""
+    config = current_app.config
+    def digests(exts):
+        return {p: manifest.digest(p, unpacked_path) for p in manifest.paths(exts)}
+    content = digests({'html', 'htm', 'js'})
+    keys = {'css': AssetCache.make_key(digests({'css'}), 'css', None, {
+        'purge': bool(options.get('purge_css')), 'content': content if options.get('purge_css') else None,
+        'safelist': config['CSS_SAFELIST'], 'patterns': config['CSS_SAFELIST_PATTERNS']})}
+    if options.get('add_sri') or critical:
+        # Critical CSS is extracted against the final stylesheets, so it depends on the CSS stage too.
+        keys['html'] = AssetCache.make_key(content, 'html', None, {
+            'sri': bool(options.get('add_sri')), 'css': keys['css'] if critical else None,
+            'viewports': [list(v) for v in config['CRITICAL_VIEWPORTS']] if critical else None})
+    return keys
+
+def _options_key(options, critical):
+    versions = {tool: _tool_version(tool) for tools, _ in CACHED_TOOLS.values() for tool in tools}
+    versions['revisions'] = OUTPUT_REVISIONS
+    options = {k: v for k, v in options.items() if k != 'file_timeouts'}  # scheduling only, never the output
+    return AssetCache.make_key(None, 'frontend', versions, dict(options, critical=bool(critical)))
+
+def do_frontend_optimization(unpacked_path, processed_path, options, sid, max_workers=None, files=None,
+                             archive=None, defer_exts=(), manifest=None, run=None, critical=False):
+    """
+    `files` is a sized iterable of paths relative to `unpacked_path` (e.g. an
+    ingest.ArchiveExtractor still writing them); by default every file in `manifest`.
+    The manifest (scanned from `unpacked_path` if not given) gets each output's size.
+    Each output is appended to `archive` as soon as it is final, except files with
+    an extension in `defer_exts`, which the caller archives after its own stages.
+    `run` (an incremental.IncrementalRun) reuses what is unchanged since the user's
+    previous run, including project-wide stages; `critical` says whether the caller
+    inlines critical CSS afterwards, which the HTML stage key has to cover.
+    """
+    send_status(sid, "Optimizing assets...")
+    if max_workers is None:
+        max_workers = current_app.config.get('OPTIMIZER_MAX_WORKERS') or 1
+    if files is None:
+        manifest = manifest or ProjectManifest.scan(unpacked_path)
+        files = manifest.paths()
+
+    config = current_app.config
+    options = dict(options, image_max_pixels=config['IMAGE_MAX_PIXELS'],
+                   csp_policy=_csp_policy(options, config['CSP_DEFAULT_POLICY']), referrer_policy=config['REFERRER_POLICY'])
+    cache = AssetCache(os.path.join(current_app.config['CACHE_FOLDER'], 'assets'),
+                       current_app.config['ASSET_CACHE_MAX_BYTES'])
+    deferred = {'css'} | set(defer_exts)  # CSS only becomes final after purge/minify below
+    if options.get('add_sri'):
+        deferred |= {'html', 'htm'}  # pages get script hashes once every JS output is final
+
+    def archive_output(rel_path, out_path):
+        if archive is not None and _file_ext(rel_path) not in deferred:
+            _archive_file(archive, out_path, rel_path)
+
+    if run is not None:
+        run.options_key = _options_key(options, critical)
+    with metrics.traced('stage', 'optimize-files'):
+        reports = _run_file_jobs(files, unpacked_path, processed_path, options, sid, max_workers, cache, archive_output,
+                                 manifest, run)
+    manifest = manifest or ProjectManifest.scan(unpacked_path)
+    if cache.hits or cache.misses:
+        send_status(sid, f"Asset cache: {cache.hits} hit(s), {cache.misses} miss(es).")
+    if run is not None:
+        _reuse_stages(run, unpacked_path, processed_path, options, sid, max_workers, cache, manifest, reports, critical)
+
+    # CSS is a barrier stage: purging needs every HTML/JS output to be final.
+    if 'css' in getattr(run, 'reused_stages', ()):
+        send_status(sid, "Stylesheets and the pages they are purged against are unchanged; reused the previous CSS.")
+    else:
+        send_status(sid, "Purging unused CSS and minifying..." if options.get('purge_css') else "Minifying all CSS...")
+        with metrics.traced('stage', 'css') as span:
+            span.bytes_in = sum(r['original_size'] for r in reports if _file_ext(r['path']) == 'css')
+            _optimize_css(processed_path, manifest, reports, sid, options.get('purge_css'), max_workers)
+    if options.get('add_sri') and 'html' not in getattr(run, 'reused_stages', ()):
+        with metrics.traced('stage', 'sri') as span:
+            span.bytes_in = sum(r['new_size'] for r in reports if _file_ext(r['path']) in ('html', 'htm'))
+            _add_sri(processed_path, reports, sid)
+    if archive is not None:
+        archive_outputs(archive, processed_path, reports, deferred - set(defer_exts))
+    for report in reports:
+        out_path = os.path.join(processed_path, report['path'])
+        siblings = [suffix for _, suffix in IMAGE_SIBLING_FORMATS.values()
+                    if _file_ext(report['path']) in IMAGE_EXTS and os.path.exists(out_path + suffix)]
+        manifest.update(report['path'], output_size=report.get('new_size'), outputs=siblings)
             
     send_status(sid, "File processing complete.", 'success')
-    return list(reports_dict.values())
+    return reports
 
-def do_backend_analysis(unpacked_path, sid):
-    if not any(f.endswith('.py') for r, _, fs in os.walk(unpacked_path) for f in fs):
+def _reuse_stages(run, unpacked_path, processed_path, options, sid, max_workers, cache, manifest, reports, critical):
+    """
+    Decides which project-wide stages an incremental run can skip. Files a stage rewrites
+    were restored with their final output; where the stage has to run again, the
+    unchanged ones among them go back through the per-file pass first.
+    """
+    for name, key in _stage_keys(manifest, unpacked_path, options, critical).items():
+        covered = [r for r in reports if _file_ext(r['path']) in STAGE_EXTS[name]]
+        if run.reuse_stage(name, key, covered):
+            continue
+        stale = [r['path'] for r in covered if r.get('incremental') == 'reused']
+        if not stale:
+            continue
+        send_status(sid, f"Project-wide {name.upper()} inputs changed; reprocessing {len(stale)} unchanged file(s).")
+        redone = {r['path']: r for r in _run_file_jobs(stale, unpacked_path, processed_path, options, sid,
+                                                       max_workers, cache, None, manifest)}
+        for report in covered:
+            if report['path'] in redone:
+                report.update(redone[report['path']], incremental='reprocessed')
+    reused = sum(r.get('incremental') == 'reused' for r in reports)
+    send_status(sid, f"Incremental run: {reused} file(s) reused from the previous run, {len(reports) - reused} reprocessed.")
+
+def do_backend_analysis(unpacked_path, sid, manifest=None, timeout_seconds=120):
+    config = current_app.config
+    manifest = manifest or ProjectManifest.scan(unpacked_path)
+    py_files = manifest.paths({'py'}, config['SCAN_SKIP_DIRS'])
+    if not py_files:
         send_status(sid, "This tool currently only supports Python projects for backend analysis.", 'error')
         return
 
-    send_status(sid, "Python project detected. Running linters...")
-    tools = {'Flake8 (Code Style)': ['flake8', '.'], 'Vulture (Dead Code)': ['vulture', '.']}
-    for name, cmd in tools.items():
-        try:
-            send_status(sid, f"----- Running {name} -----", 'info')
-            result = _run_command(cmd, cwd=unpacked_path, timeout_seconds=120, check_exit_code=False)
-            if result.stdout:
-                for line in result.stdout.splitlines():
-                    send_status(sid, line.strip(), 'warning')
-            elif result.returncode != 0:
-                raise Exception(result.stderr or f"{name} failed with exit code {result.returncode}")
-            else:
-                send_status(sid, f"{name} found no issues.", 'success')
-        except subprocess.TimeoutExpired:
-            send_status(sid, f"{name} analysis timed out.", 'error')
-        except Exception as e:
-            send_status(sid, f"Failed to run {name}. Is it installed? Error: {e}", 'error')
+    send_status(sid, f"Python project detected. Running {len(ANALYZERS)} linters on {len(py_files)} files...")
+    cache = AssetCache(os.path.join(config['CACHE_FOLDER'], 'analysis'), config['ANALYSIS_CACHE_MAX_BYTES'])
+    flush_status(sid)
+    with metrics.traced('stage', 'analysis') as span:
+        span.bytes_in = sum(manifest.get(p)['size'] or 0 for p in py_files)
+        results = run_analyzers(unpacked_path, py_files, cache, jobs=config['ANALYSIS_JOBS'], timeout_seconds=timeout_seconds,
+                                digests={p: manifest.digest(p) for p in py_files})
+    for name, result in results.items():
+        title = ANALYZERS[name].title
+        send_status(sid, f"----- {title} -----", 'info')
+        if isinstance(result, subprocess.TimeoutExpired):
+            send_status(sid, f"{title} analysis timed out.", 'error')
+        elif isinstance(result, Exception):
+            send_status(sid, f"Failed to run {title}. Is it installed? Error: {result}", 'error')
+        else:
+            issues, reused = result
+            if reused:
+                send_status(sid, f"Reused cached results for {reused} of {len(py_files)} files.", 'info')
+            for start in range(0, len(issues), FINDINGS_BATCH):
+                emit('lint_issues', {'tool': name, 'issues': [i._asdict() for i in issues[start:start + FINDINGS_BATCH]]}, room=sid)
+            if not issues:
+                send_status(sid, f"{title} found no issues.", 'success')
 
-def do_security_scan(unpacked_path, sid, plan):
-    findings = 0
+def _resolved_packages(path, digest, cache, parse, source_digest=None):
+    """
+    Parses a lockfile once per distinct content; later scans read the resolved list from `cache`.
+    Returns (packages, unpinned lines, content key). Files a requirements file included must
+    still have the digest `source_digest(rel_path)` gave them, and are part of the key.
+    """
+    key = AssetCache.make_key(digest, 'resolved', 3)
+    resolved = cache.get_value(key)
+    if resolved is not None and any(source_digest(p) != d for p, d in resolved['included'].items()):
+        resolved = None
+    if resolved is None:
+        parsed = parse(path)
+        packages, unpinned, included = parsed if isinstance(parsed, tuple) else (parsed, [], [])
+        resolved = {'packages': [list(p) for p in packages], 'unpinned': unpinned,
+                    'included': {p: source_digest(p) for p in included}}
+        cache.put_value(key, resolved)
+    content_key = AssetCache.make_key(digest, 'sources', None, resolved['included']) if resolved['included'] else digest
+    return [Package(*p) for p in resolved['packages']], resolved['unpinned'], content_key
+
+def _cached_audit(cache, digest, source, version, audit):
+    """Runs `audit()` unless results for this exact lockfile and advisory source are cached."""
+    key = AssetCache.make_key(digest, source, version)
+    cached = cache.get_value(key)
+    if cached is not None:
+        return [Vulnerability(*v) for v in cached], True
+    vulns = audit()
+    cache.put_value(key, [list(v) for v in vulns])
+    return vulns, False
+
+def _pip_audit(req_path, cwd):
+    toolchain.require('pip-audit')
     pip_cache_dir = os.path.join(current_app.config['CACHE_FOLDER'], 'pip')
-    
-    if os.path.exists(os.path.join(unpacked_path, 'requirements.txt')):
+    cmd = ['pip-audit', '-r', req_path, '-f', 'json', '--progress-spinner', 'off', '--cache-dir', pip_cache_dir]
+    result = _run_command(cmd, cwd=cwd, timeout_seconds=180, check_exit_code=False)
+    if result.returncode not in (0, 1) or not result.stdout.strip():
+        raise Exception(result.stderr or f"pip-audit failed with exit code {result.returncode}")
+    data = json.loads(result.stdout)
+    return [Vulnerability('PyPI', dep['name'], dep.get('version', ''), vuln['id'], 'unknown',
+                          (vuln.get('description') or '').split('\n', 1)[0][:200], vuln.get('fix_versions', []))
+            for dep in (data['dependencies'] if isinstance(data, dict) else data) for vuln in dep.get('vulns', [])]
+
+def _npm_audit(lock_dir, packages):
+    # --package-lock-only audits the resolved tree in the lockfile; no `npm install` needed.
+    toolchain.require('npm')
+    result = _run_command(['npm', 'audit', '--package-lock-only', '--json'], cwd=lock_dir, timeout_seconds=120, check_exit_code=False)
+    if not result.stdout:
+        raise Exception(result.stderr or "npm audit failed without providing a reason.")
+    data = json.loads(result.stdout)
+    if 'error' in data:
+        raise Exception(data['error'].get('summary') or "npm audit failed.")
+    versions = {p.name: p.version for p in packages}
+    vulns = []
+    for name, details in data.get('vulnerabilities', {}).items():
+        fix = details.get('fixAvailable')
+        fixed = [fix['version']] if isinstance(fix, dict) and fix.get('version') else []
+        advisories = [via for via in details.get('via', []) if isinstance(via, dict)]
+        for via in advisories or [{'title': f"Vulnerable through {', '.join(map(str, details.get('via', [])))}"}]:
+            vulns.append(Vulnerability('npm', name, versions.get(name, details.get('range', '')),
+                                       str(via.get('url') or via.get('source') or 'transitive'),
+                                       via.get('severity', details.get('severity', 'unknown')), via.get('title', ''), fixed))
+    return vulns
+
+def _report_vulnerabilities(sid, vulns, ecosystem_label):
+    for start in range(0, len(vulns), FINDINGS_BATCH):
+        emit('dependency_findings', {'vulnerabilities': [v._asdict() for v in vulns[start:start + FINDINGS_BATCH]]}, room=sid)
+    if not vulns:
+        send_status(sid, f"No known vulnerabilities found in {ecosystem_label} dependencies.", 'success')
+    return len(vulns)
+
+def do_security_scan(unpacked_path, sid, plan, manifest=None, workers=None):
+    findings = 0
+    config = current_app.config
+    manifest = manifest or ProjectManifest.scan(unpacked_path)
+    index = AdvisoryIndex(config['ADVISORY_INDEX_PATH'])
+    if config['ADVISORY_DUMP']:
+        try:
+            index.refresh(config['ADVISORY_DUMP'])
+        except (OSError, ValueError) as e:
+            send_status(sid, f"Could not refresh the advisory index: {e}", 'warning')
+    use_index = has_advisories(config['ADVISORY_INDEX_PATH'])
+    audit_cache = AssetCache(os.path.join(config['CACHE_FOLDER'], 'audit'), config['ANALYSIS_CACHE_MAX_BYTES'])
+    today = time.strftime('%Y-%m-%d') # online audit results are reused for a day at most
+
+    req_path = os.path.join(unpacked_path, 'requirements.txt')
+    if 'requirements.txt' in manifest:
         send_status(sid, "--- Scanning Python Dependencies ---", 'info')
         try:
-            req_path = os.path.join(unpacked_path, 'requirements.txt')
-            send_status(sid, "Auditing requirements.txt with pip-audit...")
-            cmd = ['pip-audit', '-r', req_path, '--cache-dir', pip_cache_dir]
-            result = _run_command(cmd, cwd=unpacked_path, timeout_seconds=180, check_exit_code=False)
-
-            if "vulnerabilities found" in result.stdout:
-                for line in result.stdout.splitlines():
-                    if line.strip(): send_status(sid, line.strip(), 'error'); findings += 1
-            elif result.returncode != 0:
-                 raise Exception(result.stderr or f"pip-audit failed with exit code {result.returncode}")
+            packages, unpinned, digest = _resolved_packages(
+                req_path, manifest.digest('requirements.txt', unpacked_path), audit_cache,
+                functools.partial(parse_requirements, root=unpacked_path), lambda p: manifest.digest(p, unpacked_path))
+            includes = [line for line in unpinned if line.startswith('-')]
+            if includes:
+                send_status(sid, f"Includes outside the project or missing from it are not audited offline: {', '.join(includes)}", 'warning')
+            if use_index and not unpinned:
+                send_status(sid, f"Auditing {len(packages)} pinned packages against the offline advisory index...")
+                vulns, reused = _cached_audit(audit_cache, digest, 'osv-index', index.generation, lambda: index.audit(packages))
             else:
-                send_status(sid, "No known vulnerabilities found in Python dependencies.", 'success')
+                send_status(sid, "Auditing requirements.txt with pip-audit...")
+                vulns, reused = _cached_audit(audit_cache, digest, 'pip-audit', today, lambda: _pip_audit(req_path, unpacked_path))
+            if reused:
+                send_status(sid, "Reused audit results for an identical requirements.txt.", 'info')
+            findings += _report_vulnerabilities(sid, vulns, 'Python')
         except subprocess.TimeoutExpired:
             send_status(sid, "Python dependency scan timed out.", 'error')
         except Exception as e:
-            send_status(sid, f"Failed to run pip-audit: {e}", 'error')
+            send_status(sid, f"Failed to audit Python dependencies: {e}", 'error')
 
-    if plan in ['premium', 'pro'] and os.path.exists(os.path.join(unpacked_path, 'package-lock.json')):
+    lock_path = os.path.join(unpacked_path, 'package-lock.json')
+    if plan in ['premium', 'pro'] and 'package-lock.json' in manifest:
         send_status(sid, "--- Scanning Node.js Dependencies (Premium) ---", 'info')
         try:
-            send_status(sid, "Running 'npm install' to prepare for audit (max 5 mins)...")
-            _run_command(['npm', 'install'], cwd=unpacked_path, timeout_seconds=300)
-            send_status(sid, "Auditing with 'npm audit' (max 2 mins)...")
-            result = _run_command(['npm', 'audit', '--json'], cwd=unpacked_path, timeout_seconds=120, check_exit_code=False)
-            
-            if result.stdout:
-                audit_data = json.loads(result.stdout)
-                vulnerabilities = audit_data.get('vulnerabilities', {})
-                if vulnerabilities:
-                    for name, details in vulnerabilities.items():
-                        send_status(sid, f"VULNERABILITY: {name} ({details['severity']}) in {details.get('via', ['N/A'])[0]}", 'error'); findings += 1
-                else:
-                    send_status(sid, "No known vulnerabilities found in Node.js dependencies.", 'success')
-            elif result.returncode != 0:
-                raise Exception(result.stderr or "npm audit failed without providing a reason.")
+            packages, _, digest = _resolved_packages(lock_path, manifest.digest('package-lock.json', unpacked_path),
+                                                     audit_cache, parse_package_lock)
+            if use_index:
+                send_status(sid, f"Auditing {len(packages)} locked packages against the offline advisory index...")
+                vulns, reused = _cached_audit(audit_cache, digest, 'osv-index', index.generation, lambda: index.audit(packages))
             else:
-                send_status(sid, "No known vulnerabilities found in Node.js dependencies.", 'success')
+                send_status(sid, "Auditing package-lock.json with 'npm audit' (max 2 mins)...")
+                vulns, reused = _cached_audit(audit_cache, digest, 'npm-audit', today, lambda: _npm_audit(unpacked_path, packages))
+            if reused:
+                send_status(sid, "Reused audit results for an identical package-lock.json.", 'info')
+            findings += _report_vulnerabilities(sid, vulns, 'Node.js')
         except subprocess.TimeoutExpired:
-            send_status(sid, "Node.js dependency installation (npm install) timed out.", 'error')
+            send_status(sid, "Node.js dependency audit timed out.", 'error')
         except Exception as e:
             send_status(sid, f"Failed to run npm audit: {e}", 'error')
 
     send_status(sid, "--- Scanning Source Code for Secrets & Debug Flags ---", 'info')
-    secret_pattern = re.compile(r'(API_KEY|SECRET|PASSWORD|TOKEN)\s*[:=]\s*["\']([A-Za-z0-9_\\-]{16,})["\']', re.IGNORECASE)
-    secrets_found, debug_found = 0, 0
-    for root, _, files in os.walk(unpacked_path):
-        for filename in files:
-            if filename.endswith(('.py', '.js', '.json', '.env', '.yml', '.yaml', '.conf', '.cfg', '.ini')):
-                try:
-                    rel_file_path = os.path.relpath(os.path.join(root, filename), unpacked_path)
-                    with open(os.path.join(root, filename), 'r', encoding='utf-8', errors='ignore') as f:
-                        for i, line in enumerate(f, 1):
-                            if "DEBUG" in line.upper() and "TRUE" in line.upper().replace(" ", ""):
-                                send_status(sid, f"HIGH RISK: Potential debug mode in '{rel_file_path}' on line {i}.", 'error'); findings += 1; debug_found += 1
-                            if secret_pattern.search(line):
-                                send_status(sid, f"HIGH RISK: Potential hardcoded secret in '{rel_file_path}' on line {i}.", 'error'); findings += 1; secrets_found += 1
-                except Exception:
-                    pass
-    if secrets_found == 0:
+    entries, scanned = [(p, manifest.get(p)['size']) for p in manifest], {}
+    with metrics.traced('stage', 'source-scan') as span:
+        source_findings = scan_directory(unpacked_path, workers=workers or config['SCAN_WORKERS'],
+                                         skip_dirs=config['SCAN_SKIP_DIRS'], max_file_bytes=config['SCAN_MAX_FILE_BYTES'],
+                                         entries=entries, stats=scanned)
+        span.bytes_in = scanned['bytes']
+    for start in range(0, len(source_findings), FINDINGS_BATCH):
+        emit('security_findings', {'findings': [f._asdict() for f in source_findings[start:start + FINDINGS_BATCH]]}, room=sid)
+    findings += len(source_findings)
+    kinds = {rule.id: rule.kind for rule in SCAN_RULES}
+    found_kinds = {kinds[f.rule_id] for f in source_findings}
+    if 'secret' not in found_kinds:
         send_status(sid, "No obvious hardcoded secrets found.", 'success')
-    if debug_found == 0:
+    if 'debug' not in found_kinds:
         send_status(sid, "No obvious debug flags found enabled.", 'success')
 
     if findings == 0:
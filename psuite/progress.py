@@ -0,0 +1,61 @@
+# psuite/progress.py
+import time
+import threading
+
+
+class ProgressChannel:
+    """
+    Buffers the status lines for one room and sends them, in order, as a single
+    'status_batch' event once `max_batch` lines are waiting or the oldest has waited
+    `max_delay` seconds; batches never go out more often than every `min_interval`
+    seconds. Structured progress (files done/total, bytes saved...) is coalesced, so
+    only the latest values ride along with the next batch. Any thread may queue lines,
+    but only the thread that created the channel sends them: emitting may need its
+    application context (job workers record events in the database).
+    """
+
+    def __init__(self, room, emit, max_batch=100, max_delay=0.25, min_interval=0.05):
+        self.room = room
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.min_interval = min_interval
+        self._emit = emit
+        self._messages = []
+        self._progress = {}
+        self._pending_since = None
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+        self.owner = threading.get_ident()
+
+    def status(self, message, status_type='info'):
+        with self._lock:
+            self._messages.append({'message': message, 'type': status_type})
+            self._pending_since = self._pending_since or time.monotonic()
+        self._maybe_flush()
+
+    def progress(self, **values):
+        with self._lock:
+            self._progress.update(values)
+            self._pending_since = self._pending_since or time.monotonic()
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if threading.get_ident() != self.owner:
+            return
+        now = time.monotonic()
+        # The rate limit gives way only when a burst has piled up far past one batch.
+        if now - self._last_flush < self.min_interval and len(self._messages) < self.max_batch * 10:
+            return
+        if len(self._messages) >= self.max_batch or now - (self._pending_since or now) >= self.max_delay:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._messages and not self._progress:
+                return
+            payload = {'messages': self._messages}
+            if self._progress:
+                payload['progress'] = self._progress
+            self._messages, self._progress, self._pending_since = [], {}, None
+            self._last_flush = time.monotonic()
+        self._emit('status_batch', payload, room=self.room)
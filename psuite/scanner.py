@@ -0,0 +1,228 @@
+# psuite/scanner.py
+import os
+import re
+import math
+import mmap
+import functools
+import multiprocessing
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+# A rule is one regex plus an optional `validate(match_bytes) -> bool` post-filter.
+# `keywords` are lowercase literals, at least one of which appears on every line the
+# rule can match; rules without keywords are run over the whole file.
+# `kind` groups rules for the scan summary ('secret' or 'debug'). `skip_files` are file
+# names the rule is not applied to.
+Rule = namedtuple('Rule', 'id kind severity message keywords pattern validate skip_files', defaults=(None, ()))
+Finding = namedtuple('Finding', 'rule_id file line severity message')
+
+SCAN_EXTS = ('.py', '.js', '.ts', '.json', '.env', '.yml', '.yaml', '.conf', '.cfg', '.ini',
+             '.toml', '.properties', '.sh', '.pem', '.key')
+BINARY_SNIFF_BYTES = 8192
+CHUNK_BYTES = 16 * 1024 * 1024
+SMALL_SCAN_BYTES = 4 * 1024 * 1024  # below this a worker pool costs more than it saves
+BATCH_BYTES = 8 * 1024 * 1024
+
+
+def _shannon_entropy(data):
+    counts = Counter(data)
+    return -sum(n / len(data) * math.log2(n / len(data)) for n in counts.values())
+
+# Generated dependency lockfiles are full of integrity hashes and resolved URLs.
+LOCKFILES = ('package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock', 'pnpm-lock.yaml', 'poetry.lock', 'Pipfile.lock')
+SRI_HASH = re.compile(rb'sha(?:256|384|512)-')
+
+def _high_entropy(token):
+    token = token.strip(b'"\'')
+    if SRI_HASH.match(token):  # a subresource-integrity digest, public by design
+        return False
+    threshold = 3.0 if re.fullmatch(rb'[0-9a-fA-F]+', token) else 4.2
+    return _shannon_entropy(token) >= threshold
+
+# Specific formats come first: at any position the first alternative that matches wins.
+RULES = [
+    Rule('private-key', 'secret', 'high', "Private key", (b'private key',),
+         rb'-----BEGIN (?:RSA |EC |DSA |OPENSSH |PGP |ENCRYPTED )?PRIVATE KEY(?: BLOCK)?-----'),
+    Rule('aws-access-key', 'secret', 'high', "AWS access key ID", (b'akia', b'asia'),
+         rb'\b(?:AKIA|ASIA)[0-9A-Z]{16}\b'),
+    Rule('github-token', 'secret', 'high', "GitHub token", (b'ghp_', b'gho_', b'ghu_', b'ghs_', b'ghr_'),
+         rb'\bgh[pousr]_[A-Za-z0-9]{36,}\b'),
+    Rule('slack-token', 'secret', 'high', "Slack token", (b'xox',), rb'\bxox[abposr]-[A-Za-z0-9-]{10,}'),
+    Rule('google-api-key', 'secret', 'high', "Google API key", (b'aiza',), rb'\bAIza[0-9A-Za-z_\-]{35}'),
+    Rule('stripe-secret-key', 'secret', 'high', "Stripe secret key", (b'k_live_',), rb'\b[rs]k_live_[0-9A-Za-z]{24,}'),
+    Rule('hardcoded-secret', 'secret', 'high', "Potential hardcoded secret", (b'api_key', b'secret', b'password', b'token'),
+         rb'(?i:(?:API_KEY|SECRET|PASSWORD|TOKEN)\s*[:=]\s*["\'][A-Za-z0-9_\\-]{16,}["\'])'),
+    Rule('debug-enabled', 'debug', 'high', "Potential debug mode", (b'debug',),
+         rb'(?i:debug[\w.\[\]\'"]*\s*[:=]\s*["\']?true\b)'),
+    Rule('high-entropy-string', 'secret', 'medium', "High-entropy string (possible secret)", (),
+         rb'["\'][A-Za-z0-9+/=_\-]{32,}["\']', _high_entropy, LOCKFILES),
+]
+
+
+def _combine(rules):
+    return re.compile(b'|'.join(b'(?P<r%d>%s)' % (i, rule.pattern) for i, rule in enumerate(rules))) if rules else None
+
+
+class Matcher:
+    """
+    Runs every rule in one sweep per chunk. A keyword pass over the lowercased chunk
+    picks the candidate lines, and one combined regex of all keyed rules runs only on
+    those; rules without keywords share a second combined regex over the whole chunk.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.keywords = sorted({kw for rule in self.rules for kw in rule.keywords})
+        self.keyed = [i for i, rule in enumerate(self.rules) if rule.keywords]
+        self.unkeyed = [i for i, rule in enumerate(self.rules) if not rule.keywords]
+        self.keyed_regex = _combine([self.rules[i] for i in self.keyed])
+        self.unkeyed_regex = _combine([self.rules[i] for i in self.unkeyed])
+
+    def _candidate_lines(self, chunk):
+        lowered, spans = chunk.lower(), {}
+        for kw in self.keywords:
+            pos = lowered.find(kw)
+            while pos != -1:
+                start = lowered.rfind(b'\n', 0, pos) + 1
+                end = lowered.find(b'\n', pos)
+                end = len(lowered) if end == -1 else end
+                spans[start] = end
+                pos = lowered.find(kw, end)
+        return sorted(spans.items())
+
+    def _matches(self, chunk):
+        """Yields (match, rule) for every raw match in the chunk; validation happens later."""
+        if self.keyed_regex is not None:
+            for start, end in self._candidate_lines(chunk):
+                for match in self.keyed_regex.finditer(chunk, start, end):
+                    yield match, self.rules[self.keyed[int(match.lastgroup[1:])]]
+        if self.unkeyed_regex is not None:
+            for match in self.unkeyed_regex.finditer(chunk):
+                yield match, self.rules[self.unkeyed[int(match.lastgroup[1:])]]
+
+    def scan_chunk(self, chunk, rel_path, first_line=1):
+        hits, name = {}, os.path.basename(rel_path)
+        for match, rule in self._matches(chunk):
+            if name in rule.skip_files:
+                continue
+            if rule.validate is None or rule.validate(match.group()):
+                hits.setdefault(match.start(), rule)
+        findings, line, pos, seen_lines = [], first_line, 0, set()
+        for start in sorted(hits):
+            rule = hits[start]
+            line += chunk.count(b'\n', pos, start)
+            pos = start
+            # A keyword-less rule adds nothing on a line a specific rule already reported.
+            if rule.keywords or line not in seen_lines:
+                seen_lines.add(line)
+                findings.append(Finding(rule.id, rel_path, line, rule.severity, rule.message))
+        return findings
+
+    def scan(self, buf, rel_path):
+        """Scans a bytes-like buffer (e.g. an mmap) in line-aligned chunks of CHUNK_BYTES."""
+        findings, offset, line, size = [], 0, 1, len(buf)
+        while offset < size:
+            end = buf.find(b'\n', min(offset + CHUNK_BYTES, size) - 1)
+            end = size if end == -1 else end + 1
+            chunk = buf[offset:end]
+            findings.extend(self.scan_chunk(chunk, rel_path, line))
+            line += chunk.count(b'\n')
+            offset = end
+        return findings
+
+
+def _is_binary(buf):
+    return b'\0' in buf[:BINARY_SNIFF_BYTES]
+
+def scan_file(matcher, path, rel_path):
+    """Scans one file through a read-only mmap. Binary and empty files yield nothing."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            if _is_binary(buf):
+                return []
+            return matcher.scan(buf, rel_path)
+
+
+_worker_matcher = None
+
+def _init_worker(rules):
+    global _worker_matcher
+    _worker_matcher = Matcher(rules)
+
+def _scan_batch(batch):
+    findings = []
+    for path, rel_path in batch:
+        try:
+            findings.extend(scan_file(_worker_matcher, path, rel_path))
+        except (OSError, ValueError):
+            pass
+    return findings
+
+
+def _walk(directory, skip_dirs):
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if d not in skip_dirs)
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            try:
+                yield os.path.relpath(path, directory).replace(os.sep, '/'), os.path.getsize(path)
+            except OSError:
+                continue
+
+def collect_files(directory, skip_dirs=(), max_file_bytes=None, exts=SCAN_EXTS, entries=None):
+    """
+    Returns [(path, rel_path, size)] for the files worth scanning, vendored trees excluded.
+    `entries` are (rel_path, size) pairs, e.g. from a project manifest, that spare the walk.
+    """
+    skip_dirs, files = set(skip_dirs), []
+    for rel_path, size in (_walk(directory, skip_dirs) if entries is None else entries):
+        parts = rel_path.split('/')
+        if not parts[-1].endswith(exts) or parts[-1].endswith(('.min.js', '.bundle.js')):
+            continue
+        if skip_dirs.intersection(parts[:-1]):
+            continue
+        if max_file_bytes is None or size <= max_file_bytes:
+            files.append((os.path.join(directory, *parts), rel_path, size))
+    return files
+
+def _batches(files):
+    batch, batch_bytes = [], 0
+    for path, rel_path, size in files:
+        batch.append((path, rel_path))
+        batch_bytes += size
+        if batch_bytes >= BATCH_BYTES or len(batch) >= 256:
+            yield batch
+            batch, batch_bytes = [], 0
+    if batch:
+        yield batch
+
+@functools.lru_cache(maxsize=1)
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+def scan_directory(directory, rules=None, workers=None, skip_dirs=(), max_file_bytes=None, entries=None, stats=None):
+    """
+    Runs every rule over the text files under `directory` and returns the findings
+    sorted by file and line. Large trees are split into batches across a process pool.
+    A `stats` dict gets the number of 'files' and 'bytes' scanned.
+    """
+    rules = list(RULES if rules is None else rules)
+    files = collect_files(directory, skip_dirs, max_file_bytes, entries=entries)
+    total = sum(size for _, _, size in files)
+    if stats is not None:
+        stats.update(files=len(files), bytes=total)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or total < SMALL_SCAN_BYTES:
+        _init_worker(rules)
+        findings = _scan_batch([(path, rel_path) for path, rel_path, _ in files])
+    else:
+        findings = []
+        files.sort(key=lambda f: f[2], reverse=True)  # largest batches first, so none is left running alone at the end
+        with ProcessPoolExecutor(workers, mp_context=_mp_context(), initializer=_init_worker,
+                                 initargs=(rules,)) as pool:
+            for batch_findings in pool.map(_scan_batch, _batches(files)):
+                findings.extend(batch_findings)
+    return sorted(findings, key=lambda f: (f.file, f.line))
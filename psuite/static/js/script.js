@@ -8,7 +8,7 @@ class UIUpdater {
         this.postRunActions = document.getElementById('post-run-actions');
     }
 
-    addConsoleLine(message, type = 'info', isHTML = false) {
+    addConsoleLine(message, type = 'info', isHTML = false, scroll = true) {
         if (!this.consoleOutput) return;
         const line = document.createElement('div');
         line.className = `console-line status-${type}`;
@@ -33,6 +33,12 @@ class UIUpdater {
         }
 
         this.consoleOutput.appendChild(line);
+        if (scroll) this.consoleOutput.scrollTop = this.consoleOutput.scrollHeight;
+    }
+
+    addConsoleLines(messages) {
+        if (!this.consoleOutput || !messages.length) return;
+        messages.forEach(m => this.addConsoleLine(m.message, m.type, m.is_html, false));
         this.consoleOutput.scrollTop = this.consoleOutput.scrollHeight;
     }
 
@@ -42,6 +48,8 @@ class UIUpdater {
         if (this.resultsSection) this.resultsSection.style.display = 'none';
         if (this.postRunActions) this.postRunActions.style.display = 'none';
         if (this.consoleOutput) this.consoleOutput.innerHTML = '';
+        const progressDisplay = document.getElementById('console-progress');
+        if (progressDisplay) progressDisplay.textContent = '';
     }
 
     showResults(data) {
@@ -81,6 +89,25 @@ class UIUpdater {
         if (this.postRunActions) this.postRunActions.style.display = 'none';
     }
 
+    updateProgress(progress) {
+        const progressDisplay = document.getElementById('console-progress');
+        if (!progressDisplay) return;
+        if (progress.pages_total !== undefined) {
+            progressDisplay.textContent = `${progress.pages_done}/${progress.pages_total} pages`;
+            return;
+        }
+        if (progress.files_total === undefined) return;
+        const saved = progress.bytes_saved ? ` \u00b7 ${(progress.bytes_saved / 1024).toFixed(1)} KB saved` : '';
+        progressDisplay.textContent = `${progress.files_done}/${progress.files_total} files${saved}`;
+    }
+
+    formatRunSummary(summary) {
+        const slowest = Object.entries(summary.tools || {})
+            .sort((a, b) => b[1].wall_seconds - a[1].wall_seconds).slice(0, 3)
+            .map(([name, t]) => `${name} ${t.wall_seconds.toFixed(2)}s/${t.calls}`);
+        return `Run took ${summary.wall_seconds.toFixed(2)}s` + (slowest.length ? ` (slowest tools: ${slowest.join(', ')})` : '');
+    }
+
     updateCredits(credits) {
         const creditsDisplay = document.querySelector('.credits-display');
         if (creditsDisplay) {
@@ -150,6 +177,9 @@ class ToolHandler {
         this.socket = io();
         this.ui = uiUpdater;
         this.socketEventName = socketEventName;
+        // The running job survives page reloads: its id lives in sessionStorage under this key.
+        this.jobKey = `psuite_job_${formId}`;
+        this.job = JSON.parse(sessionStorage.getItem(this.jobKey) || 'null');
         
         this.fileInput = this.form.querySelector('#file-input');
         this.dropZone = this.form.querySelector('#drop-zone');
@@ -163,6 +193,21 @@ class ToolHandler {
         this.setupDragAndDrop();
         this.setupSocketListeners();
         this.setupRestartButton();
+        this.setupCancelButton();
+    }
+
+    saveJob(job) {
+        this.job = job;
+        if (job) sessionStorage.setItem(this.jobKey, JSON.stringify(job));
+        else sessionStorage.removeItem(this.jobKey);
+    }
+
+    // Job events carry an increasing event_id; events replayed after a reconnect may repeat.
+    isNewEvent(data) {
+        if (!data || data.event_id === undefined || !this.job) return true;
+        if (data.event_id <= this.job.last_event_id) return false;
+        this.saveJob({ ...this.job, last_event_id: data.event_id });
+        return true;
     }
 
     handleFiles(files) {
@@ -231,10 +276,13 @@ class ToolHandler {
                             if (element.checked) {
                                 options[element.name] = element.value;
                             }
+                        } else if (element.type === 'text') {
+                            options[element.name] = element.value.trim();
                         }
                     }
                 }
 
+                await this.previewEstimate(result.session_id, options);
                 this.socket.emit(this.socketEventName, { session_id: result.session_id, options });
 
             } catch (error) {
@@ -244,24 +292,110 @@ class ToolHandler {
         });
     }
 
+    async previewEstimate(sessionId, options) {
+        // Best effort: a failed estimate never holds the job back.
+        try {
+            const response = await fetch('/tools/estimate', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ session_id: sessionId, tool: this.socketEventName.replace('run_', ''), options }),
+            });
+            if (!response.ok) return;
+            const est = await response.json();
+            this.ui.addConsoleLine(`Estimated run time ~${Math.round(est.seconds)}s, peak memory ~${est.peak_mb} MB.`, 'info');
+            for (const stage of est.stages) {
+                this.ui.addConsoleLine(`  ${stage.stage}: ~${stage.seconds}s, ~${stage.peak_mb} MB`, 'info');
+            }
+        } catch (error) { /* ignore */ }
+    }
+
     setupSocketListeners() {
-        this.socket.on('status_update', (data) => this.ui.addConsoleLine(data.message, data.type, data.is_html));
+        this.socket.on('connect', () => {
+            if (!this.job) return;
+            this.ui.showProcessing();
+            this.saveJob({ ...this.job, last_event_id: 0 });
+            this.socket.emit('resume_job', { job_id: this.job.job_id, last_event_id: 0 });
+        });
+
+        this.socket.on('job_submitted', (data) => this.saveJob({ job_id: data.job_id, last_event_id: 0 }));
+
+        this.socket.on('job_status', (data) => {
+            if (data.status === 'unknown') {
+                this.saveJob(null);
+                this.ui.resetUI();
+            }
+        });
+
+        this.socket.on('status_update', (data) => {
+            if (this.isNewEvent(data)) this.ui.addConsoleLine(data.message, data.type, data.is_html);
+        });
+        
+        this.socket.on('status_batch', (data) => {
+            if (!this.isNewEvent(data)) return;
+            this.ui.addConsoleLines(data.messages);
+            if (data.progress) this.ui.updateProgress(data.progress);
+        });
+
+        this.socket.on('lint_issues', (data) => {
+            if (!this.isNewEvent(data)) return;
+            this.ui.addConsoleLines(data.issues.map(i => ({
+                message: `${i.file}:${i.line}: ${i.code} ${i.message}`, type: 'warning'
+            })));
+        });
+
+        this.socket.on('dependency_findings', (data) => {
+            if (!this.isNewEvent(data)) return;
+            this.ui.addConsoleLines(data.vulnerabilities.map(v => ({
+                message: `VULNERABILITY: ${v.package} ${v.version} (${v.severity}) ${v.advisory_id}: ${v.summary}` +
+                         (v.fixed.length ? ` [fixed in ${v.fixed.join(', ')}]` : ''),
+                type: 'error'
+            })));
+        });
+
+        this.socket.on('security_findings', (data) => {
+            if (!this.isNewEvent(data)) return;
+            this.ui.addConsoleLines(data.findings.map(f => ({
+                message: `${f.severity.toUpperCase()} RISK: ${f.message} in '${f.file}' on line ${f.line} [${f.rule_id}].`,
+                type: f.severity === 'high' ? 'error' : 'warning'
+            })));
+        });
         
         this.socket.on('processing_error', (data) => {
+            if (!this.isNewEvent(data)) return;
+            this.saveJob(null);
             this.ui.addConsoleLine(`FATAL ERROR: ${data.message}`, 'error');
             this.ui.showFinalConsole();
         });
         
-        this.socket.on('credits_updated', (data) => this.ui.updateCredits(data.credits));
+        this.socket.on('credits_updated', (data) => {
+            if (this.isNewEvent(data)) this.ui.updateCredits(data.credits);
+        });
         
-        this.socket.on('processing_complete', (data) => this.ui.showResults(data));
+        this.socket.on('processing_complete', (data) => {
+            if (!this.isNewEvent(data)) return;
+            this.saveJob(null);
+            if (data.summary) this.ui.addConsoleLine(this.ui.formatRunSummary(data.summary), 'info');
+            this.ui.showResults(data);
+        });
         
         this.socket.on('analysis_complete', (data) => {
+            if (!this.isNewEvent(data)) return;
+            this.saveJob(null);
             this.ui.addConsoleLine(data.message || 'Analysis complete.', 'success');
+            if (data.summary) this.ui.addConsoleLine(this.ui.formatRunSummary(data.summary), 'info');
             this.ui.showFinalConsole();
         });
     }
 
+    setupCancelButton() {
+        const cancelButton = document.getElementById('cancel-job-button');
+        if (cancelButton) {
+            cancelButton.addEventListener('click', () => {
+                if (this.job) this.socket.emit('cancel_job', { job_id: this.job.job_id });
+            });
+        }
+    }
+
     setupRestartButton() {
         const restartButton = document.getElementById('restart-button');
         if (restartButton) {
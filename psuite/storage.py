@@ -0,0 +1,223 @@
+# psuite/storage.py
+import os
+import re
+import errno
+import shutil
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# --- ZERO-COPY FILE PLACEMENT ---
+
+# ioctl(dest, FICLONE, src) shares the source's extents copy-on-write (btrfs, XFS, bcachefs).
+FICLONE = 0x40049409
+# errnos that mean "not possible here", as opposed to a real I/O failure.
+UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL,
+               errno.ENOSYS, errno.EBADF, errno.ENOTSUP}
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _reflink(src, dst):
+    if fcntl is None:
+        raise OSError(errno.ENOTSUP, "reflinks are not supported on this platform")
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+def _copy_range(src, dst):
+    if not hasattr(os, 'copy_file_range'):
+        raise OSError(errno.ENOSYS, "copy_file_range is not available")
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        remaining = os.fstat(s.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(s.fileno(), d.fileno(), remaining)
+            if copied == 0:
+                break
+            remaining -= copied
+
+def clone(src, dst):
+    """
+    Makes `dst` an independent copy of `src` without moving the bytes through user
+    space where possible: a reflink, then an in-kernel copy_file_range, then a plain
+    copy. Returns the method used.
+    """
+    _remove(dst)
+    for method, copy in (('reflink', _reflink), ('copy_file_range', _copy_range)):
+        try:
+            copy(src, dst)
+            return method
+        except OSError as e:
+            _remove(dst)
+            if e.errno not in UNSUPPORTED:
+                raise
+    shutil.copyfile(src, dst)
+    return 'copy'
+
+def passthrough(src, dst):
+    """
+    Puts an unchanged input at `dst` with its metadata, like shutil.copy2: a hardlink
+    when both are on one filesystem, else a clone(). Files placed this way may share
+    their inode with the input, so later stages must replace them, never rewrite them.
+    """
+    _remove(dst)
+    try:
+        os.link(src, dst)
+        return 'link'
+    except OSError as e:
+        if e.errno not in UNSUPPORTED:
+            raise
+    method = clone(src, dst)
+    shutil.copystat(src, dst)
+    return method
+
+
+# --- SESSION USAGE ---
+
+SESSION_ID = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+# Jobs in these states still need their session's files.
+LIVE_STATES = ('queued', 'running', 'cancelling')
+
+def _size(path):
+    if os.path.isdir(path):
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.lstat(os.path.join(root, name)).st_size
+                except OSError:
+                    pass
+        return total
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def session_paths(config, session_id):
+    """Every file or folder a session can own on disk, grouped as the upload or its results."""
+    originals = config['ORIGINALS_FOLDER']
+    return {'upload': [os.path.join(originals, f"{session_id}.zip"),
+                       os.path.join(originals, f"{session_id}.manifest.json")],
+            'result': [os.path.join(config['UNPACKED_FOLDER'], session_id),
+                       os.path.join(config['PROCESSED_FOLDER'], session_id),
+                       os.path.join(config['PROCESSED_FOLDER'], f"optimized_{session_id}.zip")]}
+
+def track(config, session_id, user_id=None, downloaded=False):
+    """Re-measures a session's files and records them as used now. Best effort."""
+    from sqlalchemy.exc import SQLAlchemyError
+    from . import db
+    from .models import SessionStorage
+    paths = session_paths(config, session_id)
+    try:
+        row = db.session.get(SessionStorage, session_id)
+        if row is None:
+            if user_id is None:
+                return
+            row = SessionStorage(session_id=session_id, user_id=user_id)
+            db.session.add(row)
+        row.upload_bytes = sum(_size(p) for p in paths['upload'])
+        # A downloaded result is deleted once it has been sent.
+        row.result_bytes = 0 if downloaded else sum(_size(p) for p in paths['result'])
+        row.last_used_at = datetime.utcnow()
+        if downloaded:
+            row.downloaded_at = row.last_used_at
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+
+def user_usage(user_id):
+    """Bytes on disk held by a user's sessions."""
+    from sqlalchemy import func
+    from . import db
+    from .models import SessionStorage
+    return db.session.query(func.coalesce(func.sum(SessionStorage.upload_bytes + SessionStorage.result_bytes), 0)) \
+        .filter(SessionStorage.user_id == user_id).scalar()
+
+
+# --- JANITOR ---
+
+def _delete(path):
+    freed = _size(path)
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            return 0
+    return freed
+
+def _release(config, row, groups):
+    freed = 0
+    for group in groups:
+        for path in session_paths(config, row.session_id)[group]:
+            freed += _delete(path)
+        setattr(row, f"{group}_bytes", 0)
+    return freed
+
+def _orphans(config, known, older_than):
+    """Session files with no usage row (e.g. from before tracking, or a crashed upload) past the TTL."""
+    for key in ('ORIGINALS_FOLDER', 'UNPACKED_FOLDER', 'PROCESSED_FOLDER'):
+        try:
+            entries = list(os.scandir(config[key]))
+        except OSError:
+            continue
+        for entry in entries:
+            match = SESSION_ID.search(entry.name)
+            try:
+                stale = entry.stat(follow_symlinks=False).st_mtime < older_than
+            except OSError:
+                continue
+            if match and match.group(0) not in known and stale:
+                yield match.group(0), entry.path
+
+def sweep(config, now=None):
+    """
+    One janitor pass over session storage. Sessions with a live job are never touched.
+    Undownloaded results expire after RESULT_TTL and whole sessions after SESSION_TTL
+    without use; then the least recently used sessions go until the total is under
+    STORAGE_QUOTA_BYTES. Returns (sessions evicted, bytes freed).
+    """
+    from . import db
+    from .models import Job, SessionStorage
+    now = now or datetime.utcnow()
+    live = {sid for (sid,) in db.session.query(Job.session_id).filter(Job.status.in_(LIVE_STATES))}
+    rows = SessionStorage.query.order_by(SessionStorage.last_used_at).all()
+    evicted, freed = 0, 0
+    kept = []
+    for row in rows:
+        if row.session_id in live:
+            kept.append(row)
+            continue
+        idle = now - (row.last_used_at or row.created_at or now)
+        if idle > timedelta(seconds=config['SESSION_TTL']):
+            freed += _release(config, row, ('upload', 'result'))
+            db.session.delete(row)
+            evicted += 1
+            continue
+        if row.result_bytes and not row.downloaded_at and idle > timedelta(seconds=config['RESULT_TTL']):
+            freed += _release(config, row, ('result',))
+        kept.append(row)
+
+    total = sum(row.upload_bytes + row.result_bytes for row in kept)
+    for row in kept:  # least recently used first
+        if total <= config['STORAGE_QUOTA_BYTES']:
+            break
+        if row.session_id in live:
+            continue
+        total -= row.upload_bytes + row.result_bytes
+        freed += _release(config, row, ('upload', 'result'))
+        db.session.delete(row)
+        evicted += 1
+    db.session.commit()
+
+    known = {row.session_id for row in rows} | live
+    older_than = (now - datetime(1970, 1, 1)).total_seconds() - config['SESSION_TTL']
+    for _, path in _orphans(config, known, older_than):
+        freed += _delete(path)
+    return evicted, freed
@@ -0,0 +1,43 @@
+# psuite/toolchain.py
+import shutil
+
+# External CLIs the pipelines can shell out to. Each is looked up on PATH once per process
+# (create_app does it at startup), so a missing tool is known before a run instead of being
+# discovered by a failed subprocess in the middle of one.
+TOOLS = ('node', 'npm', 'terser', 'svgo', 'javascript-obfuscator', 'critical', 'pip-audit', 'flake8', 'vulture')
+
+_paths = None
+
+
+class ToolMissing(Exception):
+    """Raised instead of spawning a CLI that is not installed."""
+
+    def __init__(self, tool):
+        super().__init__(f"'{tool}' is not installed (not found on PATH).")
+        self.tool = tool
+
+
+def detect():
+    """(Re)checks every tool in TOOLS. Returns {tool: path or None}."""
+    global _paths
+    _paths = {tool: shutil.which(tool) for tool in TOOLS}
+    return dict(_paths)
+
+def path(tool):
+    """Cached location of `tool`, or None when it is not installed."""
+    if _paths is None:
+        detect()
+    if tool not in _paths:
+        _paths[tool] = shutil.which(tool)
+    return _paths[tool]
+
+def available(tool):
+    return path(tool) is not None
+
+def require(tool):
+    """Raises ToolMissing unless `tool` is installed."""
+    if path(tool) is None:
+        raise ToolMissing(tool)
+
+def missing():
+    return [tool for tool in TOOLS if not available(tool)]
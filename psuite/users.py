@@ -0,0 +1,78 @@
+# psuite/users.py
+import time
+import threading
+from sqlalchemy import or_
+from . import db
+from .models import User
+
+
+class UserSnapshot:
+    """
+    Read-only copy of the User columns requests need, used as `current_user`.
+    It has no session attached, so it is safe to share between requests.
+    """
+    __slots__ = ('id', 'username', 'email', 'credits', 'plan')
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, user):
+        for name in self.__slots__:
+            setattr(self, name, getattr(user, name))
+
+    def get_id(self):
+        return str(self.id)
+
+
+class UserCache:
+    """
+    In-process cache of UserSnapshots for login_manager.user_loader, so HTTP requests
+    and Socket.IO events do not each cost a database round trip. Entries live for
+    `ttl` seconds; anything that changes credits or plan calls invalidate().
+    """
+
+    def __init__(self, ttl=30, max_size=10_000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > now:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        snapshot = UserSnapshot(user)
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                if len(self._entries) >= self.max_size:
+                    self._entries.clear()
+            self._entries[user_id] = (now + self.ttl, snapshot)
+        return snapshot
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries),
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None}
+
+
+user_cache = UserCache()
+
+def find_by_username_or_email(username, email=None):
+    """One indexed query for login and registration checks: users matching either field."""
+    condition = User.username == username
+    if email is not None:
+        condition = or_(condition, User.email == email)
+    return User.query.filter(condition).limit(2).all()
@@ -1,7 +1,13 @@
 # run.py
+import os
 from psuite import create_app, socketio
+from psuite.jobs import start_worker_pool, relay_job_events
 
 app = create_app()
 
 if __name__ == '__main__':
-    socketio.run(app, debug=True)
\ No newline at end of file
+    # debug=True runs this file twice (reloader watcher + serving child); only the child starts workers.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_worker_pool()
+        socketio.start_background_task(relay_job_events, app)
+    socketio.run(app, debug=True)
@@ -0,0 +1,20 @@
+# serve.py
+# Production entry point: no debug reloader, and the job supervisor starts before the first
+# request, pre-forking its workers from a warmed forkserver. run.py remains the dev server.
+import os
+from psuite import create_app, socketio, toolchain
+from psuite.jobs import start_worker_pool, relay_job_events
+
+
+def main():
+    app = create_app()
+    missing = toolchain.missing()
+    if missing:
+        print(f"Tools not found on PATH (the steps using them will fail): {', '.join(missing)}")
+    start_worker_pool()
+    socketio.start_background_task(relay_job_events, app)
+    socketio.run(app, host=os.environ.get('HOST', '0.0.0.0'), port=int(os.environ.get('PORT', 5000)))
+
+
+if __name__ == '__main__':
+    main()
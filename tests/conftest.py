@@ -0,0 +1,21 @@
+# tests/conftest.py
+import pytest
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """An app on a throwaway SQLite database."""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'suite.db'}")
+    from psuite import create_app
+    return create_app()
+
+@pytest.fixture
+def user(app):
+    """Id of a user with 1 credit."""
+    from psuite import db
+    from psuite.models import User
+    with app.app_context():
+        user = User(username='alice', email='alice@example.com', password_hash='x', credits=1)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
@@ -0,0 +1,33 @@
+# tests/test_advisories.py
+from psuite.advisories import Package, parse_requirements
+
+HASHED = """\
+#
+# This file is autogenerated by pip-compile with Python 3.11
+#
+flask==2.0.1 \\
+    --hash=sha256:1c4c257b1892aec1398784c63791cbaa43062f1f7aeb555c4da961b20ee68f55 \\
+    --hash=sha256:a6209ca15eb63fc9385f38e452704113d679511d9574d09b2cf9183ae7d20dc9
+    # via -r requirements.in
+jinja2==3.0.1 ; python_version >= "3.6" \\
+    --hash=sha256:1f06f2da51e7b56b8f238affdd6b4e2c61e39598a378cc49345bc1bd42a978a4
+    # via flask
+"""
+
+
+def test_hashed_requirements_are_pinned(tmp_path):
+    (tmp_path / 'requirements.txt').write_text(HASHED)
+    pinned, unpinned, included = parse_requirements(str(tmp_path / 'requirements.txt'))
+    assert pinned == [Package('PyPI', 'flask', '2.0.1'), Package('PyPI', 'jinja2', '3.0.1')]
+    assert unpinned == [] and included == []
+
+def test_includes_inside_the_upload_are_followed(tmp_path):
+    (tmp_path / 'reqs').mkdir()
+    (tmp_path / 'reqs' / 'base.txt').write_text(HASHED)
+    (tmp_path / 'constraints.txt').write_text("requests==2.19.0\n")
+    (tmp_path / 'requirements.txt').write_text("-r reqs/base.txt\n-c constraints.txt\nrequests>=2\n-r ../outside.txt\n")
+    pinned, unpinned, included = parse_requirements(str(tmp_path / 'requirements.txt'))
+    assert sorted(p.name for p in pinned) == ['flask', 'jinja2', 'requests']
+    assert Package('PyPI', 'requests', '2.19.0') in pinned
+    assert unpinned == ['-r ../outside.txt']
+    assert included == ['reqs/base.txt', 'constraints.txt']
@@ -0,0 +1,34 @@
+# tests/test_archive.py
+import io
+import os
+import zipfile
+
+from psuite.archive import ArchiveWriter, stream_directory
+
+CSS = b''.join(b'.c%d { margin: %dpx; color: #%06x; }\n' % (i, i % 97, i * 7919 % 0xffffff) for i in range(4000))
+
+
+def _site(root):
+    (root / 'css').mkdir()
+    (root / 'css' / 'app.css').write_bytes(CSS)
+    (root / 'logo.png').write_bytes(b'\x89PNG' + os.urandom(4096))
+
+
+def test_compresslevel_is_applied_and_images_are_stored(tmp_path):
+    _site(tmp_path)
+    sizes = {}
+    for level in (1, 9):
+        with ArchiveWriter(str(tmp_path / f'{level}.zip'), level) as writer:
+            writer.add(str(tmp_path / 'css' / 'app.css'), os.path.join('css', 'app.css'))
+            writer.add(str(tmp_path / 'logo.png'), 'logo.png')
+        with zipfile.ZipFile(tmp_path / f'{level}.zip') as z:
+            assert z.testzip() is None and z.read('css/app.css') == CSS
+            assert z.getinfo('logo.png').compress_type == zipfile.ZIP_STORED
+            sizes[level] = z.getinfo('css/app.css').compress_size
+    assert sizes[9] < sizes[1]
+
+def test_stream_directory_yields_a_valid_zip(tmp_path):
+    _site(tmp_path)
+    with zipfile.ZipFile(io.BytesIO(b''.join(stream_directory(str(tmp_path), 9)))) as z:
+        assert z.testzip() is None and sorted(z.namelist()) == ['css/app.css', 'logo.png']
+        assert z.getinfo('css/app.css').compress_type == zipfile.ZIP_DEFLATED
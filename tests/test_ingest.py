@@ -0,0 +1,53 @@
+# tests/test_ingest.py
+import zipfile
+
+import pytest
+
+from psuite.ingest import ArchiveExtractor, ArchiveRejected
+
+CONFIG = {'UPLOAD_MAX_UNCOMPRESSED_BYTES': 4 * 1024 * 1024, 'UPLOAD_MAX_MEMBERS': 10,
+          'UPLOAD_MAX_COMPRESSION_RATIO': 100, 'UPLOAD_SKIP_DIRS': ['node_modules']}
+
+
+def _zip(path, members, compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(path, 'w', compression) as zf:
+        for name, data in members:
+            zf.writestr(name, data)
+    return str(path)
+
+
+def test_valid_archive_is_extracted(tmp_path):
+    zip_path = _zip(tmp_path / 'ok.zip', [('index.html', '<p>hi</p>'), ('css/site.css', 'a{}'),
+                                          ('node_modules/x/index.js', 'skipped')])
+    extractor = ArchiveExtractor(zip_path, str(tmp_path / 'out'), CONFIG)
+    assert sorted(extractor.extract_all()) == ['css/site.css', 'index.html']
+    assert (tmp_path / 'out' / 'css' / 'site.css').read_text() == 'a{}'
+
+def test_total_size_limit(tmp_path):
+    # Stored, so the ratio check cannot be what rejects it.
+    zip_path = _zip(tmp_path / 'big.zip', [(f'f{i}.bin', b'\0' * (1024 * 1024)) for i in range(5)], zipfile.ZIP_STORED)
+    with pytest.raises(ArchiveRejected, match='expands to more than'):
+        ArchiveExtractor(zip_path, None, CONFIG)
+
+def test_compression_ratio_limit(tmp_path):
+    zip_path = _zip(tmp_path / 'bomb.zip', [('bomb.txt', b'\0' * (2 * 1024 * 1024))])
+    with pytest.raises(ArchiveRejected, match='compressed suspiciously well'):
+        ArchiveExtractor(zip_path, None, CONFIG)
+
+def test_member_count_limit(tmp_path):
+    zip_path = _zip(tmp_path / 'many.zip', [(f'f{i}.txt', 'x') for i in range(11)])
+    with pytest.raises(ArchiveRejected, match='the limit is 10'):
+        ArchiveExtractor(zip_path, None, CONFIG)
+
+def test_entry_count_limit_before_inspection(tmp_path):
+    # Entries in skipped directories are not extracted, but the central directory is still capped.
+    zip_path = _zip(tmp_path / 'entries.zip', [(f'node_modules/f{i}.txt', 'x') for i in range(101)])
+    with pytest.raises(ArchiveRejected, match='too many to inspect'):
+        ArchiveExtractor(zip_path, None, CONFIG)
+
+@pytest.mark.parametrize('name', ['../evil.txt', 'a/../../evil.txt', '/etc/evil.txt', '..\\evil.txt', 'C:/evil.txt'])
+def test_member_paths_outside_the_project(tmp_path, name):
+    zip_path = _zip(tmp_path / 'slip.zip', [('index.html', 'ok'), (name, 'x')])
+    with pytest.raises(ArchiveRejected, match='points outside the project'):
+        ArchiveExtractor(zip_path, str(tmp_path / 'out'), CONFIG)
+    assert not (tmp_path / 'evil.txt').exists()
@@ -0,0 +1,78 @@
+# tests/test_ledger.py
+import uuid
+import threading
+
+from psuite import db, ledger
+from psuite.models import User, CreditTransaction
+
+
+def _concurrently(app, count, target):
+    """Runs `target()` in `count` threads, each with its own app context and session, all at once."""
+    barrier, results = threading.Barrier(count), []
+
+    def run():
+        with app.app_context():
+            barrier.wait()
+            results.append(target())
+            db.session.remove()
+    threads = [threading.Thread(target=run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def _charge_and_commit(user_id):
+    balance = ledger.charge(user_id, 1, str(uuid.uuid4()))
+    db.session.commit()
+    return balance
+
+def _state(app, user_id):
+    with app.app_context():
+        transactions = CreditTransaction.query.filter_by(user_id=user_id).all()
+        return db.session.get(User, user_id).credits, sorted(t.kind for t in transactions), sum(t.amount for t in transactions)
+
+
+def test_concurrent_charges_never_overdraw(app, user):
+    results = _concurrently(app, 8, lambda: _charge_and_commit(user))
+    assert sorted(results, key=str) == [0] + [None] * 7
+    assert _state(app, user) == (0, ['charge'], -1)
+
+def test_charge_is_refused_without_credits(app, user):
+    with app.app_context():
+        assert ledger.charge(user, 2, str(uuid.uuid4())) is None
+        db.session.commit()
+    assert _state(app, user) == (1, [], 0)
+
+def test_refund_is_applied_once(app, user):
+    job_id = str(uuid.uuid4())
+    with app.app_context():
+        ledger.charge(user, 1, job_id)
+        db.session.commit()
+    results = _concurrently(app, 4, lambda: ledger.refund(job_id))
+    assert sorted(results, key=str) == [1] + [None] * 3
+    with app.app_context():
+        assert ledger.refund(job_id) is None
+    assert _state(app, user) == (1, ['charge', 'refund'], 0)
+
+def test_refund_of_an_uncharged_job_does_nothing(app, user):
+    with app.app_context():
+        assert ledger.refund(str(uuid.uuid4())) is None
+    assert _state(app, user) == (1, [], 0)
+
+def test_failed_job_is_refunded_once(app, user, monkeypatch):
+    from psuite import jobs
+    from psuite.models import Job
+
+    def crash(job, room):
+        raise RuntimeError("tool crashed")
+    monkeypatch.setitem(jobs.TOOL_RUNNERS, 'security_scan', crash)
+    with app.app_context():
+        job = Job(id=str(uuid.uuid4()), user_id=user, tool='security_scan', session_id=str(uuid.uuid4()), status='running')
+        ledger.charge(user, 1, job.id)
+        db.session.add(job)
+        db.session.commit()
+        jobs._execute(job)
+        assert db.session.get(Job, job.id).status == 'failed'
+        assert ledger.refund(job.id) is None  # e.g. the supervisor noticing the dead worker too
+    assert _state(app, user) == (1, ['charge', 'refund'], 0)
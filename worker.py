@@ -0,0 +1,10 @@
+# worker.py
+# Runs the job worker pool on its own, e.g. on a separate machine sharing the database
+# and upload folders. run.py starts an equivalent pool by itself.
+from psuite import create_app
+from psuite.jobs import run_workers
+
+app = create_app()
+
+if __name__ == '__main__':
+    run_workers(app)